@@ -0,0 +1,258 @@
+"""
+    Headless HTTP API for shop and CRM integrations, next to the Gradio UI and sharing its pipeline (sales_service).
+        POST /v1/chat          {"question", "domain", "session_id", "history", "stream"} -> JSON, or SSE with "stream": true
+        POST /v1/chat/batch    {"questions": [...], "domain"} -> one answer (or error) per question
+        GET  /health           the process is up
+        GET  /ready            embedding model and index are loaded (503 until then)
+    At most API_CONCURRENCY questions are answered at once, up to API_QUEUE_SIZE more wait at most API_QUEUE_TIMEOUT
+    seconds for a slot and anything beyond is rejected with 503 + Retry-After. A question not answered within
+    API_TIMEOUT seconds gets 504.
+    Usage (from the repository root): python src/sales_bot/api_server.py
+"""
+import asyncio
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from threading import Thread
+from typing import AsyncIterator, List, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from chains.sales_chain import DEFAULT_DOMAIN
+from config import get_settings
+from embedding import ChineseEmbedding
+from sales_service import SALES_BOTS, answer_stream, get_sales_bot, save_caches, start_metrics
+from utils import LOG, METRICS
+from vectordbs import get_registry
+
+_END = object()
+
+
+class Overloaded(Exception):
+    pass
+
+
+class Admission():
+    """
+        Bounded concurrency with a bounded wait queue in front of the answering threads.
+        A slot is held until the answering thread finishes, also when the client already got a timeout,
+        so slow agent runs throttle new requests instead of piling up behind them.
+    """
+
+    def __init__(self, concurrency: int, max_queue: int, queue_timeout: float):
+        self._slots = asyncio.Semaphore(concurrency)
+        self._max_queue = max_queue
+        self._queue_timeout = queue_timeout
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    async def acquire(self):
+        if self._slots.locked() and self.waiting >= self._max_queue:
+            self.rejected += 1
+            raise Overloaded("queue full")
+        self.waiting += 1
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self._queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded("queue timeout")
+        finally:
+            self.waiting -= 1
+        METRICS.observe("api_queue_seconds", time.perf_counter() - started)
+        self.running += 1
+
+    def release(self):
+        self.running -= 1
+        self._slots.release()
+
+    def info(self):
+        return {"running": self.running, "waiting": self.waiting, "rejected": self.rejected}
+
+
+class ChatRequest(BaseModel):
+    question: str
+    domain: str = DEFAULT_DOMAIN
+    # Without a session id every question is answered without chat history
+    session_id: Optional[str] = None
+    history: Optional[List[Tuple[str, str]]] = None
+    stream: bool = False
+
+
+class BatchRequest(BaseModel):
+    questions: List[str] = Field(min_length=1)
+    domain: str = DEFAULT_DOMAIN
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings()
+    app.state.admission = Admission(settings.API_CONCURRENCY, settings.API_QUEUE_SIZE, settings.API_QUEUE_TIMEOUT)
+    app.state.executor = ThreadPoolExecutor(max_workers=settings.API_CONCURRENCY, thread_name_prefix="api-answer")
+    start_metrics()
+    # /ready turns true once the default domain is warm, requests before that load it on demand
+    Thread(target=lambda: get_sales_bot(DEFAULT_DOMAIN)[0].warmup(), name="api-warmup", daemon=True).start()
+    yield
+    app.state.executor.shutdown(wait=False)
+    save_caches()
+
+
+app = FastAPI(title="Sales bot", lifespan=lifespan)
+
+
+def check_domain(domain: str):
+    if domain not in get_registry().domains:
+        raise HTTPException(status_code=404, detail=f"Unknown sales domain '{domain}'")
+
+
+async def answer_items(question: str, domain: str, session_id: Optional[str], history) -> AsyncIterator[Tuple[str, str]]:
+    """answer_stream on a worker thread under admission control, with the API_TIMEOUT deadline."""
+    check_domain(domain)
+    admission: Admission = app.state.admission
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + get_settings().API_TIMEOUT
+    await admission.acquire()
+    queue: "asyncio.Queue[object]" = asyncio.Queue()
+    ephemeral = session_id is None
+    session_id = session_id or f"api-{uuid.uuid4().hex}"
+
+    def produce():
+        try:
+            for item in answer_stream(question, domain, session_id, history):
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            if ephemeral and domain in SALES_BOTS:
+                SALES_BOTS[domain].sessions.drop(session_id)
+            loop.call_soon_threadsafe(admission.release)
+            loop.call_soon_threadsafe(queue.put_nowait, _END)
+
+    loop.run_in_executor(app.state.executor, produce)
+    while True:
+        item = await asyncio.wait_for(queue.get(), max(0.0, deadline - loop.time()))
+        if item is _END:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+async def answer(question: str, domain: str, session_id: Optional[str] = None, history=None) -> dict:
+    started = time.perf_counter()
+    source, text = "", ""
+    async for source, text in answer_items(question, domain, session_id, history):
+        pass
+    return {"answer": text, "source": source, "latency": round(time.perf_counter() - started, 3)}
+
+
+def _error(status: int, detail: str, **headers: str) -> JSONResponse:
+    METRICS.inc("api_errors_total", status=str(status))
+    return JSONResponse(status_code=status, content={"error": detail}, headers=headers)
+
+
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def sse_events(request: ChatRequest) -> AsyncIterator[str]:
+    started = time.perf_counter()
+    sent = ""
+    source, text = "", ""
+    try:
+        async for source, text in answer_items(request.question, request.domain, request.session_id, request.history):
+            # The agent started its final answer over (or ended with another one), clients drop what they have
+            if not text.startswith(sent):
+                yield _sse({"source": source}, event="reset")
+                sent = ""
+            if len(text) > len(sent):
+                yield _sse({"delta": text[len(sent):], "source": source})
+                sent = text
+    except Overloaded as e:
+        yield _sse({"error": f"overloaded: {e}"}, event="error")
+        return
+    except asyncio.TimeoutError:
+        yield _sse({"error": "timeout"}, event="error")
+        return
+    except Exception as e:
+        LOG.error(f"[api] {e}")
+        yield _sse({"error": str(e)}, event="error")
+        return
+    yield _sse({"answer": text, "source": source, "latency": round(time.perf_counter() - started, 3)}, event="done")
+
+
+@app.post("/v1/chat")
+async def chat(request: ChatRequest):
+    METRICS.inc("api_requests_total", endpoint="chat")
+    if request.stream:
+        # Once the response started streaming its status can't change anymore
+        check_domain(request.domain)
+        return StreamingResponse(sse_events(request), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+    try:
+        return await answer(request.question, request.domain, request.session_id, request.history)
+    except Overloaded as e:
+        return _error(503, f"overloaded: {e}", **{"Retry-After": "1"})
+    except asyncio.TimeoutError:
+        return _error(504, "timeout")
+    except HTTPException:
+        raise
+    except Exception as e:
+        LOG.error(f"[api] {e}")
+        return _error(500, str(e))
+
+
+@app.post("/v1/chat/batch")
+async def chat_batch(request: BatchRequest):
+    METRICS.inc("api_requests_total", endpoint="batch")
+    if len(request.questions) > get_settings().API_BATCH_MAX:
+        return _error(413, f"at most {get_settings().API_BATCH_MAX} questions per batch")
+    check_domain(request.domain)
+    # A batch only ever holds a few admission slots, single chats keep the rest
+    settings = get_settings()
+    slots = asyncio.Semaphore(max(1, min(settings.API_BATCH_CONCURRENCY, settings.API_CONCURRENCY - 1)))
+
+    async def one(question: str) -> dict:
+        try:
+            async with slots:
+                return {"question": question, **await answer(question, request.domain)}
+        except Overloaded as e:
+            return {"question": question, "error": f"overloaded: {e}"}
+        except asyncio.TimeoutError:
+            return {"question": question, "error": "timeout"}
+        except HTTPException:
+            raise
+        except Exception as e:
+            LOG.error(f"[api] {e}")
+            return {"question": question, "error": str(e)}
+
+    return {"answers": await asyncio.gather(*(one(q) for q in request.questions))}
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready():
+    embedding = ChineseEmbedding().loaded
+    domains = {domain: bot.ready for domain, bot in SALES_BOTS.items()}
+    is_ready = embedding and domains.get(DEFAULT_DOMAIN, False)
+    body = {"ready": is_ready, "embedding": embedding, "domains": domains, "queue": app.state.admission.info()}
+    return JSONResponse(status_code=200 if is_ready else 503, content=body)
+
+
+if __name__ == "__main__":
+    settings = get_settings()
+    if settings.API_WORKERS > 1:
+        # Worker processes import the app themselves, see VECTOR_STORE_READ_ONLY to share the index between them
+        uvicorn.run("api_server:app", host=settings.API_HOST, port=settings.API_PORT, workers=settings.API_WORKERS)
+    else:
+        uvicorn.run(app, host=settings.API_HOST, port=settings.API_PORT)
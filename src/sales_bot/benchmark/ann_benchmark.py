@@ -0,0 +1,69 @@
+"""
+    Recall@k versus QPS of approximate FaissDb index types against the exact flat baseline.
+    Queries are the embedded "客户问题" lines of the source file, ground truth is the flat L2 top-k.
+    Usage (from the repository root):
+        python src/sales_bot/benchmark/ann_benchmark.py resources/electronic_devices_sales_qa.txt \\
+            --specs "IVF16,Flat" "IVF16,PQ16" "HNSW32" --nprobe 1 4 8 --ef 16 64
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from embedding import ChineseEmbedding
+from vectordbs import FaissDb
+
+QUESTION = re.compile(r"客户问题\]?\s*[:：]?\s*(.+)")
+
+
+def load_queries(path: str):
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        return [m.group(1).strip() for m in map(QUESTION.search, f) if m]
+
+
+def search(index: faiss.Index, queries: np.ndarray, k: int, repeat: int):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        _, ids = index.search(queries, k)
+    qps = repeat * len(queries) / (time.perf_counter() - started)
+    return ids, qps
+
+
+def recall(ids: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(ids, truth)]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("source", nargs="?", default="resources/electronic_devices_sales_qa.txt")
+    parser.add_argument("--specs", nargs="+", default=["IVF16,Flat", "IVF16,PQ16", "HNSW32"])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--ef", type=int, nargs="+", default=[16, 64])
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    flat = FaissDb(args.source).db.index
+    vectors = flat.reconstruct_n(0, flat.ntotal)
+    queries = np.asarray(ChineseEmbedding().embeddings.embed_documents(load_queries(args.source)), dtype=np.float32)
+    truth, base_qps = search(flat, queries, args.k, args.repeat)
+    print(f"{'Flat':<16} {'':<12} recall@{args.k}=1.000 qps={base_qps:,.0f}")
+
+    for spec in args.specs:
+        index = faiss.index_factory(vectors.shape[1], spec, faiss.METRIC_L2)
+        if not index.is_trained:
+            index.train(vectors)
+        index.add(vectors)
+        knobs = [("nprobe", n) for n in args.nprobe] if spec.startswith("IVF") else \
+            [("efSearch", e) for e in args.ef] if spec.startswith("HNSW") else [(None, None)]
+        for name, value in knobs:
+            if name is not None:
+                FaissDb.tuneIndex(index, **{name: value})
+            ids, qps = search(index, queries, args.k, args.repeat)
+            label = f"{name}={value}" if name else ""
+            print(f"{spec:<16} {label:<12} recall@{args.k}={recall(ids, truth):.3f} qps={qps:,.0f}")
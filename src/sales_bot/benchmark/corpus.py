@@ -0,0 +1,34 @@
+import json
+import random
+import re
+from typing import List, Optional
+
+QUESTION = re.compile(r"客户问题\]?\s*[:：]?\s*(.+)")
+
+
+def load_questions(path: str) -> List[str]:
+    """Customer questions from a Q&A corpus (.txt with 客户问题 lines) or a .jsonl replay log.
+    JSONL lines may carry the question as "question", "input", "message" or "title".
+    """
+    questions: List[str] = []
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                text = next((record[k] for k in ("question", "input", "message", "title") if record.get(k)), None)
+                if text:
+                    questions.append(text.strip())
+        else:
+            questions = [m.group(1).strip() for m in map(QUESTION.search, f) if m]
+    return questions
+
+
+def replay(paths: List[str], total: int, seed: Optional[int] = 0) -> List[str]:
+    """A deterministic sequence of `total` questions sampled from the given corpora."""
+    pool = [q for p in paths for q in load_questions(p)]
+    if not pool:
+        raise ValueError(f"No questions found in {paths}")
+    rng = random.Random(seed)
+    return [rng.choice(pool) for _ in range(total)]
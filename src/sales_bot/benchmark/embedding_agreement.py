@@ -0,0 +1,102 @@
+"""
+    Validate cheaper embedding backends against the fp32 baseline.
+    Every (model, backend) runs in a fresh interpreter that embeds the sample corpus (one Q&A record per
+    document) and the queries, reporting load time, query latency and peak RSS. The parent then compares
+    L2 top-1 retrieval of each candidate with the baseline's (top-1 agreement) and the baseline's top-k.
+    Usage (from the repository root):
+        python src/sales_bot/benchmark/embedding_agreement.py --backends int8 onnx onnx-int8 \
+            --models thenlper/gte-small-zh
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_ROOT = os.path.dirname(os.path.dirname(ROOT))
+sys.path.append(ROOT)
+from benchmark.corpus import load_questions
+from vectordbs.ingest import peak_rss_mb
+from vectordbs.qa_records import format_qa_record, parse_qa_records
+
+BASELINE = ("infgrad/stella-large-zh-v2", "torch")
+
+
+def embed(model: str, backend: str, corpus: str, queries: str, out: str) -> dict:
+    """Child side: embed the corpus and the queries with one backend, save vectors under out."""
+    from embedding.backends import embeddingFactory
+    with open(corpus, 'r', encoding='utf-8-sig') as f:
+        docs = [format_qa_record(q, a) for q, a in parse_qa_records(f.read())]
+    questions = load_questions(queries)
+    started = time.perf_counter()
+    embedding = embeddingFactory(model, backend)
+    embedding.embed_query("warmup")
+    loaded = time.perf_counter() - started
+    started = time.perf_counter()
+    doc_vectors = np.array(embedding.embed_documents(docs), dtype=np.float32)
+    docs_seconds = time.perf_counter() - started
+    latencies = []
+    query_vectors = []
+    for question in questions:
+        started = time.perf_counter()
+        query_vectors.append(embedding.embed_query(question))
+        latencies.append(time.perf_counter() - started)
+    np.save(os.path.join(out, "docs.npy"), doc_vectors)
+    np.save(os.path.join(out, "queries.npy"), np.array(query_vectors, dtype=np.float32))
+    return {
+        "load_seconds": loaded,
+        "docs_per_sec": len(docs) / docs_seconds,
+        "query_ms_p50": float(np.percentile(latencies, 50) * 1000),
+        "query_ms_p95": float(np.percentile(latencies, 95) * 1000),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run(model: str, backend: str, corpus: str, queries: str) -> dict:
+    out = tempfile.mkdtemp(prefix="embedding_agreement_")
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", model, backend, corpus, queries, out],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True, env={**os.environ, "PYTHONPATH": ROOT},
+    )
+    stats = json.loads(result.stdout.strip().splitlines()[-1])
+    stats["docs"] = np.load(os.path.join(out, "docs.npy"))
+    stats["queries"] = np.load(os.path.join(out, "queries.npy"))
+    return stats
+
+
+def top_k(docs: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    # Squared L2 like the default FaissDb index, without needing faiss here
+    distances = (queries ** 2).sum(1)[:, None] - 2 * queries @ docs.T + (docs ** 2).sum(1)[None, :]
+    return np.argsort(distances, axis=1)[:, :k]
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        print(json.dumps(embed(*sys.argv[2:7])))
+        sys.exit(0)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default="resources/electronic_devices_sales_qa.txt")
+    parser.add_argument("--queries", default=None, help="questions (.txt Q&A corpus or .jsonl log), defaults to the corpus questions")
+    parser.add_argument("--models", nargs="+", default=[BASELINE[0]], help="models to try on every backend")
+    parser.add_argument("--backends", nargs="+", default=["int8", "onnx", "onnx-int8"])
+    parser.add_argument("-k", type=int, default=3)
+    args = parser.parse_args()
+
+    queries = args.queries or args.corpus
+    baseline = run(*BASELINE, args.corpus, queries)
+    reference = top_k(baseline["docs"], baseline["queries"], args.k)
+    candidates = [(model, backend) for model in args.models for backend in args.backends]
+    candidates += [(model, "torch") for model in args.models if (model, "torch") != BASELINE]
+    print(f"{'model:backend':<44}{'top1 agree':>11}{'in base top'+str(args.k):>13}{'load s':>8}{'docs/s':>8}{'p50 ms':>8}{'p95 ms':>8}{'rss MB':>8}")
+    for model, backend in [BASELINE] + candidates:
+        stats = baseline if (model, backend) == BASELINE else run(model, backend, args.corpus, queries)
+        found = top_k(stats["docs"], stats["queries"], 1)[:, 0]
+        agreement = float((found == reference[:, 0]).mean())
+        within = float((found[:, None] == reference).any(axis=1).mean())
+        print(f"{model + ':' + backend:<44}{agreement:>11.3f}{within:>13.3f}{stats['load_seconds']:>8.1f}"
+              f"{stats['docs_per_sec']:>8.1f}{stats['query_ms_p50']:>8.1f}{stats['query_ms_p95']:>8.1f}{stats['peak_rss_mb'] or 0:>8.0f}")
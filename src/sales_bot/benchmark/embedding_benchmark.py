@@ -0,0 +1,48 @@
+"""
+    Concurrent query embedding throughput: per-thread embed_query on the model vs EmbeddingService
+    micro-batching, with the query cache disabled so every query reaches the model.
+    Usage (from the repository root): python src/sales_bot/benchmark/embedding_benchmark.py --threads 1 8 32
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain.embeddings import HuggingFaceEmbeddings
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmark.corpus import load_questions
+from config.config import get_settings
+from embedding.embedding_service import EmbeddingService
+
+
+def throughput(embed, questions, threads: int) -> float:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(embed, questions))
+    return len(questions) / (time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default="resources/electronic_devices_sales_qa.txt")
+    parser.add_argument("--questions", type=int, default=256)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--wait-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    model = HuggingFaceEmbeddings(model_name=get_settings().EMBEDDINGS_MODEL_NAME)
+    corpus = load_questions(args.corpus)
+    # Distinct texts so neither side benefits from repeated questions
+    questions = [f"{corpus[i % len(corpus)]} #{i}" for i in range(args.questions)]
+    model.embed_query("warmup")
+    for threads in args.threads:
+        direct = throughput(model.embed_query, questions, threads)
+        service = EmbeddingService(model, cache_size=0, max_batch_size=args.batch_size, max_wait=args.wait_ms / 1000)
+        batched = throughput(service.embed_query, questions, threads)
+        info = service.info()
+        service.close()
+        print(f"threads={threads:<3} direct={direct:7.1f} q/s  batched={batched:7.1f} q/s  "
+              f"speedup={batched / direct:4.1f}x  mean batch={info['mean_batch_size']:.1f}")
@@ -0,0 +1,136 @@
+"""
+    Deterministic local fake of the api2d chat-completions endpoint for benchmarks.
+    It plays the sales agent: the first ReAct step calls "VectorDb QA Search" with the customer question,
+    RetrievalQA prompts are answered from the 销售回答 in their context, and once an observation is in
+    the scratchpad it returns it as the final answer. Supports SSE streaming when the request sets "stream".
+    Usage (standalone): python src/sales_bot/benchmark/fake_api2d.py --port 8765 --latency 0.3
+"""
+import argparse
+import json
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Optional
+
+QA_CONTEXT = "Use the following pieces of context"
+QUESTION = re.compile(r"客户问题:\s*(.+)")
+ANSWER = re.compile(r"销售回答\]?\s*[:：]?\s*(.+)")
+OBSERVATION = re.compile(r"Observation:\s*(.+)")
+
+
+def fake_completion(prompt: str) -> str:
+    if prompt.lstrip().startswith(QA_CONTEXT):
+        match = ANSWER.search(prompt)
+        return match.group(1).strip() if match else "I don't know."
+    questions = QUESTION.findall(prompt)
+    question = questions[-1].strip() if questions else prompt.strip().splitlines()[-1]
+    # Everything after the last question is the agent scratchpad
+    observations = OBSERVATION.findall(prompt[prompt.rfind(question):])
+    if observations:
+        return f"Thought: I now know the final answer\nFinal Answer: {observations[-1].strip()}"
+    return f"Thought: 先在知识库中查询\nAction: VectorDb QA Search\nAction Input: {question}"
+
+
+class FakeApi2dServer():
+    """
+        Threaded http server answering /v1/chat/completions and /v1/completions.
+        Every response waits `latency + per_char_latency * len(completion)` seconds; streamed responses
+        spread that wait over the chunks. The first `fail_first` requests get a 503, as an overloaded api would,
+        with an html body instead of json when `fail_html` is set, as a proxy in front of it would.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, per_char_latency: float = 0.0, chunk_size: int = 4, fail_first: int = 0, fail_html: bool = False):
+        self.latency = latency
+        self.per_char_latency = per_char_latency
+        self.chunk_size = chunk_size
+        self.fail_first = fail_first
+        self.fail_html = fail_html
+        self.calls = 0
+        self._lock = Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeApi2dServer":
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with server._lock:
+                    server.calls += 1
+                    calls = server.calls
+                if calls <= server.fail_first and server.fail_html:
+                    self._send(b"<html><body><h1>503 Service Temporarily Unavailable</h1></body></html>", "text/html", status=503)
+                    return
+                if calls <= server.fail_first:
+                    self._send_json({"error": "service overloaded"}, status=503)
+                    return
+                is_chat = "messages" in body
+                prompt = body["messages"][-1]["content"] if is_chat else body.get("prompt", "")
+                completion = fake_completion(prompt)
+                delay = server.latency + server.per_char_latency * len(completion)
+                if body.get("stream"):
+                    self._stream(completion, delay, is_chat)
+                else:
+                    time.sleep(delay)
+                    choice = {"message": {"role": "assistant", "content": completion}} if is_chat else {"text": completion}
+                    self._send_json({"choices": [choice], "usage": {"prompt_tokens": len(prompt), "completion_tokens": len(completion)}})
+
+            def _send_json(self, payload, status: int = 200):
+                self._send(json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json", status)
+
+            def _send(self, data: bytes, content_type: str, status: int = 200):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, completion: str, delay: float, is_chat: bool):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                chunks = [completion[i:i + server.chunk_size] for i in range(0, len(completion), server.chunk_size)] or [""]
+                for chunk in chunks:
+                    time.sleep(delay / len(chunks))
+                    choice = {"delta": {"content": chunk}} if is_chat else {"text": chunk}
+                    self.wfile.write(f"data: {json.dumps({'choices': [choice]}, ensure_ascii=False)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--per-char-latency", type=float, default=0.0)
+    args = parser.parse_args()
+    server = FakeApi2dServer(port=args.port, latency=args.latency, per_char_latency=args.per_char_latency)
+    print(f"Fake api2d listening on {server.url}")
+    server._server.serve_forever()
@@ -0,0 +1,35 @@
+import time
+from typing import Any, List, Optional
+
+from langchain.callbacks.manager import CallbackManagerForLLMRun
+from langchain.llms.base import LLM
+
+
+class FakeSalesLLM(LLM):
+    """
+        Deterministic offline stand-in for Api2dLLM.
+        Always answers with a final answer so the agent finishes in one step, and sleeps
+        `base_latency + per_token_latency * prompt tokens` so latency tracks prompt size like a real api.
+    """
+    base_latency: float = 0.0
+    per_token_latency: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-sales"
+
+    def get_num_tokens(self, text: str) -> int:
+        # Chinese text is roughly one token per character, avoids downloading a tokenizer
+        return len(text)
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        self.calls += 1
+        time.sleep(self.base_latency + self.per_token_latency * self.get_num_tokens(prompt))
+        return f"Thought: 我知道答案了\nFinal Answer: 这是第{self.calls}个回答，我们的产品性价比很高。"
@@ -0,0 +1,27 @@
+import time
+import zlib
+from threading import Lock
+
+
+class FakeSearch():
+    """
+        Deterministic offline stand-in for SerpAPIWrapper.run.
+        Every call sleeps `latency` seconds and answers with a made-up price derived from the query,
+        `calls` counts the upstream calls actually made. With `fail_every` set every n-th call raises.
+    """
+
+    def __init__(self, latency: float = 0.0, fail_every: int = 0):
+        self.latency = latency
+        self.fail_every = fail_every
+        self.calls = 0
+        self._lock = Lock()
+
+    def run(self, query: str) -> str:
+        with self._lock:
+            self.calls += 1
+            calls = self.calls
+        time.sleep(self.latency)
+        if self.fail_every and calls % self.fail_every == 0:
+            raise ValueError("Got error from SerpAPI: fake failure")
+        price = 500 + zlib.crc32(query.encode("utf-8")) % 9500
+        return f"{query} 参考价格: ¥{price}.00 (京东自营)"
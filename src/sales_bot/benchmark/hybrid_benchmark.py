@@ -0,0 +1,165 @@
+"""
+    Local hit rate and wrong hits of dense vs hybrid (dense + BM25) retrieval, i.e. how many questions the
+    "VectorDb QA Search" tool answers instead of falling back to Web Search, and how many of those answers
+    are about something else.
+    Query sets: the corpus questions verbatim, the same questions cut down to keywords
+    ("这个冰箱的能效等级是多少？" -> "冰箱能效等级", the style dense similarity tends to miss), the corpus
+    questions asked about another product of the corpus ("这个冰箱多大尺寸？" from the TV's) and the questions
+    of other domains' corpora (--negatives). Neither of the last two has an answer here, every hit is wrong.
+    Optionally --queries (.txt or .jsonl) adds unlabelled questions.
+    --precision calibrates VECTOR_STORE_LEXICAL_THRESHOLD and VECTOR_STORE_LEXICAL_MIN_RELEVANCE: the pair
+    answering the most labelled questions locally while at least that share of local answers is right.
+    Usage (from the repository root):
+        python src/sales_bot/benchmark/hybrid_benchmark.py --queries logs/questions.jsonl --precision 0.95
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmark.corpus import load_questions
+from vectordbs.faissdb import FaissDb
+from vectordbs.qa_records import expand_record, parse_qa_groups
+from vectordbs.retriever import HybridRetriever, VectorDbRetriever
+
+_LEADING = re.compile(r"^(?:请问)?(?:这个|这款|这台|你们的?)")
+_TRAILING = re.compile(r"(?:是多少|有多大|有多少|是什么|是否|怎么样|如何|吗|呢)?[？?！!。，,]*$")
+_PRODUCT = re.compile(r"^(?:这个|这款|这台)([一-鿿]{2,5}?)(?:的|有|是|可以|支持|具备|能)")
+
+# (query, answer it should retrieve), the answer is None for questions without one in the corpus
+Labelled = List[Tuple[str, Optional[str]]]
+
+
+def keyword_query(question: str) -> str:
+    return _TRAILING.sub("", _LEADING.sub("", question)).replace("的", "")
+
+
+def swapped_questions(questions: List[str], per_question: int = 2) -> List[str]:
+    """
+        Corpus questions asked about `per_question` other products of the corpus, skipping products
+        naming each other (电脑/笔记本电脑) and questions the corpus asks itself.
+    """
+    products = list(dict.fromkeys(m.group(1) for m in map(_PRODUCT.match, questions) if m))
+    known = set(questions)
+    swapped = []
+    for question in questions:
+        match = _PRODUCT.match(question)
+        if match is None:
+            continue
+        product = match.group(1)
+        start = products.index(product)
+        others = [products[(start + i) % len(products)] for i in range(1, len(products))]
+        others = [other for other in others if other not in product and product not in other]
+        for other in others[:per_question]:
+            candidate = question.replace(product, other, 1)
+            if candidate not in known:
+                swapped.append(candidate)
+    return swapped
+
+
+def load_query_sets(corpus: str, negatives: List[str], queries: Optional[str]) -> Dict[str, Labelled]:
+    with open(corpus, 'r', encoding='utf-8-sig') as f:
+        groups = parse_qa_groups(f.read())
+    questions = [q for qs, _ in groups for q in qs]
+    query_sets = {
+        "verbatim": [(q, answer) for qs, answer in groups for q in qs],
+        "keywords": [(keyword_query(q), answer) for qs, answer in groups for q in qs],
+        "swapped": [(q, None) for q in swapped_questions(questions)],
+    }
+    other_domains = []
+    for path in negatives:
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            other_domains += [(q, None) for qs, _ in parse_qa_groups(f.read()) for q in qs]
+    if other_domains:
+        query_sets["other"] = other_domains
+    if queries:
+        query_sets["replay"] = [(q, None) for q in load_questions(queries)]
+    return query_sets
+
+
+def evaluate(retriever, queries: Labelled, negative: bool) -> Dict[str, float]:
+    hits = correct = wrong = 0
+    latencies = []
+    for query, answer in queries:
+        started = time.perf_counter()
+        docs = retriever.get_relevant_documents(query)
+        latencies.append(time.perf_counter() - started)
+        hits += bool(docs)
+        right = bool(docs) and answer is not None and answer in docs[0].page_content
+        correct += right
+        wrong += bool(docs) and (negative or (answer is not None and not right))
+    labelled = sum(answer is not None for _, answer in queries)
+    return {
+        "hit_rate": hits / len(queries),
+        "accuracy": correct / labelled if labelled else float("nan"),
+        "wrong": wrong,
+        "fallbacks": len(queries) - hits,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+    }
+
+
+def calibrate(retriever: HybridRetriever, labelled: Labelled, precision: float) -> Optional[Dict[str, float]]:
+    """Grid search of lexical_threshold x min_relevance, see the module docstring. None when no pair reaches precision."""
+    pooled = [(retriever.candidates(query), answer) for query, answer in labelled]
+    best = None
+    for lexical_threshold in np.arange(0.3, 1.0001, 0.05):
+        for min_relevance in np.arange(0.5, retriever.score_threshold + 1e-9, 0.02):
+            hits = correct = 0
+            for candidates, answer in pooled:
+                top = next((doc for doc, relevance, coverage in candidates
+                            if relevance >= retriever.score_threshold
+                            or (coverage >= lexical_threshold and relevance >= min_relevance)), None)
+                if top is not None:
+                    hits += 1
+                    correct += answer is not None and answer in expand_record(top).page_content
+            if hits and correct / hits >= precision and (best is None or hits > best["hits"]):
+                best = {"lexical_threshold": float(lexical_threshold), "min_relevance": float(min_relevance),
+                        "hits": hits, "precision": correct / hits}
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default="resources/electronic_devices_sales_qa.txt")
+    parser.add_argument("--negatives", nargs="*", default=["resources/real_estate_sales_data.txt"],
+                        help="corpora of other domains, their questions have no answer in --corpus")
+    parser.add_argument("--queries", default=None, help="extra unlabelled questions (.txt Q&A corpus or .jsonl log)")
+    parser.add_argument("--index-mode", default="chunk", choices=["chunk", "question"])
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--lexical-threshold", type=float, default=0.6)
+    parser.add_argument("--min-relevance", type=float, default=0.7)
+    parser.add_argument("--precision", type=float, default=None, help="calibrate both lexical thresholds for this precision")
+    args = parser.parse_args()
+
+    vectordb = FaissDb(args.corpus, index_mode=args.index_mode)
+    vectordb.warmup()
+    index, _ = vectordb.lexicalIndex()
+    print(f"BM25: {len(index)} docs, {len(index.vocabulary)} terms, {index.nbytes / 1024:.1f} KiB postings")
+    query_sets = load_query_sets(args.corpus, args.negatives, args.queries)
+    hybrid = HybridRetriever(vectordb=vectordb, k=1, score_threshold=args.threshold,
+                             lexical_threshold=args.lexical_threshold, min_relevance=args.min_relevance)
+    retrievers = {
+        "dense": VectorDbRetriever(vectordb=vectordb, search_type="similarity_score_threshold",
+                                   search_kwargs={"score_threshold": args.threshold, "k": 1}),
+        "hybrid": hybrid,
+    }
+    print(f"{'queries':<10}{'retriever':<10}{'n':>6}{'hit rate':>10}{'accuracy':>10}{'wrong hits':>12}{'web fallbacks':>15}{'p50 ms':>8}")
+    for name, queries in query_sets.items():
+        for kind, retriever in retrievers.items():
+            stats = evaluate(retriever, queries, negative=name in ("swapped", "other"))
+            print(f"{name:<10}{kind:<10}{len(queries):>6}{stats['hit_rate']:>10.3f}{stats['accuracy']:>10.3f}"
+                  f"{stats['wrong']:>12}{stats['fallbacks']:>15}{stats['p50_ms']:>8.1f}")
+    if args.precision is not None:
+        labelled = [item for name, queries in query_sets.items() if name != "replay" for item in queries]
+        best = calibrate(hybrid, labelled, args.precision)
+        if best is None:
+            print(f"No lexical thresholds reach precision {args.precision}, keep VECTOR_STORE_RETRIEVER=dense")
+        else:
+            print(f"VECTOR_STORE_LEXICAL_THRESHOLD={best['lexical_threshold']:.2f} "
+                  f"VECTOR_STORE_LEXICAL_MIN_RELEVANCE={best['min_relevance']:.2f}: "
+                  f"{best['hits']}/{len(labelled)} answered locally, precision {best['precision']:.3f}")
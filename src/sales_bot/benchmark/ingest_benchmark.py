@@ -0,0 +1,31 @@
+"""
+    Corpus ingest benchmark: docs/sec, peak RSS and index shrink from (near) duplicate collapsing of
+    StreamingIngest for several worker counts.
+    Usage (from the repository root):
+        python src/sales_bot/benchmark/ingest_benchmark.py resources/real_estate_sales_data.txt --workers 0 2 4
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from embedding import ChineseEmbedding
+from vectordbs.faissdb import doc_hash, score_normalizer
+from vectordbs.ingest import StreamingIngest
+from vectordbs.vectordb import defaultDocTransformer
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("source", nargs="?", default="resources/electronic_devices_sales_qa.txt")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 2])
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--near-duplicate-threshold", type=float, default=0.95, help="0 disables near duplicate collapsing")
+    args = parser.parse_args()
+
+    embedding = ChineseEmbedding().embeddings
+    for workers in args.workers:
+        # Peak RSS is per process, so run each configuration in a fresh interpreter for clean numbers
+        ingest = StreamingIngest(embedding, defaultDocTransformer(), batch_size=args.batch_size, workers=workers,
+                                 near_duplicate_threshold=args.near_duplicate_threshold or None)
+        _, _, stats = ingest.run(args.source, doc_hash, relevance_score_fn=score_normalizer)
+        print(f"workers={workers} batch_size={args.batch_size} {ingest.info(stats)}")
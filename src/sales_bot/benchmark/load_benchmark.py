@@ -0,0 +1,130 @@
+"""
+    Load and latency benchmark of the sales chat pipeline against a local fake api2d endpoint.
+    Replays questions from the resources corpus (and/or a .jsonl log) with N concurrent customers through
+    sales_service.answer_stream, the path the Gradio UI and the HTTP API serve (answer cache, fast path,
+    streamed agent), and reports p50/p95/p99 latency and time to first output, throughput, answers per
+    source, llm calls per question and the per-stage breakdown MetricsCallbackHandler records for agent
+    answers (embedding, FAISS search, llm, agent parsing/overhead).
+    Usage (from the repository root):
+        python src/sales_bot/benchmark/load_benchmark.py --users 1 8 32 --questions 200 --latency 0.3
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmark.corpus import replay
+from benchmark.fake_api2d import FakeApi2dServer
+from cache import AnswerCache
+from chains.sales_chain import SalesChain
+from config import get_settings
+from langchain_model import Api2dLLM
+from sales_service import answer_stream, get_sales_bot
+from utils import METRICS
+
+SOURCES = ("cache", "fast_path", "agent")
+
+
+def ask(domain: str, session_id: str, question: str) -> Dict[str, float]:
+    bot, _ = get_sales_bot(domain)
+    bot.session(session_id).executor.verbose = False
+    started = time.perf_counter()
+    first = None
+    source = ""
+    for source, _ in answer_stream(question, domain, session_id):
+        if first is None:
+            first = time.perf_counter() - started
+    return {"total": time.perf_counter() - started, "first": first, "source": source}
+
+
+def stages(metrics: Dict[str, Dict], questions: int) -> Dict[str, Any]:
+    """Means per agent answer of what MetricsCallbackHandler recorded."""
+    summaries = metrics["summaries"]
+
+    def total(name: str) -> float:
+        return summaries.get(name, {}).get("sum", 0.0)
+
+    requests = summaries.get("request_seconds", {}).get("count", 0)
+    if not requests:
+        return {"llm_calls_per_question": 0.0, "stages_mean_ms": {}}
+    # The retriever covers embedding + FAISS search, llm time includes the RetrievalQA tool's call
+    overhead = total("request_seconds") - total("request_llm_seconds") - total("retriever_seconds")
+    return {
+        "llm_calls_per_question": round(total("llm_calls_per_request") / questions, 2),
+        "stages_mean_ms": {
+            "embedding": round(total("request_embedding_seconds") / requests * 1000, 2),
+            "faiss_search": round(total("faiss_search_seconds") / requests * 1000, 2),
+            "llm": round(total("request_llm_seconds") / requests * 1000, 2),
+            "agent_overhead": round(max(overhead, 0.0) / requests * 1000, 2),
+        },
+    }
+
+
+def run(domain: str, cache: AnswerCache, questions: List[str], users: int) -> Dict[str, Any]:
+    # Every run starts cold: no cached answers, new sessions, no metrics of earlier runs
+    cache.clear()
+    METRICS.reset()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        results = list(pool.map(lambda iq: ask(domain, f"load-{users}-{iq[0] % users}", iq[1]), enumerate(questions)))
+    elapsed = time.perf_counter() - started
+    totals = np.array([r["total"] for r in results])
+    firsts = np.array([r["first"] for r in results])
+    return {
+        "users": users,
+        "questions": len(results),
+        "throughput_qps": round(len(results) / elapsed, 2),
+        "p50_ms": round(float(np.percentile(totals, 50)) * 1000, 1),
+        "p95_ms": round(float(np.percentile(totals, 95)) * 1000, 1),
+        "p99_ms": round(float(np.percentile(totals, 99)) * 1000, 1),
+        "first_output_p50_ms": round(float(np.percentile(firsts, 50)) * 1000, 1),
+        "answers": {source: sum(r["source"] == source for r in results) for source in SOURCES},
+        **stages(METRICS.to_dict(), len(results)),
+    }
+
+
+def build_bot(llm_url: str, domain: str) -> Tuple[SalesChain, AnswerCache]:
+    settings = get_settings()
+    # The web tool is never picked by the fake llm but SerpAPIWrapper checks for a key on creation
+    os.environ.setdefault("SERPAPI_API_KEY", "benchmark")
+    # The llm SalesChain creates itself, pointed at the fake endpoint
+    llm = Api2dLLM(temperature=0, streaming=True, max_tokens=settings.LLM_MAX_TOKENS,
+                   openai_api_base=llm_url, openai_api_key="benchmark")
+    bot, cache = get_sales_bot(domain, llm=llm)
+    bot.warmup()
+    return bot, cache
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", nargs="+", default=["resources/electronic_devices_sales_qa.txt"])
+    parser.add_argument("--domain", default="electronic_devices_sales_qa")
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--latency", type=float, default=0.3, help="fake api2d latency per call in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+
+    server = FakeApi2dServer(latency=args.latency).start()
+    try:
+        _, cache = build_bot(server.url, args.domain)
+        questions = replay(args.corpus, args.questions, args.seed)
+        reports = []
+        for users in args.users:
+            calls_before = server.calls
+            report = run(args.domain, cache, questions, users)
+            report["server_calls_per_question"] = round((server.calls - calls_before) / len(questions), 2)
+            reports.append(report)
+            print(json.dumps(report, ensure_ascii=False))
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(reports, f, ensure_ascii=False, indent=1)
+    finally:
+        server.stop()
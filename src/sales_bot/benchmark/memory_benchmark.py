@@ -0,0 +1,52 @@
+"""
+    Prompt tokens and latency per turn over a long conversation for each chat memory kind.
+    Runs offline against FakeSalesLLM, latency is simulated proportionally to prompt tokens.
+    Usage (from the repository root): python src/sales_bot/benchmark/memory_benchmark.py --turns 50
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+from langchain.agents import Tool
+from langchain.callbacks.base import BaseCallbackHandler
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmark.fake_llm import FakeSalesLLM
+from chains.memory import memoryFactory
+from chains.sales_chain import SalesChain
+
+
+class PromptSizeHandler(BaseCallbackHandler):
+    def __init__(self, llm: FakeSalesLLM):
+        self._llm = llm
+        self.tokens: List[int] = []
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], **kwargs: Any) -> None:
+        self.tokens.extend(self._llm.get_num_tokens(p) for p in prompts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--max-tokens", type=int, default=1000)
+    parser.add_argument("--per-token-latency", type=float, default=0.0002)
+    parser.add_argument("--kinds", nargs="+", default=["buffer", "window", "summary"])
+    args = parser.parse_args()
+
+    tools = [Tool.from_function(func=lambda q: "无结果", name="VectorDb QA Search", description="search sales Q&A")]
+    for kind in args.kinds:
+        llm = FakeSalesLLM(per_token_latency=args.per_token_latency)
+        memory = memoryFactory(kind, llm, max_token_limit=args.max_tokens)
+        agent = SalesChain._create_agent(memory, tools, llm)
+        agent.verbose = False
+        handler = PromptSizeHandler(llm)
+        latencies = []
+        for turn in range(args.turns):
+            started = time.perf_counter()
+            agent.run({"input": f"第{turn}个问题: 这款冰箱的能效等级是多少？"}, callbacks=[handler])
+            latencies.append(time.perf_counter() - started)
+        first, last = handler.tokens[0], handler.tokens[-1]
+        print(f"{kind:<8} prompt tokens turn 1={first} turn {args.turns}={last} max={max(handler.tokens)} "
+              f"latency turn 1={latencies[0]*1000:.1f}ms turn {args.turns}={latencies[-1]*1000:.1f}ms")
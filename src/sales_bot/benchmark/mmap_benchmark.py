@@ -0,0 +1,90 @@
+"""
+    Memory of N worker processes serving the same index, heap loaded (FAISS.load_local) vs memory-mapped
+    (FaissDb(read_only=True)). Every worker loads the index, runs random-vector searches with docstore
+    lookups and, while all workers are alive, reads /proc/self/smaps_rollup: RSS counts shared pages in every
+    worker, PSS splits them among the workers sharing them, so the PSS sum is the real total. Linux only.
+    Usage (from the repository root):
+        python src/sales_bot/benchmark/mmap_benchmark.py --dbdir resources/electronic_devices_sales_qa.db --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import pickle
+import sys
+import time
+from typing import Dict
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def smaps_rollup() -> Dict[str, float]:
+    fields = {}
+    with open("/proc/self/smaps_rollup", "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {"rss": fields["Rss"], "pss": fields["Pss"], "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)}
+
+
+def worker(dbdir: str, mode: str, queries: int, barrier, results):
+    import faiss
+    from vectordbs.mmap_docstore import MmapDocstore, mmap_flags
+    started = time.perf_counter()
+    if mode == "mmap":
+        index = faiss.read_index(os.path.join(dbdir, "index.faiss"), mmap_flags())
+        docstore = MmapDocstore(dbdir)
+        index_to_docstore_id = docstore.index_to_docstore_id
+    else:
+        index = faiss.read_index(os.path.join(dbdir, "index.faiss"))
+        with open(os.path.join(dbdir, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+    loaded = time.perf_counter() - started
+    rng = np.random.default_rng(os.getpid())
+    for _ in range(queries):
+        _, found = index.search(rng.standard_normal((1, index.d)).astype(np.float32), 3)
+        for i in found[0]:
+            if i >= 0:
+                docstore.search(index_to_docstore_id[int(i)])
+    barrier.wait()
+    results.put({"load_ms": loaded * 1000, **smaps_rollup()})
+    barrier.wait()
+
+
+def run(dbdir: str, mode: str, workers: int, queries: int) -> Dict[str, float]:
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(dbdir, mode, queries, barrier, results)) for _ in range(workers)]
+    for p in processes:
+        p.start()
+    stats = [results.get() for _ in processes]
+    for p in processes:
+        p.join()
+    return {
+        "load_ms": float(np.mean([s["load_ms"] for s in stats])),
+        "rss": float(np.mean([s["rss"] for s in stats])),
+        "private": float(np.mean([s["private"] for s in stats])),
+        "pss_total": float(np.sum([s["pss"] for s in stats])),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dbdir", default="resources/electronic_devices_sales_qa.db", help="index directory built by FaissDb")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    from vectordbs.mmap_docstore import MmapDocstore
+    if not MmapDocstore.exists(args.dbdir):
+        with open(os.path.join(args.dbdir, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        MmapDocstore.write(args.dbdir, docstore, index_to_docstore_id)
+    print(f"{'workers':>8}{'mode':>6}{'load ms':>9}{'RSS MB':>9}{'private MB':>12}{'PSS total MB':>14}")
+    for workers in args.workers:
+        for mode in ("heap", "mmap"):
+            stats = run(args.dbdir, mode, workers, args.queries)
+            print(f"{workers:>8}{mode:>6}{stats['load_ms']:>9.1f}{stats['rss']:>9.1f}{stats['private']:>12.1f}{stats['pss_total']:>14.1f}")
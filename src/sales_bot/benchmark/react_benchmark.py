@@ -0,0 +1,88 @@
+"""
+    Parsing-error round-trips and worst-case latency of the ReAct loop on badly formatted llm output.
+    A scripted llm replays the formatting slips seen with the Chinese prompt (translated keywords,
+    missing `Final Answer:`, final answer after a hallucinated observation, quoted tool names) and a
+    "stubborn" case that never conforms. The stock ZeroShotAgent/AgentExecutor is compared with
+    SalesAgent/SalesOutputParser/BudgetedAgentExecutor as built by SalesChain.
+    Usage (from the repository root): python src/sales_bot/benchmark/react_benchmark.py --latency 0.2
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Any, List, Optional
+
+from langchain.agents import AgentExecutor, Tool, ZeroShotAgent
+from langchain.callbacks.manager import CallbackManagerForLLMRun
+from langchain.chains import LLMChain
+from langchain.llms.base import LLM
+from langchain.memory import ConversationBufferMemory
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chains.sales_chain import SalesChain
+
+ANSWER = "这款冰箱是一级能效，每年耗电约300度。"
+# (first step, step after the tool observation)
+SLIPS = {
+    "well_formed": ("Action: VectorDb QA Search\nAction Input: 冰箱能效", f"Final Answer: {ANSWER}"),
+    "chinese_keywords": ("行动：VectorDb QA Search\n行动输入：冰箱能效", f"最终答案：{ANSWER}"),
+    "missing_final_answer": ("Action: VectorDb QA Search\nAction Input: 冰箱能效", "I now know the final answer and can provide it to the customer."),
+    "hallucinated_answer": ("Action: VectorDb QA Search\nAction Input: 冰箱能效\nObservation: 二级能效\nFinal Answer: 二级能效", f"Final Answer: {ANSWER}"),
+    "quoted_tool": ("Action: `VectorDb QA Search`工具\nAction Input: \"冰箱能效\"", f"**Final Answer:** {ANSWER}"),
+    "stubborn": ("我需要先查询一下知识库。", "我需要先查询一下知识库。"),
+}
+
+
+class ScriptedLLM(LLM):
+    slip: str = "well_formed"
+    latency: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-react"
+
+    def get_num_tokens(self, text: str) -> int:
+        return len(text)
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        self.calls += 1
+        time.sleep(self.latency)
+        first, after_observation = SLIPS[self.slip]
+        scratchpad = prompt[prompt.rfind("客户问题:"):]
+        if "Print out LLM output" in scratchpad and self.slip != "stubborn":
+            # Re-asked after a parsing error, the llm gets the format right
+            return f"Final Answer: {ANSWER}" if ANSWER in scratchpad else SLIPS["well_formed"][0]
+        return after_observation if ANSWER in scratchpad else first
+
+
+def stock_executor(tools: List[Tool], llm: LLM) -> AgentExecutor:
+    prompt = ZeroShotAgent.create_prompt(tools, suffix="{chat_history}\n客户问题: {input}\n{agent_scratchpad}", input_variables=["input", "chat_history", "agent_scratchpad"])
+    agent = ZeroShotAgent(llm_chain=LLMChain(llm=llm, prompt=prompt))
+    return AgentExecutor.from_agent_and_tools(
+        agent=agent, tools=tools, memory=ConversationBufferMemory(memory_key="chat_history", input_key="input"),
+        handle_parsing_errors="Print out LLM output, try parsing it and make sure it conforms!",
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per llm call")
+    args = parser.parse_args()
+
+    tools = [
+        Tool.from_function(func=lambda q: ANSWER, name="VectorDb QA Search", description="search sales Q&A"),
+        Tool.from_function(func=lambda q: "无结果", name="Web Search", description="search the web"),
+    ]
+    print(f"{'slip':<22}{'stock calls':>12}{'stock s':>10}{'budgeted calls':>16}{'budgeted s':>12}  answer ok")
+    for slip in SLIPS:
+        row = []
+        for build in (stock_executor, lambda t, l: SalesChain._create_agent(ConversationBufferMemory(memory_key="chat_history", input_key="input"), t, l)):
+            llm = ScriptedLLM(slip=slip, latency=args.latency)
+            executor = build(tools, llm)
+            executor.verbose = False
+            started = time.perf_counter()
+            answer = executor.run({"input": "这款冰箱的能效等级是多少？"})
+            row.append((llm.calls, time.perf_counter() - started, answer == ANSWER))
+        (stock_calls, stock_s, _), (calls, seconds, ok) = row
+        print(f"{slip:<22}{stock_calls:>12}{stock_s:>10.2f}{calls:>16}{seconds:>12.2f}  {ok}")
@@ -0,0 +1,96 @@
+"""
+    Calibrate the retrieval threshold on labelled questions and compare plain dense retrieval with reranking.
+    Labelled set: the corpus questions cut down to keywords and every paraphrase of a multi-question record
+    (answerable, labelled with their answer), plus the questions of another domain's corpus (no answer in
+    this store, any hit is a false one). For each mode the top-1 score of every question is collected and
+    the lowest threshold reaching --precision is picked, i.e. the fewest Web Search fallbacks at that precision.
+    Reports hit rate, precision and latency (added latency over dense top-1) per mode.
+    Usage (from the repository root):
+        python src/sales_bot/benchmark/rerank_calibration.py --modes dense cosine cross-encoder --precision 0.95
+"""
+import argparse
+import os
+import sys
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmark.hybrid_benchmark import keyword_query
+from vectordbs.faissdb import FaissDb
+from vectordbs.qa_records import expand_record, parse_qa_groups
+from vectordbs.rerank import calibrate_threshold, rerankerFactory
+from vectordbs.retriever import RerankRetriever
+
+Labelled = List[Tuple[str, Optional[str]]]
+
+
+def labelled_questions(corpus: str, negatives: List[str]) -> Labelled:
+    with open(corpus, 'r', encoding='utf-8-sig') as f:
+        groups = parse_qa_groups(f.read())
+    labelled = [(keyword_query(q), answer) for questions, answer in groups for q in questions]
+    labelled += [(q, answer) for questions, answer in groups if len(questions) > 1 for q in questions]
+    for path in negatives:
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            labelled += [(q, None) for questions, _ in parse_qa_groups(f.read()) for q in questions]
+    return labelled
+
+
+def top1(mode: str, vectordb: FaissDb, retriever: Optional[RerankRetriever], query: str) -> Tuple[float, str]:
+    if mode == "dense":
+        hits = vectordb.db.similarity_search_with_relevance_scores(query, k=1)
+        return (hits[0][1], expand_record(hits[0][0]).page_content) if hits else (float("-inf"), "")
+    docs = retriever.get_relevant_documents(query)
+    return (docs[0].metadata["rerank_score"], docs[0].page_content) if docs else (float("-inf"), "")
+
+
+def hits_at(scores: np.ndarray, correct: np.ndarray, threshold: float) -> Tuple[float, float]:
+    accepted = scores >= threshold
+    return float(accepted.mean()), float(correct[accepted].mean()) if accepted.any() else 0.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default="resources/electronic_devices_sales_qa.txt")
+    parser.add_argument("--negatives", nargs="*", default=["resources/real_estate_sales_data.txt"],
+                        help="corpora of other domains, their questions have no answer in --corpus")
+    parser.add_argument("--index-mode", default="chunk", choices=["chunk", "question"])
+    parser.add_argument("--modes", nargs="+", default=["dense", "cosine"], help="dense, cosine and/or cross-encoder")
+    parser.add_argument("--cross-encoder", default=None, help="cross-encoder model name")
+    parser.add_argument("--fetch-k", type=int, default=10)
+    parser.add_argument("--precision", type=float, default=0.95, help="target precision of local answers")
+    parser.add_argument("--baseline-threshold", type=float, default=0.8, help="the fixed dense threshold in use")
+    args = parser.parse_args()
+
+    vectordb = FaissDb(args.corpus, index_mode=args.index_mode)
+    vectordb.warmup()
+    labelled = labelled_questions(args.corpus, args.negatives)
+    answerable = sum(answer is not None for _, answer in labelled)
+    print(f"{len(labelled)} labelled questions, {answerable} answerable, {len(labelled) - answerable} out of domain")
+    print(f"{'mode':<15}{'threshold':>10}{'hit rate':>10}{'precision':>11}{'fallbacks':>11}{'p50 ms':>8}{'added ms':>10}")
+    dense_p50 = None
+    for mode in args.modes:
+        retriever = None
+        if mode != "dense":
+            reranker = rerankerFactory(mode, vectordb.embedding, args.cross_encoder)
+            retriever = RerankRetriever(vectordb=vectordb, reranker=reranker, k=1, fetch_k=args.fetch_k, threshold=float("-inf"))
+        top1(mode, vectordb, retriever, "warmup")
+        scores, correct, latencies = [], [], []
+        for query, answer in labelled:
+            started = time.perf_counter()
+            score, content = top1(mode, vectordb, retriever, query)
+            latencies.append(time.perf_counter() - started)
+            scores.append(score)
+            correct.append(answer is not None and answer in content)
+        p50 = float(np.percentile(latencies, 50) * 1000)
+        dense_p50 = p50 if mode == "dense" else dense_p50
+        added = f"{p50 - dense_p50:>10.1f}" if dense_p50 is not None else f"{'-':>10}"
+        scores, correct = np.asarray(scores), np.asarray(correct)
+        if mode == "dense":
+            hit_rate, precision = hits_at(scores, correct, args.baseline_threshold)
+            print(f"{'dense (fixed)':<15}{args.baseline_threshold:>10.3f}{hit_rate:>10.3f}{precision:>11.3f}"
+                  f"{round((1 - hit_rate) * len(labelled)):>11}{p50:>8.1f}{added}")
+        calibrated = calibrate_threshold(scores, correct, args.precision)
+        print(f"{mode:<15}{calibrated['threshold']:>10.3f}{calibrated['hit_rate']:>10.3f}{calibrated['precision']:>11.3f}"
+              f"{round((1 - calibrated['hit_rate']) * len(labelled)):>11}{p50:>8.1f}{added}")
@@ -0,0 +1,58 @@
+"""
+    Web Search fallbacks with and without CachedSearch against a local fake search backend.
+    Concurrent users replay corpus questions (with repeats, like a burst of similar price lookups);
+    reports upstream calls, cache hits/coalesced waits, fallbacks and p50/p95 latency.
+    Usage (from the repository root):
+        python src/sales_bot/benchmark/search_benchmark.py --users 1 8 32 --latency 1.5 --rate 2
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmark.corpus import replay
+from benchmark.fake_search import FakeSearch
+from cache.search_cache import CachedSearch
+
+
+def measure(search, questions, users: int):
+    latencies = []
+
+    def ask(question):
+        started = time.perf_counter()
+        search(question)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(ask, questions))
+    return time.perf_counter() - started, np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", nargs="+", default=["resources/electronic_devices_sales_qa.txt"])
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--latency", type=float, default=1.5, help="seconds per fake search call")
+    parser.add_argument("--rate", type=float, default=2.0, help="search calls per second allowed")
+    parser.add_argument("--burst", type=float, default=5)
+    parser.add_argument("--timeout", type=float, default=15)
+    args = parser.parse_args()
+
+    questions = replay(args.corpus, args.questions)
+    print(f"{'users':>6}{'mode':>8}{'upstream':>10}{'hits':>6}{'coalesced':>10}{'fallbacks':>10}{'seconds':>9}{'p50 ms':>8}{'p95 ms':>8}")
+    for users in args.users:
+        backend = FakeSearch(latency=args.latency)
+        seconds, p50, p95 = measure(backend.run, questions, users)
+        print(f"{users:>6}{'direct':>8}{backend.calls:>10}{0:>6}{0:>10}{0:>10}{seconds:>9.1f}{p50 * 1000:>8.0f}{p95 * 1000:>8.0f}")
+        backend = FakeSearch(latency=args.latency)
+        search = CachedSearch(backend.run, rate=args.rate, burst=args.burst, concurrency=max(1, users // 2), timeout=args.timeout)
+        seconds, p50, p95 = measure(search.run, questions, users)
+        info = search.info()
+        print(f"{users:>6}{'cached':>8}{backend.calls:>10}{info['hits']:>6}{info['coalesced']:>10}{info['fallbacks']:>10}"
+              f"{seconds:>9.1f}{p50 * 1000:>8.0f}{p95 * 1000:>8.0f}")
@@ -0,0 +1,54 @@
+"""
+    Concurrent conversations against one shared agent with per-session memory.
+    Every simulated customer tags its questions, afterwards each session's history must contain only its own tags.
+    Usage (from the repository root): python src/sales_bot/benchmark/session_load_test.py --users 32 --turns 5
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain.agents import Tool
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmark.fake_llm import FakeSalesLLM
+from chains.memory import memoryFactory
+from chains.sales_chain import SalesChain
+from chains.session import SessionStore
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=32)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    llm = FakeSalesLLM(base_latency=args.latency)
+    tools = [Tool.from_function(func=lambda q: "无结果", name="VectorDb QA Search", description="search sales Q&A")]
+    agent = SalesChain._create_zero_shot_agent(tools, llm)
+    def new_executor():
+        executor = SalesChain._create_executor(agent, tools, memoryFactory("buffer", llm))
+        executor.verbose = False
+        return executor
+    store = SessionStore(new_executor, max_sessions=args.users)
+
+    def customer(user: int):
+        for turn in range(args.turns):
+            session = store.get(f"user-{user}")
+            with session.lock:
+                session.executor.run({"input": f"[user-{user}] 第{turn}个问题"})
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        list(pool.map(customer, range(args.users)))
+    elapsed = time.perf_counter() - started
+
+    leaks = 0
+    for user in range(args.users):
+        history = store.get(f"user-{user}").executor.memory.buffer
+        leaks += sum(f"[user-{other}]" in history for other in range(args.users) if other != user)
+        assert history.count(f"[user-{user}]") == args.turns, f"user-{user} lost turns"
+    total = args.users * args.turns
+    print(f"{total} turns by {args.users} users in {elapsed:.2f}s ({total / elapsed:.1f} turns/s), "
+          f"cross-session leaks: {leaks}, {store.info()}")
@@ -0,0 +1,58 @@
+"""
+    Import-time and cold-start benchmark.
+    Each measurement runs in a fresh interpreter so module caches don't leak between runs.
+    Usage (from the repository root): python src/sales_bot/benchmark/startup_benchmark.py [--cold-start]
+"""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Resources paths like "resources/electronic_devices_sales_qa.txt" are relative to the repository root
+REPO_ROOT = os.path.dirname(os.path.dirname(ROOT))
+HEAVY_MODULES = ["torch", "sentence_transformers"]
+
+_IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+_COLD_START_PROBE = """
+import json, time
+started = time.perf_counter()
+from vectordbs import FaissDb
+db = FaissDb()
+constructed = time.perf_counter() - started
+db.warmup()
+loaded = time.perf_counter() - started
+db.db.similarity_search("这个电视有多大尺寸？", k=1)
+print(json.dumps({"construct": constructed, "warmup": loaded, "first_query": time.perf_counter() - started}))
+"""
+
+
+def _run(code: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+        env={**os.environ, "PYTHONPATH": ROOT},
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def import_times(modules=("embedding", "vectordbs", "chains", "data_generator")) -> dict:
+    return {m: _run(_IMPORT_PROBE.format(module=m, heavy=HEAVY_MODULES)) for m in modules}
+
+
+def cold_start() -> dict:
+    return _run(_COLD_START_PROBE)
+
+
+if __name__ == "__main__":
+    for module, result in import_times().items():
+        print(f"import {module:<16} {result['seconds']:.3f}s heavy modules loaded: {result['heavy'] or 'none'}")
+    if "--cold-start" in sys.argv:
+        result = cold_start()
+        print(f"FaissDb() {result['construct']:.3f}s, warmup {result['warmup']:.3f}s, first query {result['first_query']:.3f}s")
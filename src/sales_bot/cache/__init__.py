@@ -0,0 +1,4 @@
+from .answer_cache import AnswerCache, normalize_question
+from .search_cache import CachedSearch, get_web_search
+
+__all__ = ["AnswerCache", "CachedSearch", "get_web_search", "normalize_question"]
@@ -0,0 +1,207 @@
+import os
+import pickle
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+
+_PUNCTUATION = re.compile(r"[\s\?？!！。,，.、~～]+")
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a customer question so that trivial variations share a cache key.
+    Full-width characters are folded by NFKC, case is ignored and whitespace/punctuation are dropped.
+    """
+    text = unicodedata.normalize("NFKC", question).lower()
+    return _PUNCTUATION.sub("", text)
+
+
+@dataclass
+class _Entry:
+    answer: str
+    created: float
+    vector: Optional[np.ndarray] = None
+    slot: Optional[int] = None
+
+
+@dataclass
+class CacheStats:
+    exact_hits: int = 0
+    semantic_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.exact_hits + self.semantic_hits + self.misses
+        return (self.exact_hits + self.semantic_hits) / total if total else 0.0
+
+
+class AnswerCache():
+    """
+        Two-tier answer cache in front of SalesChain.agent.
+
+        Tier 1 is an exact match on the normalized question.
+        Tier 2 embeds the question and returns the answer of the closest cached question
+        when the cosine similarity reaches `similarity_threshold`. It is off unless a threshold is given,
+        near-miss questions ("冰箱多少钱" vs "冰箱多少瓦") can score above 0.9 with small embedding models.
+        Entries are evicted by LRU once `max_size` is reached and expire after `ttl` seconds.
+        Question vectors live in a fixed (max_size, dim) matrix, one row per entry, updated on put and eviction.
+    """
+    _lock: Lock
+
+    def __init__(
+        self,
+        embedding: Optional[Embeddings] = None,
+        max_size: int = 1024,
+        ttl: Optional[float] = 24 * 3600,
+        similarity_threshold: Optional[float] = None,
+        persist_path: Optional[str] = None,
+    ):
+        self._embedding = embedding
+        self._max_size = max_size
+        self._ttl = ttl
+        self._similarity_threshold = similarity_threshold
+        self._persist_path = persist_path
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._slot_keys: List[Optional[str]] = []
+        self._free_slots: List[int] = []
+        self._lock = Lock()
+        self.stats = CacheStats()
+        if persist_path is not None and os.path.exists(persist_path):
+            self.load(persist_path)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return self._ttl is not None and now - entry.created > self._ttl
+
+    def _embed(self, question: str) -> Optional[np.ndarray]:
+        if self._embedding is None or self._similarity_threshold is None:
+            return None
+        vector = np.asarray(self._embedding.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _add(self, key: str, entry: _Entry):
+        if entry.vector is not None:
+            if self._matrix is None:
+                self._matrix = np.zeros((self._max_size, entry.vector.shape[0]), dtype=np.float32)
+                self._slot_keys = [None] * self._max_size
+                self._free_slots = list(range(self._max_size - 1, -1, -1))
+            entry.slot = self._free_slots.pop()
+            self._matrix[entry.slot] = entry.vector
+            self._slot_keys[entry.slot] = key
+        self._entries[key] = entry
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        if entry.slot is not None:
+            # A zero row scores 0 and never reaches the threshold
+            self._matrix[entry.slot] = 0
+            self._slot_keys[entry.slot] = None
+            self._free_slots.append(entry.slot)
+            entry.slot = None
+
+    def _semantic_lookup(self, vector: np.ndarray, now: float) -> Optional[str]:
+        if self._matrix is None:
+            return None
+        scores = self._matrix @ vector
+        candidates = np.flatnonzero(scores >= self._similarity_threshold)
+        for slot in candidates[np.argsort(-scores[candidates])]:
+            key = self._slot_keys[slot]
+            if self._expired(self._entries[key], now):
+                self._remove(key)
+                continue
+            self._entries.move_to_end(key)
+            return self._entries[key].answer
+        return None
+
+    def get(self, question: str) -> Optional[str]:
+        """Return the cached answer for question or None on a miss."""
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats.exact_hits += 1
+                return entry.answer
+        vector = self._embed(question)
+        with self._lock:
+            answer = self._semantic_lookup(vector, now) if vector is not None else None
+            if answer is None:
+                self.stats.misses += 1
+            else:
+                self.stats.semantic_hits += 1
+            return answer
+
+    def put(self, question: str, answer: str):
+        key = normalize_question(question)
+        vector = self._embed(question)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            while len(self._entries) >= self._max_size:
+                self._remove(next(iter(self._entries)))
+                self.stats.evictions += 1
+            self._add(key, _Entry(answer=answer, created=time.time(), vector=vector))
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def save(self, path: Optional[str] = None):
+        path = path or self._persist_path
+        if path is None:
+            raise ValueError("No persist path given for AnswerCache.")
+        with self._lock:
+            entries = list(self._entries.items())
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(entries, f)
+        os.replace(tmp, path)
+
+    def load(self, path: str):
+        with open(path, "rb") as f:
+            entries = pickle.load(f)
+        now = time.time()
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+            self._matrix = None
+            entries = [(k, e) for k, e in entries if not self._expired(e, now)]
+            for key, entry in entries[-self._max_size:]:
+                entry.slot = None
+                if self._similarity_threshold is None:
+                    entry.vector = None
+                self._add(key, entry)
+
+    def info(self) -> Dict[str, float]:
+        return {
+            "size": len(self._entries),
+            "exact_hits": self.stats.exact_hits,
+            "semantic_hits": self.stats.semantic_hits,
+            "misses": self.stats.misses,
+            "evictions": self.stats.evictions,
+            "hit_rate": self.stats.hit_rate,
+        }
+
+if __name__ == "__main__":
+    cache = AnswerCache()
+    cache.put("这个电视有多大尺寸？", "这款电视的尺寸是55英寸。")
+    print(cache.get("这个电视有多大尺寸"))
+    print(cache.get("这个冰箱的能效等级是多少？"))
+    print(cache.info())
@@ -0,0 +1,236 @@
+import json
+import os
+import pickle
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from functools import lru_cache
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cache.answer_cache import normalize_question
+from config.config import get_settings
+from utils import LOG, METRICS
+from utils.rate_limit import TokenBucket
+
+#TODO Improve web search by switching to google shop searching with more input params
+SEARCH_PARAMS = {
+    "engine": "google",
+    "location": "Austin, Texas, United States",
+    "google_domain": "google.com",
+    "gl": "cn",
+    "hl": "zh-cn",
+    "tbm": "shop"
+}
+# Observation handed to the agent when the search can't answer in time and nothing is cached
+BUSY_OBSERVATION = "网络搜索暂时不可用，请根据已有信息回答客户问题。"
+
+
+@dataclass
+class _Entry:
+    result: str
+    created: float
+
+
+@dataclass
+class _Pending:
+    future: Optional[Future] = None
+    # Callers still waiting for the result, and when the last of them gives up (time.monotonic)
+    waiters: int = 0
+    deadline: Optional[float] = None
+
+
+class CachedSearch():
+    """
+        Caching front for the "Web Search" tool's search function (e.g. SerpAPIWrapper.run).
+
+        Results are cached per normalized query and search params for `ttl` seconds (hours, since
+        prices change), LRU bounded by `max_size` and optionally persisted to `persist_path`.
+        Concurrent identical queries share one in-flight call, upstream calls run on at most
+        `concurrency` threads and are paced by a token bucket of `rate` calls per second.
+        A query not answered within `timeout` seconds of asking, queueing and rate limit wait included,
+        or whose call fails gets the expired result if there is one, else BUSY_OBSERVATION, so the agent
+        can carry on. A call already running keeps running and fills the cache for the next asker, a queued
+        one nobody waits for anymore is skipped. Beyond `max_pending` distinct queries in flight (default
+        4 x concurrency) new ones get the fallback right away instead of queueing behind them.
+    """
+    _lock: Lock
+
+    def __init__(
+        self,
+        search: Callable[[str], str],
+        params: Optional[Dict[str, Any]] = None,
+        ttl: Optional[float] = 6 * 3600,
+        max_size: int = 1024,
+        rate: float = 1.0,
+        burst: Optional[float] = None,
+        concurrency: int = 4,
+        timeout: Optional[float] = 15.0,
+        persist_path: Optional[str] = None,
+        max_pending: Optional[int] = None,
+    ):
+        self._search = search
+        self._params = json.dumps(params or {}, sort_keys=True, ensure_ascii=False)
+        self._ttl = ttl
+        self._max_size = max_size
+        self._bucket = TokenBucket(rate, burst)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="web-search")
+        self._timeout = timeout
+        self._persist_path = persist_path
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._pending: Dict[str, _Pending] = {}
+        self._max_pending = max_pending if max_pending is not None else 4 * concurrency
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.fallbacks = 0
+        self.upstream_calls = 0
+        self.skipped = 0
+        self.shed = 0
+        if persist_path is not None and os.path.exists(persist_path):
+            self.load(persist_path)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _key(self, query: str) -> str:
+        return f"{normalize_question(query)}\x1f{self._params}"
+
+    def _fresh(self, entry: _Entry, now: float) -> bool:
+        return self._ttl is None or now - entry.created <= self._ttl
+
+    def run(self, query: str) -> str:
+        key = self._key(query)
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._fresh(entry, time.time()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                METRICS.inc("web_search_total", result="hit")
+                return entry.result
+            pending = self._pending.get(key)
+            if pending is None and len(self._pending) >= self._max_pending:
+                self.shed += 1
+                result = "shed"
+            elif pending is None:
+                self.misses += 1
+                result = "miss"
+                pending = self._pending[key] = _Pending()
+                pending.future = self._executor.submit(self._fetch, key, query, pending)
+            else:
+                self.coalesced += 1
+                result = "coalesced"
+            if pending is not None:
+                pending.waiters += 1
+                if deadline is not None:
+                    pending.deadline = max(pending.deadline or 0.0, deadline)
+        METRICS.inc("web_search_total", result=result)
+        if pending is None:
+            return self._fallback(key)
+        try:
+            return pending.future.result(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            LOG.warning(f"Web search timed out after {self._timeout}s: {query}")
+        except Exception as e:
+            LOG.warning(f"Web search failed: {e}")
+        finally:
+            with self._lock:
+                pending.waiters -= 1
+        return self._fallback(key)
+
+    def _fetch(self, key: str, query: str, pending: _Pending) -> str:
+        try:
+            with self._lock:
+                if pending.waiters == 0:
+                    # Every caller gave up while this waited for a thread, don't spend quota on it
+                    self.skipped += 1
+                    METRICS.inc("web_search_total", result="skipped")
+                    raise TimeoutError("web search abandoned by its callers")
+                deadline = pending.deadline
+            if not self._bucket.acquire(timeout=None if deadline is None else max(0.0, deadline - time.monotonic())):
+                raise TimeoutError("web search rate limit exceeded")
+            started = time.perf_counter()
+            result = self._search(query)
+            METRICS.observe("web_search_seconds", time.perf_counter() - started)
+            with self._lock:
+                self.upstream_calls += 1
+                self._entries[key] = _Entry(result=result, created=time.time())
+                self._entries.move_to_end(key)
+                while len(self._entries) > self._max_size:
+                    self._entries.popitem(last=False)
+            return result
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def _fallback(self, key: str) -> str:
+        with self._lock:
+            self.fallbacks += 1
+            entry = self._entries.get(key)
+        METRICS.inc("web_search_total", result="stale" if entry is not None else "busy")
+        return entry.result if entry is not None else BUSY_OBSERVATION
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def save(self, path: Optional[str] = None):
+        path = path or self._persist_path
+        if path is None:
+            raise ValueError("No persist path given for CachedSearch.")
+        with self._lock:
+            entries = list(self._entries.items())
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(entries, f)
+        os.replace(tmp, path)
+
+    def load(self, path: str):
+        # Expired results are kept as fallback for failing or slow searches
+        with open(path, "rb") as f:
+            entries = pickle.load(f)
+        with self._lock:
+            self._entries = OrderedDict(entries)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def info(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "fallbacks": self.fallbacks,
+                "upstream_calls": self.upstream_calls,
+                "skipped": self.skipped,
+                "shed": self.shed,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+                "in_flight": len(self._pending),
+            }
+
+
+@lru_cache()
+def get_web_search() -> CachedSearch:
+    """The process wide Web Search, shared by all domains so the rate limit covers the whole SerpAPI quota."""
+    from langchain.utilities import SerpAPIWrapper
+    settings = get_settings()
+    return CachedSearch(
+        SerpAPIWrapper(params=SEARCH_PARAMS).run,
+        SEARCH_PARAMS,
+        ttl=settings.WEB_SEARCH_CACHE_TTL,
+        max_size=settings.WEB_SEARCH_CACHE_SIZE,
+        rate=settings.WEB_SEARCH_RATE,
+        burst=settings.WEB_SEARCH_BURST,
+        concurrency=settings.WEB_SEARCH_CONCURRENCY,
+        timeout=settings.WEB_SEARCH_TIMEOUT,
+        persist_path=settings.WEB_SEARCH_CACHE_PATH or None,
+        max_pending=settings.WEB_SEARCH_MAX_PENDING,
+    )
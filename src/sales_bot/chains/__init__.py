@@ -1 +1,7 @@
-from chains.sales_chain import SalesChain
\ No newline at end of file
+from chains.agent import BudgetedAgentExecutor, SalesAgent
+from chains.callbacks import FinalAnswerStreamHandler, MetricsCallbackHandler
+from chains.fast_path import FastPathRouter
+from chains.memory import memoryFactory
+from chains.output_parser import SalesOutputParser
+from chains.sales_chain import SalesChain
+from chains.session import SessionStore
\ No newline at end of file
@@ -0,0 +1,146 @@
+import os
+import re
+import sys
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from langchain.agents import AgentExecutor, ZeroShotAgent
+from langchain.callbacks.manager import Callbacks
+from langchain.schema import AgentAction, AgentFinish, OutputParserException
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chains.prompt_budget import clip_observations, fit_steps, truncate_history
+from utils import LOG
+from utils.metrics import METRICS
+
+STOPPED_ANSWER = "这个问题我要问问领导，稍后给您答复。"
+# "Thought: I now know the final answer" (or its Chinese rendering) with the `Final Answer:` left out
+_KNOWS_FINAL_ANSWER = re.compile(r"now know the final answer|知道(?:了)?最终(?:答案|回答)", re.IGNORECASE)
+
+
+def last_observation(intermediate_steps: List[Tuple[AgentAction, str]], tools: Optional[List[str]] = None) -> Optional[str]:
+    """The most recent tool output (of one of `tools` if given), skipping parsing-error retries."""
+    for action, observation in reversed(intermediate_steps):
+        if tools is not None and action.tool not in tools:
+            continue
+        if action.tool != "_Exception" and str(observation).strip():
+            return str(observation).strip()
+    return None
+
+
+class SalesAgent(ZeroShotAgent):
+    """
+        ZeroShotAgent that finishes without another llm call when it can:
+        "Thought: I now know the final answer" without a `Final Answer:` after a tool observation returns
+        that observation, and an agent stopped by its budget answers with the last observation of one of
+        `stopped_answer_tools` (or STOPPED_ANSWER) instead of "Agent stopped due to iteration limit or time limit.".
+        Only tools whose raw output is fit to show a customer belong there, e.g. the Q&A search but not web search.
+        With `max_prompt_tokens` set, every step's prompt is fitted into that many tokens: observations
+        are clipped to `max_observation_tokens`, the scratchpad gets the room left by the fixed prompt
+        (see fit_steps) and the chat history what is left after that, most recent lines first.
+        Prompt tokens per step are recorded as agent_prompt_tokens.
+    """
+    max_prompt_tokens: Optional[int] = None
+    max_observation_tokens: Optional[int] = None
+    stopped_answer_tools: List[str] = []
+
+    def _count_tokens(self, text: str) -> int:
+        return self.llm_chain.llm.get_num_tokens(text)
+
+    def _prompt_tokens(self, full_inputs: Dict[str, Any]) -> int:
+        prompt = self.llm_chain.prompt
+        return self._count_tokens(prompt.format(**{k: full_inputs.get(k, "") for k in prompt.input_variables}))
+
+    def get_full_inputs(self, intermediate_steps: List[Tuple[AgentAction, str]], **kwargs: Any) -> Dict[str, Any]:
+        if self.max_observation_tokens is not None:
+            intermediate_steps = clip_observations(self._count_tokens, intermediate_steps, self.max_observation_tokens)
+        full_inputs = super().get_full_inputs(intermediate_steps, **kwargs)
+        if self.max_prompt_tokens is not None:
+            history = str(full_inputs.get("chat_history", ""))
+            fixed = self._prompt_tokens({**full_inputs, "chat_history": "", "agent_scratchpad": ""})
+            steps = fit_steps(self._count_tokens, intermediate_steps, self._construct_scratchpad, self.max_prompt_tokens - fixed)
+            scratchpad = self._construct_scratchpad(steps)
+            remaining = self.max_prompt_tokens - fixed - self._count_tokens(scratchpad)
+            if len(steps) < len(intermediate_steps) or self._count_tokens(history) > remaining:
+                METRICS.inc("agent_prompt_truncations_total")
+            full_inputs = {**full_inputs, "agent_scratchpad": scratchpad, "chat_history": truncate_history(self._count_tokens, history, remaining)}
+        tokens = self._prompt_tokens(full_inputs)
+        METRICS.observe("agent_prompt_tokens", tokens)
+        LOG.debug(f"[prompt tokens] step {len(intermediate_steps) + 1}: {tokens}")
+        return full_inputs
+
+    def _finish_with_observation(self, error: OutputParserException, intermediate_steps: List[Tuple[AgentAction, str]]) -> Optional[AgentFinish]:
+        # Any other unparsable output goes to handle_parsing_errors, a raw Web Search dump is no answer
+        if not _KNOWS_FINAL_ANSWER.search(error.llm_output or str(error)):
+            return None
+        observation = last_observation(intermediate_steps)
+        if observation is None:
+            return None
+        METRICS.inc("agent_output_repairs_total", kind="missing_final_answer")
+        return AgentFinish({"output": observation}, f"{self.llm_prefix} {observation}")
+
+    def plan(self, intermediate_steps: List[Tuple[AgentAction, str]], callbacks: Callbacks = None, **kwargs: Any) -> Union[AgentAction, AgentFinish]:
+        try:
+            return super().plan(intermediate_steps, callbacks=callbacks, **kwargs)
+        except OutputParserException as e:
+            finish = self._finish_with_observation(e, intermediate_steps)
+            if finish is None:
+                raise
+            return finish
+
+    async def aplan(self, intermediate_steps: List[Tuple[AgentAction, str]], callbacks: Callbacks = None, **kwargs: Any) -> Union[AgentAction, AgentFinish]:
+        try:
+            return await super().aplan(intermediate_steps, callbacks=callbacks, **kwargs)
+        except OutputParserException as e:
+            finish = self._finish_with_observation(e, intermediate_steps)
+            if finish is None:
+                raise
+            return finish
+
+    def return_stopped_response(self, early_stopping_method: str, intermediate_steps: List[Tuple[AgentAction, str]], **kwargs: Any) -> AgentFinish:
+        if early_stopping_method != "force":
+            return super().return_stopped_response(early_stopping_method, intermediate_steps, **kwargs)
+        observation = last_observation(intermediate_steps, self.stopped_answer_tools)
+        answer = observation if observation is not None else STOPPED_ANSWER
+        return AgentFinish({"output": answer}, f"{self.llm_prefix} {answer}")
+
+
+class BudgetedAgentExecutor(AgentExecutor):
+    """
+        AgentExecutor that also stops once the question plus scratchpad exceed `max_tokens`,
+        which bounds the size (and so the latency and cost) of every further llm call.
+        Iteration and time limits are the standard `max_iterations`/`max_execution_time`; all early stops
+        are counted in METRICS by reason.
+    """
+    max_tokens: Optional[int] = None
+
+    def _should_continue(self, iterations: int, time_elapsed: float) -> bool:
+        if super()._should_continue(iterations, time_elapsed):
+            return True
+        reason = "iterations" if self.max_iterations is not None and iterations >= self.max_iterations else "time"
+        METRICS.inc("agent_early_stops_total", reason=reason)
+        return False
+
+    def _used_tokens(self, inputs: Dict[str, str], intermediate_steps: List[Tuple[AgentAction, str]]) -> int:
+        llm = self.agent.llm_chain.llm
+        text = inputs.get("input", "") + "".join(f"{action.log}{observation}" for action, observation in intermediate_steps)
+        return llm.get_num_tokens(text)
+
+    def _over_budget(self, inputs: Dict[str, str], intermediate_steps: List[Tuple[AgentAction, str]]) -> Optional[AgentFinish]:
+        if self.max_tokens is None or not intermediate_steps:
+            return None
+        if self._used_tokens(inputs, intermediate_steps) <= self.max_tokens:
+            return None
+        METRICS.inc("agent_early_stops_total", reason="tokens")
+        return self.agent.return_stopped_response(self.early_stopping_method, intermediate_steps, **inputs)
+
+    def _take_next_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager=None):
+        finish = self._over_budget(inputs, intermediate_steps)
+        if finish is not None:
+            return finish
+        return super()._take_next_step(name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager=run_manager)
+
+    async def _atake_next_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager=None):
+        finish = self._over_budget(inputs, intermediate_steps)
+        if finish is not None:
+            return finish
+        return await super()._atake_next_step(name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager=run_manager)
@@ -0,0 +1,214 @@
+import os
+import sys
+import time
+from collections import defaultdict
+from queue import Queue
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.schema import AgentAction, AgentFinish, LLMResult
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.metrics import METRICS, Metrics, set_stage_times, stage_times
+
+FINAL_ANSWER_PREFIX = "Final Answer:"
+# Queued when a later llm call of the run writes its final answer again, see FinalAnswerStreamHandler.partials
+_RESTART = object()
+
+
+class FinalAnswerStreamHandler(BaseCallbackHandler):
+    """
+        Forward the tokens of the agent's final answer to a queue so the UI can render partial output.
+        Planning tokens (Thought/Action/Action Input) are buffered and only the text following
+        `Final Answer:` is released, similar to langchain's FinalStreamingStdOutCallbackHandler.
+        A step can write a final answer after a hallucinated action (repaired into the action by
+        SalesOutputParser), so every llm call following released text starts the answer over.
+        Also records first-token latency against total latency of the run, and whether the run ended with
+        the llm's own final answer (`final_answer`) rather than a budget stop or a tool observation fallback.
+    """
+
+    def __init__(self, answer_prefix: str = FINAL_ANSWER_PREFIX):
+        self._answer_prefix = answer_prefix
+        self._queue: "Queue[Optional[object]]" = Queue()
+        self._buffer = ""
+        self._emitted = 0
+        self._started = time.perf_counter()
+        self.first_token_latency: Optional[float] = None
+        self.total_latency: Optional[float] = None
+        self.final_answer = False
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], **kwargs: Any) -> None:
+        if self._emitted:
+            self._queue.put(_RESTART)
+        self._buffer = ""
+        self._emitted = 0
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        self._buffer += token
+        index = self._buffer.find(self._answer_prefix)
+        if index < 0:
+            return
+        answer = self._buffer[index + len(self._answer_prefix):].lstrip()
+        if len(answer) > self._emitted:
+            if self.first_token_latency is None:
+                self.first_token_latency = time.perf_counter() - self._started
+            self._queue.put(answer[self._emitted:])
+            self._emitted = len(answer)
+
+    def on_agent_finish(self, finish: AgentFinish, **kwargs: Any) -> None:
+        self.final_answer = self._answer_prefix in finish.log
+
+    def done(self) -> None:
+        """Mark the end of the run, unblocking `partials()`."""
+        self.total_latency = time.perf_counter() - self._started
+        self._queue.put(None)
+
+    def partials(self) -> Iterator[str]:
+        """The final answer so far after every released token, back to "" when the answer starts over."""
+        partial = ""
+        while True:
+            token = self._queue.get()
+            if token is None:
+                return
+            partial = "" if token is _RESTART else partial + token
+            yield partial
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+        Per-request tracing of the agent pipeline into METRICS.
+        For every top level run it records ReAct iterations, parsing-error retries, llm calls/latency/tokens,
+        tool latency, embedding time and FAISS search time (retriever time minus the embedding time
+        reported by InstrumentedEmbeddings). One shared instance can be passed to concurrent runs.
+    """
+
+    def __init__(self, metrics: Metrics = METRICS):
+        self._metrics = metrics
+        self._lock = Lock()
+        # run id -> root run id, start time and tool name of in-flight runs
+        self._roots: Dict[UUID, UUID] = {}
+        self._started: Dict[UUID, float] = {}
+        self._tools: Dict[UUID, str] = {}
+        self._embedding_marks: Dict[UUID, float] = {}
+        self._requests: Dict[UUID, Dict[str, float]] = {}
+
+    def _begin(self, run_id: UUID, parent_run_id: Optional[UUID]) -> Dict[str, float]:
+        with self._lock:
+            root = self._roots.get(parent_run_id, run_id) if parent_run_id is not None else run_id
+            self._roots[run_id] = root
+            self._started[run_id] = time.perf_counter()
+            if root == run_id:
+                self._requests[root] = defaultdict(float)
+            return self._requests[root]
+
+    def _end(self, run_id: UUID) -> Tuple[Optional[Dict[str, float]], float]:
+        with self._lock:
+            root = self._roots.pop(run_id, run_id)
+            elapsed = time.perf_counter() - self._started.pop(run_id, time.perf_counter())
+            return self._requests.get(root), elapsed
+
+    def _request(self, run_id: UUID) -> Optional[Dict[str, float]]:
+        with self._lock:
+            return self._requests.get(self._roots.get(run_id, run_id))
+
+    def on_chain_start(self, serialized: Dict[str, Any], inputs: Dict[str, Any], *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        request = self._begin(run_id, parent_run_id)
+        if parent_run_id is None:
+            # Embedding time of this request is accumulated on the thread running it
+            set_stage_times(request)
+
+    def _finish_chain(self, run_id: UUID, parent_run_id: Optional[UUID], error: bool):
+        request, elapsed = self._end(run_id)
+        if parent_run_id is not None or request is None:
+            return
+        with self._lock:
+            self._requests.pop(run_id, None)
+        set_stage_times(None)
+        m = self._metrics
+        m.inc("requests_total", status="error" if error else "ok")
+        m.observe("request_seconds", elapsed)
+        m.observe("react_iterations", request["iterations"])
+        m.observe("parse_error_retries", request["parse_errors"])
+        m.observe("llm_calls_per_request", request["llm_calls"])
+        m.observe("request_embedding_seconds", request["embedding"])
+        m.observe("request_llm_seconds", request["llm"])
+        m.observe("request_prompt_tokens", request["prompt_tokens"])
+
+    def on_chain_end(self, outputs: Dict[str, Any], *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        self._finish_chain(run_id, parent_run_id, error=False)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        self._finish_chain(run_id, parent_run_id, error=True)
+
+    def on_agent_action(self, action: AgentAction, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        request = self._request(run_id)
+        if request is None:
+            return
+        request["iterations"] += 1
+        # AgentExecutor reports an unparsable llm output as an action of the "_Exception" tool
+        if action.tool == "_Exception":
+            request["parse_errors"] += 1
+            self._metrics.inc("agent_parse_errors_total")
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        self._begin(run_id, parent_run_id)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        request, elapsed = self._end(run_id)
+        self._metrics.observe("llm_seconds", elapsed)
+        usage = (response.llm_output or {}).get("token_usage", {})
+        for kind in ("prompt_tokens", "completion_tokens"):
+            self._metrics.inc(f"llm_{kind}_total", usage.get(kind, 0))
+        if request is not None:
+            request["llm_calls"] += 1
+            request["llm"] += elapsed
+            request["prompt_tokens"] += usage.get("prompt_tokens", 0)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        _, elapsed = self._end(run_id)
+        self._metrics.inc("llm_errors_total")
+        self._metrics.observe("llm_seconds", elapsed)
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        self._begin(run_id, parent_run_id)
+        with self._lock:
+            self._tools[run_id] = serialized.get("name", "unknown")
+
+    def _finish_tool(self, run_id: UUID, error: bool):
+        _, elapsed = self._end(run_id)
+        with self._lock:
+            tool = self._tools.pop(run_id, "unknown")
+        self._metrics.observe("tool_seconds", elapsed, tool=tool)
+        if error:
+            self._metrics.inc("tool_errors_total", tool=tool)
+
+    def on_tool_end(self, output: str, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        self._finish_tool(run_id, error=False)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        self._finish_tool(run_id, error=True)
+
+    def on_retriever_start(self, serialized: Dict[str, Any], query: str, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        self._begin(run_id, parent_run_id)
+        times = stage_times()
+        with self._lock:
+            self._embedding_marks[run_id] = times.get("embedding", 0.0) if times is not None else 0.0
+
+    def on_retriever_end(self, documents, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        _, elapsed = self._end(run_id)
+        times = stage_times()
+        with self._lock:
+            mark = self._embedding_marks.pop(run_id, 0.0)
+        embedding = (times.get("embedding", 0.0) - mark) if times is not None else 0.0
+        self._metrics.observe("retriever_seconds", elapsed)
+        self._metrics.observe("faiss_search_seconds", max(elapsed - embedding, 0.0))
+        self._metrics.inc("retriever_hits_total" if documents else "retriever_misses_total")
+
+    def on_retriever_error(self, error: BaseException, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        _, elapsed = self._end(run_id)
+        with self._lock:
+            self._embedding_marks.pop(run_id, None)
+        self._metrics.observe("retriever_seconds", elapsed)
+        self._metrics.inc("retriever_errors_total")
@@ -0,0 +1,103 @@
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass
+from threading import Lock
+from typing import Optional
+
+from langchain.llms.base import LLM
+from langchain.prompts import PromptTemplate
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from vectordbs.qa_records import ANSWER_KEY
+
+ANSWER_PATTERN = re.compile(r"销售回答\]?\s*[:：]?\s*(.+?)(?=\s*(?:\d+\.)?\s*\[?客户问题|\Z)", re.DOTALL)
+
+
+def extract_answer(content: str) -> Optional[str]:
+    """Pull the "销售回答" part out of a stored Q&A chunk.
+    Handles both "销售回答: ..." and "[销售回答] ..." layouts used by the resources corpus.
+    """
+    match = ANSWER_PATTERN.search(content)
+    return match.group(1).strip() if match else None
+
+
+def rewritePromptFactory(role: str = "电器销售") -> PromptTemplate:
+    return PromptTemplate.from_template(
+        """你是一个专业而有礼貌的{role}, 请参考已有的销售回答来回答客户问题, 不要编造参考回答以外的信息. \n
+        客户问题: {question} \n
+        参考回答: {answer} \n
+        回答:"""
+    ).partial(role=role)
+
+
+@dataclass
+class RouteStats:
+    fast_hits: int = 0
+    agent_calls: int = 0
+    fast_latency: float = 0.0
+    agent_latency: float = 0.0
+
+    @property
+    def fast_path_ratio(self) -> float:
+        total = self.fast_hits + self.agent_calls
+        return self.fast_hits / total if total else 0.0
+
+    @property
+    def mean_fast_latency(self) -> float:
+        return self.fast_latency / self.fast_hits if self.fast_hits else 0.0
+
+    @property
+    def mean_agent_latency(self) -> float:
+        return self.agent_latency / self.agent_calls if self.agent_calls else 0.0
+
+
+class FastPathRouter():
+    """
+        Pre-agent routing stage.
+        Answers straight from the vector store when the top hit's relevance score reaches `threshold`,
+        skipping the ZeroShotAgent planning calls. With an llm given, the stored answer is rewritten
+        by a single llm call instead of being returned verbatim.
+        Callers fall back to the agent on a miss and report its latency through `record_agent`.
+    """
+
+    def __init__(self, vectordb, llm: Optional[LLM] = None, threshold: float = 0.9, role: str = "电器销售"):
+        self._vectordb = vectordb
+        self._llm = llm
+        self._threshold = threshold
+        self._prompt = rewritePromptFactory(role)
+        self._lock = Lock()
+        self.stats = RouteStats()
+
+    def route(self, question: str) -> Optional[str]:
+        """Return a fast-path answer or None when the agent should handle the question."""
+        started = time.perf_counter()
+        hits = self._vectordb.db.similarity_search_with_relevance_scores(question, k=1)
+        if not hits or hits[0][1] < self._threshold:
+            return None
+        doc = hits[0][0]
+        # Question-only indexes carry the answer as payload
+        answer = doc.metadata.get(ANSWER_KEY) or extract_answer(doc.page_content)
+        if answer is None:
+            return None
+        if self._llm is not None:
+            answer = self._llm.predict(self._prompt.format(question=question, answer=answer))
+        with self._lock:
+            self.stats.fast_hits += 1
+            self.stats.fast_latency += time.perf_counter() - started
+        return answer
+
+    def record_agent(self, latency: float):
+        with self._lock:
+            self.stats.agent_calls += 1
+            self.stats.agent_latency += latency
+
+    def info(self):
+        return {
+            "fast_hits": self.stats.fast_hits,
+            "agent_calls": self.stats.agent_calls,
+            "fast_path_ratio": self.stats.fast_path_ratio,
+            "mean_fast_latency": self.stats.mean_fast_latency,
+            "mean_agent_latency": self.stats.mean_agent_latency,
+        }
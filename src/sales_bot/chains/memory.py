@@ -0,0 +1,32 @@
+from langchain.memory import (
+    ConversationBufferMemory,
+    ConversationSummaryBufferMemory,
+    ConversationTokenBufferMemory,
+)
+from langchain.schema import BaseMemory
+from langchain.schema.language_model import BaseLanguageModel
+
+MEMORY_KEY = "chat_history"
+MEMORY_KINDS = ["buffer", "window", "summary", "vectordb"]
+
+
+def memoryFactory(kind: str, llm: BaseLanguageModel, vectordb=None, max_token_limit: int = 1000) -> BaseMemory:
+    """
+        Conversation memory fed to the agent prompt through {chat_history}.
+        buffer: the whole conversation, grows with every turn.
+        window: the most recent turns that fit in max_token_limit tokens.
+        summary: recent turns within max_token_limit plus a rolling llm summary of older ones.
+        vectordb: the past exchanges most similar to the current question, see VectorDb.createMemory.
+        window/summary/vectordb keep the per-turn prompt size bounded.
+    """
+    if kind == "buffer":
+        return ConversationBufferMemory(memory_key=MEMORY_KEY, input_key="input")
+    if kind == "window":
+        return ConversationTokenBufferMemory(llm=llm, max_token_limit=max_token_limit, memory_key=MEMORY_KEY, input_key="input")
+    if kind == "summary":
+        return ConversationSummaryBufferMemory(llm=llm, max_token_limit=max_token_limit, memory_key=MEMORY_KEY, input_key="input")
+    if kind == "vectordb":
+        if vectordb is None:
+            raise ValueError("vectordb memory needs a VectorDb.")
+        return vectordb.createMemory()
+    raise ValueError(f"Unsupported memory kind {kind}, expected one of {MEMORY_KINDS}")
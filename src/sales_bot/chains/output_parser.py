@@ -0,0 +1,100 @@
+import os
+import re
+import sys
+from typing import List, Optional, Union
+
+from langchain.agents.mrkl.output_parser import FINAL_ANSWER_ACTION, MRKLOutputParser
+from langchain.schema import AgentAction, AgentFinish, OutputParserException
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.metrics import METRICS
+
+# Keywords the llm tends to translate or decorate when the prompt prefix is Chinese, with ascii or full-width
+# colons; only the colon after a keyword is rewritten, the answer text keeps its punctuation
+_MARKDOWN = re.compile(r"\*\*\s*(Thought|Action Input|Action|Final Answer)\s*([:：]?)\s*\*\*(?:[ \t]*[:：])?", re.IGNORECASE)
+_FINAL_ANSWER = re.compile(r"^[ \t]*(?:final[ \t]*answer|最终答案|最终回答|最终答复|最后答案)[ \t]*[:：]?", re.IGNORECASE | re.MULTILINE)
+_ACTION_INPUT = re.compile(r"^[ \t]*(?:action[ \t]*\d*[ \t]*input|行动输入|动作输入|操作输入)[ \t]*\d*[ \t]*[:：]", re.IGNORECASE | re.MULTILINE)
+_ACTION = re.compile(r"^[ \t]*(?:action|行动|动作|操作)[ \t]*\d*[ \t]*[:：]", re.IGNORECASE | re.MULTILINE)
+_THOUGHT = re.compile(r"^[ \t]*(?:thought|思考|想法)[ \t]*[:：]", re.IGNORECASE | re.MULTILINE)
+_OBSERVATION = re.compile(r"\n\s*(?:Observation|观察)[ \t]*[:：]", re.IGNORECASE)
+
+
+def normalize_react_output(text: str) -> str:
+    """Rewrite translated or decorated ReAct keywords (e.g. "行动：", "**Final Answer**") to the english form."""
+    text = _MARKDOWN.sub(lambda m: f"{m.group(1)}:", text)
+    text = _FINAL_ANSWER.sub(FINAL_ANSWER_ACTION, text)
+    text = _ACTION_INPUT.sub("Action Input:", text)
+    text = _ACTION.sub("Action:", text)
+    return _THOUGHT.sub("Thought:", text)
+
+
+class SalesOutputParser(MRKLOutputParser):
+    """
+        MRKLOutputParser that repairs the usual formatting slips locally instead of sending the error
+        back to the llm (each `handle_parsing_errors` retry is a full extra round-trip):
+        Chinese/markdown keywords and full-width colons, a final answer after a hallucinated observation,
+        tool names wrapped in quotes/brackets or with trailing words, and hallucinated observations
+        in the action input. Whatever can't be repaired raises as before.
+    """
+    tool_names: List[str] = []
+    repairs: int = 0
+
+    def parse(self, text: str) -> Union[AgentAction, AgentFinish]:
+        normalized = normalize_react_output(text)
+        if normalized != text:
+            self._record("keywords")
+        try:
+            output = super().parse(normalized)
+        except OutputParserException:
+            output = self._parse_action_before_answer(normalized)
+            if output is None:
+                raise
+        if isinstance(output, AgentAction):
+            output = self._repair_action(output)
+        return output
+
+    def _parse_action_before_answer(self, text: str) -> Optional[AgentAction]:
+        # "Action ... Observation: <made up> ... Final Answer: <made up>", run the action for real
+        index = text.find(FINAL_ANSWER_ACTION)
+        if index < 0:
+            return None
+        try:
+            output = super().parse(text[:index])
+        except OutputParserException:
+            return None
+        if isinstance(output, AgentAction):
+            self._record("hallucinated_answer")
+            return output
+        return None
+
+    def _repair_action(self, action: AgentAction) -> AgentAction:
+        tool, tool_input = action.tool, action.tool_input
+        match = _OBSERVATION.search(tool_input)
+        if match:
+            tool_input = tool_input[:match.start()].rstrip()
+        tool_input = tool_input.strip().strip("`'\"“”")
+        if self.tool_names and tool not in self.tool_names:
+            name = self._match_tool(tool)
+            if name is not None:
+                tool = name
+        if (tool, tool_input) == (action.tool, action.tool_input):
+            return action
+        self._record("action")
+        return AgentAction(tool, tool_input, action.log)
+
+    def _match_tool(self, tool: str) -> Optional[str]:
+        cleaned = tool.strip().strip("`'\"“”[]【】「」.。").casefold()
+        for name in self.tool_names:
+            if cleaned == name.casefold():
+                return name
+        # "VectorDb QA Search工具", "使用 Web Search"
+        candidates = [name for name in self.tool_names if name.casefold() in cleaned]
+        return max(candidates, key=len) if candidates else None
+
+    def _record(self, kind: str):
+        self.repairs += 1
+        METRICS.inc("agent_output_repairs_total", kind=kind)
+
+    @property
+    def _type(self) -> str:
+        return "sales_mrkl"
@@ -0,0 +1,60 @@
+from typing import Callable, List, Tuple
+
+from langchain.schema import AgentAction
+
+TRUNCATED = "…"
+
+Counter = Callable[[str], int]
+Step = Tuple[AgentAction, str]
+
+
+def truncate_to_tokens(count: Counter, text: str, max_tokens: int, keep_tail: bool = False) -> str:
+    """
+        Longest head (or tail) of text within max_tokens, marked with TRUNCATED.
+        Binary search on the character length, so it needs O(log n) token counts and no decoder.
+    """
+    if max_tokens <= 0:
+        return ""
+    if count(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        part = text[-middle:] if keep_tail else text[:middle]
+        if count(TRUNCATED + part if keep_tail else part + TRUNCATED) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    if low == 0:
+        return ""
+    return TRUNCATED + text[-low:] if keep_tail else text[:low] + TRUNCATED
+
+
+def truncate_history(count: Counter, history: str, max_tokens: int) -> str:
+    """The most recent lines of a chat history within max_tokens, a partial oldest line is dropped."""
+    kept = truncate_to_tokens(count, history, max_tokens, keep_tail=True)
+    if kept == history or "\n" not in kept:
+        return kept
+    return kept[kept.index("\n") + 1:]
+
+
+def clip_observations(count: Counter, steps: List[Step], max_tokens: int) -> List[Step]:
+    """Steps with every observation cut to max_tokens, e.g. a long Web Search result."""
+    return [(action, truncate_to_tokens(count, str(observation), max_tokens)) for action, observation in steps]
+
+
+def fit_steps(count: Counter, steps: List[Step], scratchpad: Callable[[List[Step]], str], max_tokens: int) -> List[Step]:
+    """
+        Steps whose scratchpad fits in max_tokens.
+        The first step (usually the VectorDb QA lookup) and the most recent ones are kept, steps in between
+        are dropped oldest first, and if the kept ones still don't fit their observations are clipped.
+    """
+    kept = list(steps)
+    while len(kept) > 2 and count(scratchpad(kept)) > max_tokens:
+        del kept[1]
+    while kept and count(scratchpad(kept)) > max_tokens:
+        longest = max(count(str(observation)) for _, observation in kept)
+        if longest <= 1:
+            break
+        kept = clip_observations(count, kept, longest // 2)
+    return kept
@@ -1,22 +1,39 @@
 import os
 import sys
 from threading import Lock
-from typing import Any, List, Optional
+from typing import Dict, List, Optional
 
 from langchain.agents import AgentExecutor, Tool, ZeroShotAgent
 from langchain.chains import LLMChain, RetrievalQA
 from langchain.llms.base import LLM
 from langchain.memory import ConversationBufferMemory
 from langchain.schema import BaseMemory
-from langchain.utilities import SerpAPIWrapper
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cache.search_cache import get_web_search
+from chains.agent import BudgetedAgentExecutor, SalesAgent
+from chains.fast_path import FastPathRouter
+from chains.memory import memoryFactory
+from chains.output_parser import SalesOutputParser
+from chains.session import Session, SessionStore
 from config.config import get_settings
+from embedding import ChineseEmbedding
 from langchain.pydantic_v1 import BaseModel, Field
 from langchain_model.api2d_model import Api2dLLM
-from vectordbs.faissdb import FaissDb
+from vectordbs.registry import VectorDbRegistry, get_registry
+from vectordbs.rerank import rerankerFactory
+from vectordbs.retriever import HybridRetriever, RerankRetriever, VectorDbRetriever
 from vectordbs.vectordb import VectorDb
 
+DEFAULT_DOMAIN = "electronic_devices_sales_qa"
+
+
+def domain_persona(domain: str) -> Dict[str, str]:
+    """Sales role (Chinese, for the prompts and the ui) and topic (English, for tool descriptions) of a domain."""
+    persona = {"role": "销售", "topic": domain.replace("_", " ")}
+    persona.update(get_settings().VECTOR_STORE_PERSONAS.get(domain, {}))
+    return persona
+
 
 class CustomerQuestion(BaseModel):
     #matching with the key in LLMChain
@@ -24,70 +41,109 @@ class CustomerQuestion(BaseModel):
 
 class SalesChain:
     #For thread safe singleton example see [here](https://refactoring.guru/design-patterns/singleton/python/example#example-1)
-    _instance = None
+    # One instance per sales domain, see VectorDbRegistry
+    _instances: Dict[str, "SalesChain"] = {}
     _lock: Lock = Lock()
 
     _tools: List[Tool]
     _agent: AgentExecutor
+    _router: FastPathRouter
+    _sessions: SessionStore
+    _vectordb: VectorDb
 
-    def __new__(cls,*args, **kwargs):
+    def __new__(cls,*args, domain: str = DEFAULT_DOMAIN, **kwargs):
         # The overriden __new__ need to have *args, **kwargs to pass param to __init__
         with cls._lock:
-            if cls._instance is None:
+            if domain not in cls._instances:
                 """
                 Here super() is calling the 'object'class whose constructor cannot take more args > 1.
                 And there's no point in calling object.__new__() with more than a class param thus it throws an exception.
                 See [stackoverflow](https://stackoverflow.com/questions/59217884/new-method-giving-error-object-new-takes-exactly-one-argument-the-typ)
                 """
-                cls._instance = super().__new__(cls) #
-        return cls._instance
+                cls._instances[domain] = super().__new__(cls) #
+        return cls._instances[domain]
 
-    def __init__(self, tools: Optional[List[Tool]] = None, memory: Optional[BaseMemory] = None):
-        vectordb = FaissDb()
-        llm = Api2dLLM(temperature=0)
+    def __init__(self, tools: Optional[List[Tool]] = None, memory: Optional[BaseMemory] = None,
+                 domain: str = DEFAULT_DOMAIN, registry: Optional[VectorDbRegistry] = None, llm: Optional[LLM] = None):
+        registry = registry if registry is not None else get_registry()
+        vectordb = registry.get(domain)
+        self._domain = domain
+        self._vectordb = vectordb
+        settings = get_settings()
+        # A single llm call must not outlive the agent's whole time budget
+        llm = llm if llm is not None else Api2dLLM(
+            temperature=0, streaming=True, max_tokens=settings.LLM_MAX_TOKENS,
+            request_timeout=min(600, settings.AGENT_MAX_EXECUTION_TIME or 600))
+        persona = domain_persona(domain)
         if tools is not None:
             self._tools = tools
         else:
-            self._tools = self._default_tools(vectordb, llm)
-        #TODO Fix exception when using vectordb's memory
-        memory = memory if memory is not None else vectordb.createMemory()
-        self._agent = self._create_agent(memory, self._tools, llm)
+            self._tools = self._default_tools(vectordb, llm, persona)
+        new_memory = lambda: memoryFactory(settings.CHAT_MEMORY, llm, vectordb, settings.CHAT_MEMORY_MAX_TOKENS)
+        # The ZeroShotAgent (llm + prompt) and tools are shared, sessions only differ by their memory
+        zero_shot = self._create_zero_shot_agent(self._tools, llm, persona)
+        self._agent = self._create_executor(zero_shot, self._tools, memory if memory is not None else new_memory())
+        self._sessions = SessionStore(
+            lambda: self._create_executor(zero_shot, self._tools, new_memory()),
+            max_sessions=settings.SESSION_MAX,
+            idle_ttl=settings.SESSION_IDLE_TTL,
+        )
+        self._router = FastPathRouter(
+            vectordb,
+            llm=llm if settings.FAST_PATH_REWRITE else None,
+            threshold=settings.FAST_PATH_THRESHOLD,
+            role=persona["role"],
+        )
 
-    def _default_tools(self, vectordb: VectorDb, llm: LLM) -> List[Tool]:
+    def _default_tools(self, vectordb: VectorDb, llm: LLM, persona: Dict[str, str]) -> List[Tool]:
         web_tool = Tool.from_function(
-            #TODO Improve web search by switching to google shop searching with more input params
-            func=SerpAPIWrapper(params = {
-                "engine": "google",
-                "location": "Austin, Texas, United States",
-                "google_domain": "google.com",
-                "gl": "cn",
-                "hl": "zh-cn",
-                "tbm": "shop"
-            }).run,
+            # Cached, coalesced and rate limited SerpAPI google shop search, see CachedSearch
+            func=get_web_search().run,
             name="Web Search",
-            description="""useful for when you could not find proper answer from 'VectorDb QA Search' tool \n
-            and need to answer questions about product specifications and market price."""
+            # Tool descriptions are re-sent on every ReAct step, keep them on one short line
+            description="useful for product specifications and market prices not found by 'VectorDb QA Search'."
             # coroutine= ... <- you can specify an async method if desired as well
         )
-        vectorqa_chain = RetrievalQA.from_chain_type(
-            llm,
-            retriever=vectordb.db.as_retriever(
+        settings = get_settings()
+        hybrid = settings.VECTOR_STORE_RETRIEVER == "hybrid" and hasattr(vectordb, "lexicalIndex")
+        if settings.VECTOR_STORE_RERANKER:
+            # Threshold on the reranker's own scale, calibrate it with benchmark/rerank_calibration.py
+            retriever = RerankRetriever(
+                vectordb=vectordb,
+                reranker=rerankerFactory(settings.VECTOR_STORE_RERANKER, vectordb.embedding, settings.VECTOR_STORE_RERANK_MODEL),
+                k=1, fetch_k=settings.VECTOR_STORE_RERANK_FETCH_K, threshold=settings.VECTOR_STORE_RERANK_THRESHOLD, lexical=hybrid,
+            )
+        elif hybrid:
+            # BM25 catches exact product terms dense similarity misses, which would otherwise go to Web Search
+            retriever = HybridRetriever(vectordb=vectordb, k=1, score_threshold=0.8,
+                                        lexical_threshold=settings.VECTOR_STORE_LEXICAL_THRESHOLD,
+                                        min_relevance=settings.VECTOR_STORE_LEXICAL_MIN_RELEVANCE)
+        else:
+            retriever = VectorDbRetriever(
+                vectordb=vectordb,
                 search_type="similarity_score_threshold",
+                # With VECTOR_STORE_INDEX_MODE=question this compares question to question, not to Q&A chunks
                 search_kwargs={"score_threshold": 0.8, "k": 1}
             )
-        )
+        vectorqa_chain = RetrievalQA.from_chain_type(llm, retriever=retriever)
         vectorqa_tool = Tool.from_function(
             func=vectorqa_chain.run,
             name="VectorDb QA Search",
-            description=" useful for searching existing electronic device sales questions and answers. you should always use this first.", #Emphasize on priority
+            description=f"useful for searching existing {persona['topic']} questions and answers. always use this first.", #Emphasize on priority
             #args_schema=CustomerQuestion
             # coroutine= ... <- you can specify an async method if desired as well
         )
         return [vectorqa_tool, web_tool]
 
-    def _create_agent(self, memory: BaseMemory, tools: List[Tool], llm: LLM) -> AgentExecutor:
+    @staticmethod
+    def _create_agent(memory: BaseMemory, tools: List[Tool], llm: LLM, persona: Optional[Dict[str, str]] = None) -> AgentExecutor:
+        return SalesChain._create_executor(SalesChain._create_zero_shot_agent(tools, llm, persona), tools, memory)
+
+    @staticmethod
+    def _create_zero_shot_agent(tools: List[Tool], llm: LLM, persona: Optional[Dict[str, str]] = None) -> ZeroShotAgent:
+        persona = persona if persona is not None else domain_persona(DEFAULT_DOMAIN)
         #prefix = """Have a conversation with a human, answering the following questions as best you can. You have access to the following tools: """
-        prefix = """你是一个专业而有礼貌的的电器销售人工智能体，优先使用"VectorDb QA Search"工具(注意不更改input的问题)，尽可能回答问题："""
+        prefix = f"""你是一个专业而有礼貌的的{persona['role']}人工智能体，优先使用"VectorDb QA Search"工具(注意不更改input的问题)，尽可能回答问题："""
         suffix = """开始!"
 
         {chat_history}
@@ -101,19 +157,61 @@ class SalesChain:
             input_variables=["input", "chat_history", "agent_scratchpad"],
         )
         llm_chain = LLMChain(llm=llm, prompt=prompt)
-        agent = ZeroShotAgent(llm_chain=llm_chain)
-        return AgentExecutor.from_agent_and_tools(
+        tool_names = [tool.name for tool in tools]
+        settings = get_settings()
+        # Formatting slips are repaired locally, only unrepairable output goes back to the llm.
+        # A stopped agent may answer with a Q&A record, raw web search results are no answer
+        return SalesAgent(llm_chain=llm_chain, allowed_tools=tool_names, output_parser=SalesOutputParser(tool_names=tool_names),
+                          stopped_answer_tools=["VectorDb QA Search"],
+                          max_prompt_tokens=settings.AGENT_MAX_PROMPT_TOKENS or None,
+                          max_observation_tokens=settings.AGENT_MAX_OBSERVATION_TOKENS or None)
+
+    @staticmethod
+    def _create_executor(agent: ZeroShotAgent, tools: List[Tool], memory: BaseMemory) -> AgentExecutor:
+        settings = get_settings()
+        return BudgetedAgentExecutor.from_agent_and_tools(
             agent=agent, tools=tools, verbose=True, memory=memory,
             # `I now know the final answer and can provide it to the customer.` is causing LLM output parse issue.
-            handle_parsing_errors="Print out LLM output, try parsing it and make sure it conforms!" #This helps to reduce eranous CoT
+            handle_parsing_errors="Print out LLM output, try parsing it and make sure it conforms!", #This helps to reduce eranous CoT
+            # Parsing-error retries count as iterations, so a confused llm can't loop forever
+            max_iterations=settings.AGENT_MAX_ITERATIONS,
+            max_execution_time=settings.AGENT_MAX_EXECUTION_TIME,
+            max_tokens=settings.AGENT_MAX_TOKENS,
+            early_stopping_method="force",
         )
     
     @property
     def agent(self):
         return self._agent
+
+    @property
+    def router(self):
+        return self._router
+
+    @property
+    def sessions(self) -> SessionStore:
+        return self._sessions
+
+    def session(self, session_id: str, history=None) -> Session:
+        """The conversation of one customer, with its own memory on top of the shared agent."""
+        return self._sessions.get(session_id, history)
+
+    @property
+    def domain(self) -> str:
+        return self._domain
+
+    @property
+    def ready(self) -> bool:
+        return self._vectordb.loaded
+
+    def warmup(self):
+        """Load the embedding model and the vector index ahead of the first customer question."""
+        self._vectordb.warmup()
+        ChineseEmbedding().warmup()
     
 if __name__ == "__main__":
-    #TODO Fix "Observation: Invalid or incomplete response" causing infinit looping on ReAct
+    # "Observation: Invalid or incomplete response" infinite ReAct looping is bounded by the AGENT_MAX_* budgets,
+    # and the usual formatting slips are repaired by SalesOutputParser/SalesAgent without another llm call.
     """Reference: 
     [Different language in instructions](https://github.com/langchain-ai/langchain/issues/8867)
     [Missing Action after Thought](https://github.com/langchain-ai/langchain/issues/12689)
@@ -0,0 +1,94 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain.agents import AgentExecutor
+
+
+@dataclass
+class Session:
+    executor: AgentExecutor
+    last_used: float
+    # Serializes turns of one conversation, different sessions run concurrently
+    lock: Lock = field(default_factory=Lock)
+    # Turns in the memory, seeded ones included
+    turns: int = 0
+
+    def remember(self, question: str, answer: str):
+        """Save a turn answered without the agent (answer cache, fast path) so the next agent turn knows it."""
+        with self.lock:
+            self.executor.memory.save_context({"input": question}, {"output": answer})
+            self.turns += 1
+
+
+class SessionStore():
+    """
+        Per-conversation AgentExecutors keyed by session id.
+        The factory is expected to share the heavy objects (llm, tools, agent prompt) and only create
+        a fresh memory, so a session costs little more than its chat history.
+        Sessions idle for longer than `idle_ttl` seconds are dropped, and at most `max_sessions` are kept
+        (least recently used first out).
+    """
+
+    def __init__(self, factory: Callable[[], AgentExecutor], max_sessions: int = 1000, idle_ttl: Optional[float] = 1800):
+        self._factory = factory
+        self._max_sessions = max_sessions
+        self._idle_ttl = idle_ttl
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = Lock()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str, history: Optional[Sequence[Tuple[str, str]]] = None) -> Session:
+        """Return the session, creating it when new or evicted.
+        A recreated session is seeded from the client's (user, bot) history so eviction doesn't lose context.
+        """
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                return self._touch(session_id, session, now)
+        # Creating a memory may embed (vectordb memory) and seeding it may call the llm (summary memory),
+        # so it happens outside the store lock and only holds up this conversation
+        created = Session(executor=self._factory(), last_used=now)
+        for user, bot in history or []:
+            if user and bot:
+                created.executor.memory.save_context({"input": user}, {"output": bot})
+                created.turns += 1
+        with self._lock:
+            # A concurrent request of the same conversation may have created it meanwhile
+            session = self._sessions.setdefault(session_id, created)
+            return self._touch(session_id, session, now)
+
+    def _touch(self, session_id: str, session: Session, now: float) -> Session:
+        session.last_used = now
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self._max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+        return session
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _evict(self, now: float):
+        if self._idle_ttl is None:
+            return
+        # OrderedDict is in LRU order, so expired sessions are all at the front
+        expired: List[str] = []
+        for session_id, session in self._sessions.items():
+            if now - session.last_used <= self._idle_ttl:
+                break
+            expired.append(session_id)
+        for session_id in expired:
+            del self._sessions[session_id]
+        self.evictions += len(expired)
+
+    def info(self) -> Dict[str, int]:
+        return {"sessions": len(self._sessions), "evictions": self.evictions}
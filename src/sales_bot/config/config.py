@@ -1,6 +1,7 @@
 import os
 import sys
 from functools import lru_cache
+from typing import Dict
 
 from pydantic_settings import BaseSettings
 
@@ -21,7 +22,68 @@ class Settings(BaseSettings):
     API2D_OPENAI_API_KEY:str = ""
     AI21_API_KEY:str = ""
     EMBEDDINGS_MODEL_NAME:str = "infgrad/stella-large-zh-v2"
+    EMBEDDINGS_BACKEND:str = "torch"
+    EMBEDDINGS_ONNX_DIR:str = "models/onnx"
+    EMBEDDING_CACHE_SIZE:int = 4096
+    EMBEDDING_BATCH_SIZE:int = 32
+    EMBEDDING_BATCH_WAIT_MS:float = 5
     SERPAPI_API_KEY:str = ""
+    WEB_SEARCH_CACHE_SIZE:int = 1024
+    WEB_SEARCH_CACHE_TTL:float = 6 * 3600
+    WEB_SEARCH_CACHE_PATH:str = ""
+    WEB_SEARCH_RATE:float = 1.0
+    WEB_SEARCH_BURST:float = 5
+    WEB_SEARCH_CONCURRENCY:int = 4
+    WEB_SEARCH_TIMEOUT:float = 15
+    WEB_SEARCH_MAX_PENDING:int = 16
+    ANSWER_CACHE_SIZE:int = 1024
+    ANSWER_CACHE_TTL:float = 24 * 3600
+    ANSWER_CACHE_SIMILARITY:float = 0
+    ANSWER_CACHE_PATH:str = ""
+    FAST_PATH_THRESHOLD:float = 0.9
+    FAST_PATH_REWRITE:bool = False
+    VECTOR_STORE_DOMAINS:Dict[str, str] = {
+        "electronic_devices_sales_qa": "resources/electronic_devices_sales_qa.txt",
+        "real_estate_sales_data": "resources/real_estate_sales_data.txt",
+    }
+    # Sales role (agent prompt, fast path rewrite, ui title) and tool description topic per domain
+    VECTOR_STORE_PERSONAS:Dict[str, Dict[str, str]] = {
+        "electronic_devices_sales_qa": {"role": "电器销售", "topic": "electronic device sales"},
+        "real_estate_sales_data": {"role": "房地产销售", "topic": "real estate sales"},
+    }
+    VECTOR_STORE_MEMORY_BUDGET_MB:float = 1024
+    VECTOR_STORE_INDEX_MODE:str = "chunk"
+    VECTOR_STORE_READ_ONLY:bool = False
+    VECTOR_STORE_RETRIEVER:str = "dense"
+    VECTOR_STORE_LEXICAL_THRESHOLD:float = 0.6
+    VECTOR_STORE_LEXICAL_MIN_RELEVANCE:float = 0.7
+    VECTOR_STORE_RERANKER:str = ""
+    VECTOR_STORE_RERANK_MODEL:str = "BAAI/bge-reranker-base"
+    VECTOR_STORE_RERANK_THRESHOLD:float = 0.8
+    VECTOR_STORE_RERANK_FETCH_K:int = 10
+    CHAT_MEMORY:str = "window"
+    CHAT_MEMORY_MAX_TOKENS:int = 1000
+    SESSION_MAX:int = 1000
+    SESSION_IDLE_TTL:float = 1800
+    GRADIO_CONCURRENCY:int = 8
+    AGENT_MAX_ITERATIONS:int = 5
+    AGENT_MAX_EXECUTION_TIME:float = 60
+    AGENT_MAX_TOKENS:int = 3000
+    AGENT_MAX_PROMPT_TOKENS:int = 2000
+    AGENT_MAX_OBSERVATION_TOKENS:int = 400
+    LLM_MAX_TOKENS:int = 256
+    METRICS_PORT:int = 0
+    METRICS_JSON_PATH:str = ""
+    METRICS_DUMP_INTERVAL:float = 60
+    API_HOST:str = "0.0.0.0"
+    API_PORT:int = 8000
+    API_WORKERS:int = 1
+    API_CONCURRENCY:int = 8
+    API_QUEUE_SIZE:int = 32
+    API_QUEUE_TIMEOUT:float = 5
+    API_TIMEOUT:float = 60
+    API_BATCH_MAX:int = 32
+    API_BATCH_CONCURRENCY:int = 2
     class Config:
         env_file = f'{os.path.dirname(os.path.dirname(os.path.abspath(__file__)))}/{os.getenv("ENVIRONMENT", "dev")}.env'
         case_sensitive = True
@@ -1,7 +1,10 @@
-
-
+import argparse
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import product
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 from langchain.llms.base import LLM
 from langchain.prompts import BasePromptTemplate, PromptTemplate
@@ -10,6 +13,15 @@ from pydantic.dataclasses import dataclass
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from langchain_model import Api2dLLM
+from utils import LOG
+from utils.rate_limit import TokenBucket
+
+DEFAULT_ROLE = "在电器行业的资深销售人员"
+DEFAULT_SCENARIOS = [
+    "客户与销售在讨价还价",
+    "客户在询问电器产品细节",
+    "客户在粗鲁地向销售抱怨"
+]
 
 
 def promptFactory() -> BasePromptTemplate:
@@ -27,6 +39,10 @@ def promptFactory() -> BasePromptTemplate:
 
 def modelFactory() -> LLM:
     return Api2dLLM()
+
+def jobKey(role: str, scenario: str, index: int) -> str:
+    return f"{role}\t{scenario}\t{index}"
+
 @dataclass
 class QAGenerator():
     """
@@ -34,33 +50,113 @@ class QAGenerator():
         For good example shots in electronic device sales, refer to [sales skills](https://zhuanlan.zhihu.com/p/357487465)
     """
 
-    _prompt: BasePromptTemplate = Field(default_factory=promptFactory) 
+    _prompt: BasePromptTemplate = Field(default_factory=promptFactory)
     _model: LLM = Field(default_factory=modelFactory)
 
     @property
     def model(self) -> LLM:
         return self._model
-    
+
     @property
     def prompt(self) -> BasePromptTemplate:
         return self._prompt
 
     def initQA(self, output: str):
+        """Regenerate the output corpus from scratch for the default electronic device scenarios."""
+        self.generateBatch(output, [DEFAULT_ROLE], DEFAULT_SCENARIOS, workers=len(DEFAULT_SCENARIOS), resume=False)
+
+    @staticmethod
+    def _readCheckpoint(checkpoint: str) -> Set[str]:
+        if not os.path.exists(checkpoint):
+            return set()
+        with open(checkpoint, 'r', encoding='utf-8') as f:
+            return {line.rstrip("\n") for line in f if line.strip()}
+
+    def generateBatch(self, output: str, roles: Iterable[str], scenarios: Iterable[str], num_qa: int = 10,
+                      rounds: int = 1, workers: int = 4, rate: Optional[float] = None, resume: bool = True,
+                      vectordb=None, ingest_every: int = 0) -> Dict[str, int]:
+        """
+            Generate Q&A for every (role, scenario, round) concurrently on a bounded thread pool.
+            Args:
+                rate: Maximum llm requests per second across workers, None for no limit.
+                resume: Skip the jobs recorded in `{output}.checkpoint` and append to output,
+                    otherwise both files are truncated first.
+                vectordb: An incremental FaissDb of output, updated with the new pairs after every
+                    `ingest_every` finished jobs (0 for once at the end).
+            Every result is appended to output and checkpointed as soon as it arrives, so a failure or
+            interruption only loses the jobs in flight. Failed jobs aren't checkpointed and are retried
+            by the next resumed run.
+        """
         from langchain.chains import LLMChain
-        role = "在电器行业的资深销售人员"
-        scenarios = [
-            "客户与销售在讨价还价", 
-            "客户在询问电器产品细节",
-            "客户在粗鲁地向销售抱怨"
-        ]
-        qa = QAGenerator()
-        num_qa = 10
-        chain = LLMChain(llm=qa.model, prompt=qa.prompt)
-        result = [chain.run(role=role, num_qa=num_qa, scenario=s) for s in scenarios]
-        with open(output, 'w', encoding='utf-8-sig') as f:
-            f.writelines(result)
+        checkpoint = f"{output}.checkpoint"
+        if not resume:
+            for path in (output, checkpoint):
+                if os.path.exists(path):
+                    os.remove(path)
+        done = self._readCheckpoint(checkpoint)
+        all_jobs = list(product(roles, scenarios, range(rounds)))
+        jobs: List[Tuple[str, str, int]] = [job for job in all_jobs if jobKey(*job) not in done]
+        stats = {"skipped": len(all_jobs) - len(jobs), "generated": 0, "failed": 0}
+        if not jobs:
+            return stats
+        chain = LLMChain(llm=self.model, prompt=self.prompt)
+        bucket = TokenBucket(rate) if rate else None
+
+        def generate(role: str, scenario: str) -> str:
+            if bucket is not None:
+                bucket.acquire()
+            return chain.run(role=role, num_qa=num_qa, scenario=scenario)
+
+        started = time.perf_counter()
+        # Only this thread writes, workers just return their text
+        with ThreadPoolExecutor(max_workers=workers) as pool, \
+                open(output, 'a', encoding='utf-8-sig') as out, \
+                open(checkpoint, 'a', encoding='utf-8') as ckpt:
+            futures = {pool.submit(generate, role, scenario): (role, scenario, r) for role, scenario, r in jobs}
+            for future in as_completed(futures):
+                role, scenario, r = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    stats["failed"] += 1
+                    LOG.error(f"QA generation failed for {scenario} ({role}, round {r}): {e}")
+                    continue
+                out.write(result if result.endswith("\n") else result + "\n")
+                out.flush()
+                ckpt.write(jobKey(role, scenario, r) + "\n")
+                ckpt.flush()
+                stats["generated"] += 1
+                if vectordb is not None and ingest_every and stats["generated"] % ingest_every == 0:
+                    LOG.info(f"Ingested into {output}: {vectordb.updateDb()}")
+        if vectordb is not None and stats["generated"]:
+            LOG.info(f"Ingested into {output}: {vectordb.updateDb()}")
+        LOG.info(f"Generated {stats['generated']}/{len(jobs)} jobs in {time.perf_counter() - started:.1f}s with {workers} workers: {stats}")
+        return stats
 
 
 if __name__ == "__main__":
-    qa = QAGenerator()
-    qa.initQA("resources/electronic_devices_sales_qa.txt")
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", default="resources/electronic_devices_sales_qa.txt")
+    parser.add_argument("--role", action="append", help="repeatable, defaults to the electronic device sales role")
+    parser.add_argument("--scenarios", help="file with one scenario per line, defaults to the three built-in ones")
+    parser.add_argument("--num-qa", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=1, help="generations per (role, scenario)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=None, help="max llm requests per second")
+    parser.add_argument("--fresh", action="store_true", help="ignore the checkpoint and overwrite output")
+    parser.add_argument("--ingest", action="store_true", help="incrementally update the FAISS index of output")
+    parser.add_argument("--ingest-every", type=int, default=0)
+    args = parser.parse_args()
+
+    scenarios = DEFAULT_SCENARIOS
+    if args.scenarios:
+        with open(args.scenarios, 'r', encoding='utf-8-sig') as f:
+            scenarios = [line.strip() for line in f if line.strip()]
+    vectordb = None
+    if args.ingest:
+        from vectordbs import FaissDb
+        vectordb = FaissDb(args.output, incremental=True)
+    QAGenerator().generateBatch(
+        args.output, args.role or [DEFAULT_ROLE], scenarios, num_qa=args.num_qa, rounds=args.rounds,
+        workers=args.workers, rate=args.rate, resume=not args.fresh, vectordb=vectordb, ingest_every=args.ingest_every,
+    )
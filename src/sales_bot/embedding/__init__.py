@@ -1,3 +1,5 @@
+from .backends import EMBEDDING_BACKENDS, embeddingFactory
 from .chinese_embedding import ChineseEmbedding
+from .embedding_service import EmbeddingService
 
-__all__ = ["ChineseEmbedding"]
\ No newline at end of file
+__all__ = ["EMBEDDING_BACKENDS", "ChineseEmbedding", "EmbeddingService", "embeddingFactory"]
\ No newline at end of file
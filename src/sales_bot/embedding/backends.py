@@ -0,0 +1,91 @@
+import os
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain.embeddings import HuggingFaceEmbeddings
+from langchain.schema.embeddings import Embeddings
+
+EMBEDDING_BACKENDS = ["torch", "int8", "onnx", "onnx-int8"]
+DEFAULT_ONNX_DIR = "models/onnx"
+
+
+class QuantizedHuggingFaceEmbeddings(HuggingFaceEmbeddings):
+    """
+        HuggingFaceEmbeddings with the transformer's Linear layers dynamically quantized to int8 (CPU only).
+        Weights shrink to roughly a quarter and matmuls run on int8 kernels, vectors stay float.
+    """
+    backend: str = "int8"
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        import torch
+        transformer = self.client[0]
+        transformer.auto_model = torch.quantization.quantize_dynamic(transformer.auto_model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+        Sentence embeddings on ONNX Runtime, mean pooled over the attention mask like the
+        sentence-transformers model stella-large-zh loads as.
+        The model is exported with optimum on first use into `onnx_dir` (optionally int8 dynamically
+        quantized) and loaded from there afterwards. Needs `pip install optimum[onnxruntime]`.
+    """
+
+    def __init__(self, model_name: str, quantize: bool = False, onnx_dir: str = DEFAULT_ONNX_DIR,
+                 max_length: int = 512, batch_size: int = 32):
+        try:
+            from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+            from optimum.onnxruntime.configuration import AutoQuantizationConfig
+            from transformers import AutoTokenizer
+        except ImportError as exc:
+            raise ImportError(
+                "Could not import optimum python package. "
+                "Please install it with `pip install optimum[onnxruntime]`."
+            ) from exc
+        self.model_name = model_name
+        self.backend = "onnx-int8" if quantize else "onnx"
+        self._max_length = max_length
+        self._batch_size = batch_size
+        export_dir = os.path.join(onnx_dir, model_name.replace("/", "_"))
+        if not os.path.exists(os.path.join(export_dir, "model.onnx")):
+            ORTModelForFeatureExtraction.from_pretrained(model_name, export=True).save_pretrained(export_dir)
+            AutoTokenizer.from_pretrained(model_name).save_pretrained(export_dir)
+        model_dir, file_name = export_dir, "model.onnx"
+        if quantize:
+            model_dir, file_name = f"{export_dir}-int8", "model_quantized.onnx"
+            if not os.path.exists(os.path.join(model_dir, file_name)):
+                quantizer = ORTQuantizer.from_pretrained(export_dir)
+                quantizer.quantize(save_dir=model_dir, quantization_config=AutoQuantizationConfig.avx2(is_static=False, per_channel=False))
+        self._tokenizer = AutoTokenizer.from_pretrained(export_dir)
+        self._model = ORTModelForFeatureExtraction.from_pretrained(model_dir, file_name=file_name)
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        encoded = self._tokenizer(texts, padding=True, truncation=True, max_length=self._max_length, return_tensors="np")
+        hidden = self._model(**encoded).last_hidden_state
+        hidden = hidden.numpy() if hasattr(hidden, "numpy") else np.asarray(hidden)
+        mask = encoded["attention_mask"][..., None].astype(hidden.dtype)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = [t.replace("\n", " ") for t in texts]
+        batches = [self._embed(texts[i:i + self._batch_size]) for i in range(0, len(texts), self._batch_size)]
+        return np.concatenate(batches).tolist() if batches else []
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def embeddingFactory(model_name: str, backend: str = "torch", onnx_dir: Optional[str] = None) -> Embeddings:
+    """
+        torch: fp32 sentence-transformers, the baseline.
+        int8: torch with dynamically quantized Linear layers.
+        onnx / onnx-int8: ONNX Runtime export, fp32 or int8 dynamically quantized.
+        A smaller (distilled) model is chosen by model_name and combines with any backend.
+    """
+    if backend == "torch":
+        return HuggingFaceEmbeddings(model_name=model_name)
+    if backend == "int8":
+        return QuantizedHuggingFaceEmbeddings(model_name=model_name)
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxEmbeddings(model_name, quantize=backend == "onnx-int8", onnx_dir=onnx_dir or DEFAULT_ONNX_DIR)
+    raise ValueError(f"Unsupported embedding backend {backend}, expected one of {EMBEDDING_BACKENDS}")
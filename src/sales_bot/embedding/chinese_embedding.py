@@ -1,6 +1,52 @@
+import os
+import sys
+import time
 from threading import Lock
+from typing import Any, List, Optional
 
-from langchain.embeddings import HuggingFaceEmbeddings
+from langchain.schema.embeddings import Embeddings
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.config import get_settings
+from embedding.backends import embeddingFactory
+from embedding.embedding_service import EmbeddingService
+from utils.metrics import METRICS, stage_times
+
+
+class InstrumentedEmbeddings(Embeddings):
+    """
+        Records embedding latency to METRICS and to the stage times of the request on the calling thread.
+        Other attributes (e.g. model_name) are forwarded to the wrapped embeddings.
+    """
+
+    def __init__(self, inner: Embeddings):
+        self._inner = inner
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "_inner":
+            raise AttributeError(name)
+        return getattr(self._inner, name)
+
+    def _record(self, kind: str, started: float):
+        elapsed = time.perf_counter() - started
+        METRICS.observe("embedding_seconds", elapsed, kind=kind)
+        times = stage_times()
+        if times is not None:
+            times["embedding"] = times.get("embedding", 0.0) + elapsed
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        started = time.perf_counter()
+        try:
+            return self._inner.embed_documents(texts)
+        finally:
+            self._record("documents", started)
+
+    def embed_query(self, text: str) -> List[float]:
+        started = time.perf_counter()
+        try:
+            return self._inner.embed_query(text)
+        finally:
+            self._record("query", started)
 
 
 class ChineseEmbedding():
@@ -8,6 +54,12 @@ class ChineseEmbedding():
         Singleton embedding instance for Chinese embedding.
         Model chosen according to MTEB [benchmarking](https://huggingface.co/spaces/mteb/leaderboard).
 
+        The model is loaded on first access of `embeddings` (or by `warmup()`) instead of at import time,
+        so importing vectordbs/chains stays cheap.
+        Queries go through an EmbeddingService (cache + micro-batching) shared by all request threads.
+        The model (EMBEDDINGS_MODEL_NAME) and its CPU inference backend (EMBEDDINGS_BACKEND: torch, int8,
+        onnx, onnx-int8) come from the settings, see embeddingFactory.
+
         [Issues] No sentence-transformers model found with name sentence_transformers\infgrad_stella-large-zh-v2. Creating a new one with MEAN pooling.
         [Solution](https://huggingface.co/GanymedeNil/text2vec-large-chinese/discussions/10)
     """
@@ -15,12 +67,30 @@ class ChineseEmbedding():
     _instance = None
     _lock: Lock = Lock()
 
-    _model_name = "infgrad/stella-large-zh-v2"
-    _embeddings = HuggingFaceEmbeddings(model_name=_model_name)
+    _embeddings: Optional[Embeddings] = None
 
     @property
-    def embeddings(self):
-        return self._embeddings
+    def embeddings(self) -> Embeddings:
+        if ChineseEmbedding._embeddings is None:
+            with self._lock:
+                if ChineseEmbedding._embeddings is None:
+                    settings = get_settings()
+                    service = EmbeddingService(
+                        embeddingFactory(settings.EMBEDDINGS_MODEL_NAME, settings.EMBEDDINGS_BACKEND, settings.EMBEDDINGS_ONNX_DIR),
+                        cache_size=settings.EMBEDDING_CACHE_SIZE,
+                        max_batch_size=settings.EMBEDDING_BATCH_SIZE,
+                        max_wait=settings.EMBEDDING_BATCH_WAIT_MS / 1000,
+                    )
+                    ChineseEmbedding._embeddings = InstrumentedEmbeddings(service)
+        return ChineseEmbedding._embeddings
+
+    @property
+    def loaded(self) -> bool:
+        return ChineseEmbedding._embeddings is not None
+
+    def warmup(self):
+        """Load the model and run one forward pass so the first request doesn't pay for it."""
+        self.embeddings.embed_query("warmup")
 
     def __new__(cls):
         with cls._lock:
@@ -29,4 +99,4 @@ class ChineseEmbedding():
         return cls._instance
 
 if __name__ == "__main__":
-    print(ChineseEmbedding().embeddings.embed_query("Test sentence for embedding"))
\ No newline at end of file
+    print(ChineseEmbedding().embeddings.embed_query("Test sentence for embedding"))
@@ -0,0 +1,148 @@
+import os
+import re
+import sys
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from queue import Empty, Queue
+from threading import Lock, Thread
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.schema.embeddings import Embeddings
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.metrics import METRICS
+
+_WHITESPACE = re.compile(r"\s+")
+
+_Request = Tuple[str, str, Future]
+
+
+def normalize_query(text: str) -> str:
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip().lower()
+
+
+class EmbeddingService(Embeddings):
+    """
+        Query embedding shared by all request threads.
+        Query vectors are cached in an LRU keyed by normalized text, identical in-flight queries wait on
+        the same result, and misses are queued to one worker thread that collects up to `max_batch_size`
+        queries within `max_wait` seconds and embeds them in a single `embed_documents` forward pass,
+        instead of one batch-size-1 pass per request thread.
+        Meant for models where query and document embeddings are the same (no query instruction),
+        like stella-large-zh. `embed_documents` (ingest) goes straight to the wrapped model.
+    """
+
+    def __init__(self, inner: Embeddings, cache_size: int = 4096, max_batch_size: int = 32, max_wait: float = 0.005):
+        self._inner = inner
+        self._cache_size = cache_size
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._pending: Dict[str, Future] = {}
+        self._queue: "Queue[Optional[_Request]]" = Queue()
+        self._lock = Lock()
+        self._worker: Optional[Thread] = None
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.embedded = 0
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "_inner":
+            raise AttributeError(name)
+        return getattr(self._inner, name)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                METRICS.inc("embedding_cache_total", result="hit")
+                return vector
+            self.misses += 1
+            future = self._pending.get(key)
+            if future is None:
+                future = Future()
+                self._pending[key] = future
+                self._queue.put((key, text, future))
+                if self._worker is None:
+                    self._worker = Thread(target=self._run, name="embedding-service", daemon=True)
+                    self._worker.start()
+        METRICS.inc("embedding_cache_total", result="miss")
+        return future.result()
+
+    def _collect(self, first: _Request) -> List[_Request]:
+        batch = [first]
+        deadline = time.monotonic() + self._max_wait
+        while len(batch) < self._max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except Empty:
+                break
+            if request is None:
+                # Keep the stop marker for the main loop
+                self._queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            METRICS.observe("embedding_batch_size", len(batch))
+            METRICS.observe("embedding_queue_depth", self._queue.qsize())
+            try:
+                vectors = self._inner.embed_documents([text for _, text, _ in batch])
+            except Exception as e:
+                with self._lock:
+                    for key, _, _ in batch:
+                        self._pending.pop(key, None)
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            with self._lock:
+                self.batches += 1
+                self.embedded += len(batch)
+                for (key, _, _), vector in zip(batch, vectors):
+                    self._pending.pop(key, None)
+                    if self._cache_size > 0:
+                        self._cache[key] = vector
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+            for (_, _, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def close(self):
+        """Stop the worker thread after the queued queries are embedded."""
+        with self._lock:
+            if self._worker is None:
+                return
+            worker, self._worker = self._worker, None
+        self._queue.put(None)
+        worker.join()
+
+    def info(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "cached": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "batches": self.batches,
+                "mean_batch_size": self.embedded / self.batches if self.batches else 0.0,
+                "queue_depth": self._queue.qsize(),
+            }
@@ -1,8 +1,13 @@
+import asyncio
+import json
+from functools import lru_cache
 from typing import (
     AbstractSet,
     Any,
+    AsyncIterator,
     Collection,
     Dict,
+    Iterator,
     List,
     Literal,
     Mapping,
@@ -11,13 +16,32 @@ from typing import (
     Union,
 )
 
+import aiohttp
 import requests
-from langchain.callbacks.manager import CallbackManagerForLLMRun
+from langchain.callbacks.manager import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
 from langchain.llms.base import LLM
-from langchain.pydantic_v1 import Field, root_validator
+from langchain.pydantic_v1 import Field, PrivateAttr, root_validator
+from langchain.schema import Generation, LLMResult
+from langchain.schema.output import GenerationChunk
 from langchain.utils import get_from_dict_or_env
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from utils import LOG
 
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+@lru_cache()
+def _tiktoken_encoding(model_name: str):
+    import tiktoken
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
 
 class Api2dLLM(LLM):
     # Instead of extending BaseOpenAI, subclassing LLM makes it easy to customize "_call"
@@ -52,12 +76,19 @@ class Api2dLLM(LLM):
     openai_proxy: Optional[str] = None
     batch_size: int = 20
     """Batch size to use when passing multiple documents to generate."""
-    request_timeout: Optional[Union[float, Tuple[float, float]]] = None
-    """Timeout for requests to OpenAI completion API. Default is 600 seconds."""
+    request_timeout: Optional[Union[float, Tuple[float, float]]] = 600
+    """Timeout for requests to OpenAI completion API. Default is 600 seconds.
+    A tuple is read as (connect timeout, read timeout)."""
     logit_bias: Optional[Dict[str, float]] = Field(default_factory=dict)
     """Adjust the probability of specific tokens being generated."""
     max_retries: int = 6
     """Maximum number of retries to make when generating."""
+    retry_backoff_factor: float = 0.5
+    """Exponential backoff between retries: factor * 2 ** (retry - 1) seconds."""
+    pool_connections: int = 10
+    """Number of connection pools (one per host) kept by the http session."""
+    pool_maxsize: int = 10
+    """Maximum number of keep-alive connections per host."""
     streaming: bool = False
     """Whether to stream the results or not."""
     allowed_special: Union[Literal["all"], AbstractSet[str]] = set()
@@ -66,6 +97,8 @@ class Api2dLLM(LLM):
     """Set of special tokens that are not allowed。"""
     tiktoken_model_name: Optional[str] = None
     stop: Optional[List[str]] = None
+    _session: Optional[requests.Session] = PrivateAttr(default=None)
+    _asessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = PrivateAttr(default_factory=dict)
     class Config():
         """Configuration for this pydantic object."""
         allow_population_by_field_name = True
@@ -107,13 +140,74 @@ class Api2dLLM(LLM):
     def _llm_type(self) -> str:
         return "api2d"
 
-    def _call(
-        self,
-        prompt: str,
-        stop: Optional[List[str]] = None,
-        run_manager: Optional[CallbackManagerForLLMRun] = None,
-        **kwargs: Any,
-    ) -> str:
+    def get_token_ids(self, text: str) -> List[int]:
+        """Token ids by tiktoken for `tiktoken_model_name` (or model_name), the GPT-2 tokenizer without tiktoken."""
+        try:
+            encoding = _tiktoken_encoding(self.tiktoken_model_name or self.model_name)
+        except ImportError:
+            return super().get_token_ids(text)
+        return encoding.encode(text, allowed_special=self.allowed_special, disallowed_special=self.disallowed_special)
+
+    @property
+    def session(self) -> requests.Session:
+        """Keep-alive http session shared by all sync calls of this llm."""
+        if self._session is None:
+            retry = Retry(
+                total=self.max_retries,
+                backoff_factor=self.retry_backoff_factor,
+                status_forcelist=RETRY_STATUS_CODES,
+                allowed_methods=frozenset(["POST"]),
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=self.pool_connections,
+                pool_maxsize=self.pool_maxsize,
+                max_retries=retry,
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({"Authorization": f"Bearer {self.openai_api_key}"})
+            if self.openai_proxy:
+                session.proxies.update({"http": self.openai_proxy, "https": self.openai_proxy})
+            self._session = session
+        return self._session
+
+    def _get_asession(self) -> aiohttp.ClientSession:
+        # aiohttp sessions are bound to the event loop they were created in, so keep one per loop.
+        # Sessions of loops that are already closed can't be closed anymore and are only dropped.
+        loop = asyncio.get_running_loop()
+        for other in [other for other in self._asessions if other.is_closed()]:
+            del self._asessions[other]
+        session = self._asessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=self.pool_maxsize)
+            session = aiohttp.ClientSession(
+                connector=connector,
+                headers={"Authorization": f"Bearer {self.openai_api_key}"},
+                timeout=self._aiohttp_timeout(),
+            )
+            self._asessions[loop] = session
+        return session
+
+    def _aiohttp_timeout(self) -> aiohttp.ClientTimeout:
+        if isinstance(self.request_timeout, tuple):
+            connect, read = self.request_timeout
+            return aiohttp.ClientTimeout(connect=connect, sock_read=read)
+        return aiohttp.ClientTimeout(total=self.request_timeout)
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    async def aclose(self):
+        """Close the aiohttp session of the running event loop."""
+        session = self._asessions.pop(asyncio.get_running_loop(), None)
+        if session is not None and not session.closed:
+            await session.close()
+
+    def _build_request(self, prompt: str, stop: Optional[List[str]], stream: bool = False, **kwargs: Any) -> Tuple[str, Dict[str, Any], bool]:
         if self.stop is not None and stop is not None:
             raise ValueError("`stop` found in both the input and default params.")
         elif self.stop is not None:
@@ -130,25 +224,215 @@ class Api2dLLM(LLM):
                 "model": self.model_name,
                 "messages": [
                     {"role": "user", "content": prompt}
-                ]
+                ],
+                "temperature": params["temperature"],
+                "top_p": params["top_p"],
+                "frequency_penalty": params["frequency_penalty"],
+                "presence_penalty": params["presence_penalty"],
+                "n": params["n"],
             }
+            # -1 means as many as the context allows, which the chat api expresses by leaving it out
+            if params["max_tokens"] > 0:
+                input["max_tokens"] = params["max_tokens"]
+            if stop:
+                input["stop"] = stop
+            if params["logit_bias"]:
+                input["logit_bias"] = params["logit_bias"]
             url = f"{self.openai_api_base}/{self.openai_api_chatcompletion}"
+        if stream:
+            input["stream"] = True
+        return url, input, is_gpt3_5
 
-        response = requests.post(
-            url=url,
-            headers={"Authorization": f"Bearer {self.openai_api_key}"},
-            json=input,
+    @staticmethod
+    def _raise_for_status(status_code: int, text: str):
+        """Raise for a non-200 response. Error bodies aren't always json, proxies answer with html pages."""
+        if status_code == 200:
+            return
+        try:
+            body = json.loads(text)
+            optional_detail = body.get("error") if isinstance(body, dict) else body
+        except ValueError:
+            optional_detail = text[:200]
+        raise ValueError(
+            f"Api2d call failed with status code {status_code}."
+            f" Details: {optional_detail}"
         )
-        if response.status_code != 200:
-            optional_detail = response.json().get("error")
-            raise ValueError(
-                f"Api2d call failed with status code {response.status_code}."
-                f" Details: {optional_detail}"
-            )
-        
+
+    @staticmethod
+    def _parse_response(body: Dict[str, Any], is_gpt3_5: bool) -> str:
         #return response.json()["completions"][0]["data"]["text"]
-        return response.json()["choices"][0]["message"]["content"].strip() if is_gpt3_5 \
-            else response.json()["choices"][0]["text"].strip()
+        return body["choices"][0]["message"]["content"].strip() if is_gpt3_5 \
+            else body["choices"][0]["text"].strip()
+
+    @staticmethod
+    def _parse_sse_line(line: str, is_gpt3_5: bool) -> Optional[str]:
+        """Extract the token text of one `data: {...}` server-sent event line.
+        Returns None for keep-alives, comments and the final `data: [DONE]`.
+        """
+        if not line.startswith("data:"):
+            return None
+        data = line[len("data:"):].strip()
+        if not data or data == "[DONE]":
+            return None
+        choice = json.loads(data)["choices"][0]
+        token = choice.get("delta", {}).get("content") if is_gpt3_5 else choice.get("text")
+        return token or None
+
+    @staticmethod
+    def _parse_usage(body: Dict[str, Any]) -> Optional[Dict[str, int]]:
+        """The `usage` token counts of a completion response, None when the api left them out."""
+        usage = body.get("usage")
+        if not isinstance(usage, dict) or "prompt_tokens" not in usage or "completion_tokens" not in usage:
+            return None
+        return {"prompt_tokens": int(usage["prompt_tokens"]), "completion_tokens": int(usage["completion_tokens"])}
+
+    def _complete(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Tuple[str, Optional[Dict[str, int]]]:
+        """Completion text and the api's token usage (None for streamed completions)."""
+        if self.streaming:
+            completion = ""
+            for chunk in self._stream(prompt, stop, run_manager, **kwargs):
+                completion += chunk.text
+            return completion.strip(), None
+        url, input, is_gpt3_5 = self._build_request(prompt, stop, **kwargs)
+        # Retries with exponential backoff are handled by the mounted HTTPAdapter
+        response = self.session.post(url=url, json=input, timeout=self.request_timeout)
+        self._raise_for_status(response.status_code, response.text)
+        body = response.json()
+        return self._parse_response(body, is_gpt3_5), self._parse_usage(body)
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        return self._complete(prompt, stop, run_manager, **kwargs)[0]
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        url, input, is_gpt3_5 = self._build_request(prompt, stop, stream=True, **kwargs)
+        with self.session.post(url=url, json=input, timeout=self.request_timeout, stream=True) as response:
+            if response.status_code != 200:
+                self._raise_for_status(response.status_code, response.text)
+            # Split bytes and decode each line as UTF-8: without a charset requests decodes as ISO-8859-1,
+            # and str.splitlines breaks at its \x85 inside Chinese characters
+            for raw in response.iter_lines():
+                line = raw.decode("utf-8").strip()
+                token = self._parse_sse_line(line, is_gpt3_5) if line else None
+                if token is None:
+                    continue
+                chunk = GenerationChunk(text=token)
+                if run_manager:
+                    run_manager.on_llm_new_token(token, chunk=chunk)
+                yield chunk
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        return (await self._acomplete(prompt, stop, run_manager, **kwargs))[0]
+
+    async def _acomplete(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Tuple[str, Optional[Dict[str, int]]]:
+        if self.streaming:
+            completion = ""
+            async for chunk in self._astream(prompt, stop, run_manager, **kwargs):
+                completion += chunk.text
+            return completion.strip(), None
+        url, input, is_gpt3_5 = self._build_request(prompt, stop, **kwargs)
+        session = self._get_asession()
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with session.post(url, json=input, proxy=self.openai_proxy) as response:
+                    if response.status in RETRY_STATUS_CODES and attempt < self.max_retries:
+                        LOG.warning(f"Api2d returned {response.status}, retrying ({attempt + 1}/{self.max_retries})")
+                    else:
+                        self._raise_for_status(response.status, await response.text())
+                        body = await response.json(content_type=None)
+                        return self._parse_response(body, is_gpt3_5), self._parse_usage(body)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt >= self.max_retries:
+                    raise
+                LOG.warning(f"Api2d request failed with {e!r}, retrying ({attempt + 1}/{self.max_retries})")
+            await asyncio.sleep(self.retry_backoff_factor * (2 ** attempt))
+        raise ValueError("Api2d call failed after exhausting retries.")
+
+    async def _astream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[GenerationChunk]:
+        url, input, is_gpt3_5 = self._build_request(prompt, stop, stream=True, **kwargs)
+        session = self._get_asession()
+        async with session.post(url, json=input, proxy=self.openai_proxy) as response:
+            if response.status != 200:
+                self._raise_for_status(response.status, await response.text())
+            async for raw in response.content:
+                line = raw.decode("utf-8").strip()
+                token = self._parse_sse_line(line, is_gpt3_5) if line else None
+                if token is None:
+                    continue
+                chunk = GenerationChunk(text=token)
+                if run_manager:
+                    await run_manager.on_llm_new_token(token, chunk=chunk)
+                yield chunk
+
+    def _token_usage(self, prompts: List[str], completions: List[Tuple[str, Optional[Dict[str, int]]]]) -> Dict[str, int]:
+        # What the api billed when it says so, counted locally otherwise (streamed completions)
+        prompt_tokens = completion_tokens = 0
+        for prompt, (text, usage) in zip(prompts, completions):
+            if usage is None:
+                usage = {"prompt_tokens": self.get_num_tokens(prompt), "completion_tokens": self.get_num_tokens(text)}
+            prompt_tokens += usage["prompt_tokens"]
+            completion_tokens += usage["completion_tokens"]
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+    def _generate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        # Same as LLM._generate, plus token usage in llm_output for callback handlers
+        completions = [self._complete(p, stop=stop, run_manager=run_manager, **kwargs) for p in prompts]
+        generations = [[Generation(text=text)] for text, _ in completions]
+        llm_output = {"token_usage": self._token_usage(prompts, completions), "model_name": self.model_name}
+        return LLMResult(generations=generations, llm_output=llm_output)
+
+    async def _agenerate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        completions = [await self._acomplete(p, stop=stop, run_manager=run_manager, **kwargs) for p in prompts]
+        generations = [[Generation(text=text)] for text, _ in completions]
+        llm_output = {"token_usage": self._token_usage(prompts, completions), "model_name": self.model_name}
+        return LLMResult(generations=generations, llm_output=llm_output)
 
     @property
     def _identifying_params(self) -> Mapping[str, Any]:
@@ -1,46 +1,45 @@
 
 import gradio as gr
-from chains import SalesChain
-from langchain.memory import ConversationBufferMemory
+from chains.sales_chain import domain_persona
+from config import get_settings
+from sales_service import answer_stream, get_sales_bot, save_caches, start_metrics
+from vectordbs import get_registry
 
 
 def initialize_sales_bot(vector_store_dir: str="electronic_devices_sales_qa"):
     
     global SALES_BOT
     
-    SALES_BOT = SalesChain(memory=ConversationBufferMemory(memory_key="chat_history"))
+    SALES_BOT, _ = get_sales_bot(vector_store_dir)
+    SALES_BOT.warmup()
 
     return SALES_BOT
 
-def sales_chat(message, history):
-    print(f"[message]{message}")
-    print(f"[history]{history}")
-    # TODO: 从命令行参数中获取
-    enable_chat = True
-
-    ans = SALES_BOT.agent.run({"input": message})
-    # 如果检索出结果，或者开了大模型聊天模式
-    # 返回 RetrievalQA combine_documents_chain 整合的结果
-    # if ans["source_documents"] or enable_chat:
-    #     print(f"[result]{ans['result']}")
-    #     print(f"[source_documents]{ans['source_documents']}")
-    #     return ans["result"]
-    # # 否则输出套路话术
-    # else:
-    #     return "这个问题我要问问领导"
-    return ans
+def sales_chat(message, history, domain: str = "electronic_devices_sales_qa", request: gr.Request = None):
+    # Each browser session gets its own memory, seeded from the ui history if it was evicted
+    session_id = request.session_hash if request is not None else "default"
+    for _, partial in answer_stream(message, domain, session_id, history):
+        yield partial
     
 
 def launch_gradio():
+    start_metrics()
     demo = gr.ChatInterface(
         fn=sales_chat,
-        title="电器销售",
+        title=domain_persona(SALES_BOT.domain)["role"],
         # retry_btn=None,
         # undo_btn=None,
         chatbot=gr.Chatbot(height=600),
+        additional_inputs=[
+            gr.Dropdown(get_registry().domains, value=SALES_BOT.domain, label="销售领域"),
+        ],
     )
 
-    demo.launch(share=True, server_name="localhost")
+    try:
+        # Generator functions need the queue to stream partial output
+        demo.queue(concurrency_count=get_settings().GRADIO_CONCURRENCY).launch(share=True, server_name="localhost")
+    finally:
+        save_caches()
 
 if __name__ == "__main__":
     # 初始化电器销售机器人
@@ -0,0 +1,116 @@
+"""
+    Answering pipeline shared by the Gradio UI (sales_chatbot.py) and the HTTP API (api_server.py):
+    answer cache, fast path, then the per-session agent with its final answer streamed.
+"""
+from threading import Lock, Thread
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+from langchain.llms.base import LLM
+
+from cache import AnswerCache, get_web_search
+from chains import FinalAnswerStreamHandler, MetricsCallbackHandler, SalesChain
+from config import get_settings
+from embedding import ChineseEmbedding
+from utils import LOG, METRICS
+
+
+SALES_BOTS: Dict[str, SalesChain] = {}
+ANSWER_CACHES: Dict[str, AnswerCache] = {}
+_BOTS_LOCK = Lock()
+# Stateless apart from in-flight runs, so one handler traces all concurrent requests
+METRICS_HANDLER = MetricsCallbackHandler()
+
+
+def get_sales_bot(domain: str, llm: Optional[LLM] = None) -> Tuple[SalesChain, AnswerCache]:
+    """Return the bot and answer cache of a sales domain, creating them (with `llm` if given) on first request."""
+    with _BOTS_LOCK:
+        if domain not in SALES_BOTS:
+            settings = get_settings()
+            SALES_BOTS[domain] = SalesChain(domain=domain, llm=llm)
+            ANSWER_CACHES[domain] = AnswerCache(
+                embedding=ChineseEmbedding().embeddings,
+                max_size=settings.ANSWER_CACHE_SIZE,
+                ttl=settings.ANSWER_CACHE_TTL,
+                similarity_threshold=settings.ANSWER_CACHE_SIMILARITY or None,
+                persist_path=f"{settings.ANSWER_CACHE_PATH}.{domain}" if settings.ANSWER_CACHE_PATH else None,
+            )
+        return SALES_BOTS[domain], ANSWER_CACHES[domain]
+
+
+def answer_stream(message: str, domain: str, session_id: str, history: Optional[Sequence[Tuple[str, str]]] = None) -> Iterator[Tuple[str, str]]:
+    """
+        Answer a customer question, yielding (source, answer so far) as it grows.
+        source is "cache", "fast_path" or "agent", the last item is the complete answer.
+    """
+    LOG.debug(f"[message]{message}")
+    LOG.debug(f"[history]{history}")
+    bot, cache = get_sales_bot(domain)
+    # Each conversation gets its own memory, seeded from the client's history if it was evicted
+    session = bot.session(session_id, history)
+    # Follow-ups ("那它多少钱？") mean something else in every conversation, only opening questions share the cache
+    cacheable = session.turns == 0
+    ans = cache.get(message) if cacheable else None
+    if ans is not None:
+        LOG.debug(f"[cache]{cache.info()}")
+        METRICS.inc("answers_total", source="cache")
+        yield "cache", ans
+        # After the answer is out, the memory may call the llm (summary) or embed (vectordb)
+        session.remember(message, ans)
+        return
+    ans = bot.router.route(message)
+    if ans is not None:
+        LOG.debug(f"[fast path]{bot.router.info()}")
+        METRICS.inc("answers_total", source="fast_path")
+        if cacheable:
+            cache.put(message, ans)
+        yield "fast_path", ans
+        session.remember(message, ans)
+        return
+    # Run the agent in a worker thread and yield the final answer as its tokens arrive
+    handler = FinalAnswerStreamHandler()
+    result = {}
+    def run_agent():
+        try:
+            with session.lock:
+                result["answer"] = session.executor.run({"input": message}, callbacks=[handler, METRICS_HANDLER])
+                session.turns += 1
+        except Exception as e:
+            result["error"] = e
+        finally:
+            handler.done()
+    worker = Thread(target=run_agent, daemon=True)
+    worker.start()
+    for partial in handler.partials():
+        yield "agent", partial
+    worker.join()
+    if "error" in result:
+        raise result["error"]
+    ans = result["answer"]
+    LOG.info(f"[latency] first token: {handler.first_token_latency}s, total: {handler.total_latency:.3f}s")
+    bot.router.record_agent(handler.total_latency)
+    METRICS.inc("answers_total", source="agent")
+    if handler.first_token_latency is not None:
+        METRICS.observe("first_token_seconds", handler.first_token_latency)
+    # Budget stops and tool observation fallbacks (see SalesAgent) are no answer to serve everyone for ANSWER_CACHE_TTL
+    if cacheable and handler.final_answer:
+        cache.put(message, ans)
+    yield "agent", ans
+
+
+def start_metrics():
+    settings = get_settings()
+    if settings.METRICS_PORT:
+        METRICS.start_http_server(settings.METRICS_PORT)
+        LOG.info(f"Serving metrics on :{settings.METRICS_PORT}/metrics")
+    if settings.METRICS_JSON_PATH:
+        METRICS.start_json_dump(settings.METRICS_JSON_PATH, settings.METRICS_DUMP_INTERVAL)
+
+
+def save_caches():
+    """Persist the answer and web search caches where a path is configured."""
+    settings = get_settings()
+    if settings.ANSWER_CACHE_PATH:
+        for cache in ANSWER_CACHES.values():
+            cache.save()
+    if settings.WEB_SEARCH_CACHE_PATH:
+        get_web_search().save()
@@ -1 +1,2 @@
-from .logger import LOG
\ No newline at end of file
+from .logger import LOG
+from .metrics import METRICS
\ No newline at end of file
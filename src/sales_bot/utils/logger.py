@@ -6,6 +6,10 @@ LOG_FILE = "translation.log"
 ROTATION_TIME = "02:00"
 
 class Logger:
+    """
+        Sinks are enqueued so request threads hand records to a background writer instead of
+        blocking on stdout/file io. The console level can be raised with the LOG_LEVEL env variable.
+    """
     def __init__(self, name="translation", log_dir="logs", debug=False):
         if not os.path.exists(log_dir):
             os.makedirs(log_dir)
@@ -15,10 +19,10 @@ class Logger:
         logger.remove()
 
         # Add console handler with a specific log level
-        level = "DEBUG" if debug else "INFO"
-        logger.add(sys.stdout, level=level)
+        level = os.getenv("LOG_LEVEL", "DEBUG" if debug else "INFO")
+        logger.add(sys.stdout, level=level, enqueue=True)
         # Add file handler with a specific log level and timed rotation
-        logger.add(log_file_path, rotation=ROTATION_TIME, level="DEBUG")
+        logger.add(log_file_path, rotation=ROTATION_TIME, level="DEBUG", enqueue=True)
         self.logger = logger
 
 LOG = Logger(debug=True).logger
@@ -0,0 +1,121 @@
+import json
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Lock, Thread, local
+from typing import Dict, Optional, Tuple
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+_stages = local()
+
+
+def stage_times() -> Optional[Dict[str, float]]:
+    """Per-thread accumulator of stage durations of the request currently running on this thread."""
+    return getattr(_stages, "times", None)
+
+
+def set_stage_times(times: Optional[Dict[str, float]]):
+    _stages.times = times
+
+
+class Metrics():
+    """
+        Minimal in-process metrics registry: counters and summaries (count/sum/max) with labels.
+        Rendered in Prometheus text format or as a JSON dict, recording is a dict update under a lock
+        so it is cheap enough for the request path.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._counters: Dict[LabelKey, float] = {}
+        self._summaries: Dict[LabelKey, list] = {}
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, str]) -> LabelKey:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = self._key(name, labels)
+        with self._lock:
+            summary = self._summaries.setdefault(key, [0, 0.0, 0.0])
+            summary[0] += 1
+            summary[1] += value
+            summary[2] = max(summary[2], value)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+
+    @staticmethod
+    def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+        return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}" if labels else ""
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                lines.append(f"sales_bot_{name}{self._labels(labels)} {value}")
+            for (name, labels), (count, total, peak) in sorted(self._summaries.items()):
+                lines.append(f"sales_bot_{name}_count{self._labels(labels)} {count}")
+                lines.append(f"sales_bot_{name}_sum{self._labels(labels)} {total}")
+                lines.append(f"sales_bot_{name}_max{self._labels(labels)} {peak}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> Dict[str, Dict]:
+        def name(key: LabelKey) -> str:
+            return key[0] + self._labels(key[1])
+        with self._lock:
+            return {
+                "counters": {name(k): v for k, v in self._counters.items()},
+                "summaries": {
+                    name(k): {"count": c, "sum": s, "max": m, "mean": s / c if c else 0.0}
+                    for k, (c, s, m) in self._summaries.items()
+                },
+            }
+
+    def start_http_server(self, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """Serve the Prometheus text format on http://host:port/metrics from a daemon thread."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                data = metrics.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def start_json_dump(self, path: str, interval: float = 60) -> Event:
+        """Write `to_dict()` to path every interval seconds, set the returned event to stop."""
+        stop = Event()
+
+        def dump():
+            while not stop.wait(interval):
+                tmp = f"{path}.tmp"
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump({"time": time.time(), **self.to_dict()}, f, ensure_ascii=False)
+                os.replace(tmp, path)
+
+        Thread(target=dump, daemon=True).start()
+        return stop
+
+
+METRICS = Metrics()
@@ -1,4 +1,11 @@
+from vectordbs.bm25 import BM25Index
 from vectordbs.faissdb import FaissDb
+from vectordbs.ingest import StreamingIngest
+from vectordbs.mmap_docstore import MmapDocstore
+from vectordbs.qa_records import QARecordSplitter, parse_qa_records
+from vectordbs.registry import VectorDbRegistry, get_registry
+from vectordbs.rerank import CosineReranker, CrossEncoderReranker, calibrate_threshold
+from vectordbs.retriever import HybridRetriever, RerankRetriever, VectorDbRetriever
 from vectordbs.vectordb import VectorDb
 
-__all_ = ["FaissDb", "VectorDb"]
\ No newline at end of file
+__all_ = ["BM25Index", "CosineReranker", "CrossEncoderReranker", "FaissDb", "HybridRetriever", "MmapDocstore", "QARecordSplitter", "RerankRetriever", "StreamingIngest", "VectorDb", "VectorDbRegistry", "VectorDbRetriever", "calibrate_threshold", "get_registry", "parse_qa_records"]
\ No newline at end of file
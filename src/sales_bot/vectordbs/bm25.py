@@ -0,0 +1,144 @@
+import json
+import os
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import jieba
+except ImportError:  # Optional, character n-grams are used without it
+    jieba = None
+
+_ASCII_WORD = re.compile(r"[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+_CJK_RUN = re.compile(r"[一-鿿]+")
+META_FILE = "bm25.json"
+ARRAYS = ["doc_ids", "tfs", "offsets", "doc_lengths", "idf"]
+
+
+def tokenize(text: str, use_jieba: Optional[bool] = None) -> List[str]:
+    """
+        Lexical tokens of Chinese/English text.
+        Latin words and model numbers ("a100", "rtx-4090") are kept whole, Chinese runs are cut by jieba's
+        search mode when available (use_jieba=None) or else into character unigrams and bigrams.
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens = _ASCII_WORD.findall(text)
+    use_jieba = jieba is not None if use_jieba is None else use_jieba
+    for run in _CJK_RUN.findall(text):
+        if use_jieba:
+            tokens.extend(t for t in jieba.lcut_for_search(run) if t.strip())
+        else:
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class BM25Index():
+    """
+        Okapi BM25 over an array-backed inverted index.
+        Postings are stored CSR style: for term id t, `doc_ids[offsets[t]:offsets[t+1]]` (int32) and the
+        matching term frequencies `tfs` (uint16), so the index is three flat numpy arrays plus the
+        vocabulary, and a query is a few vectorised slices instead of per-document Python work.
+    """
+
+    def __init__(self, texts: Sequence[str], k1: float = 1.5, b: float = 0.75, use_jieba: Optional[bool] = None):
+        self.k1 = k1
+        self.b = b
+        self._use_jieba = use_jieba
+        self.vocabulary: Dict[str, int] = {}
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        tfs: List[int] = []
+        lengths = np.zeros(len(texts), dtype=np.float32)
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text, use_jieba))
+            lengths[doc_id] = sum(counts.values())
+            for term, tf in counts.items():
+                term_ids.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                doc_ids.append(doc_id)
+                tfs.append(min(tf, np.iinfo(np.uint16).max))
+        term_ids_array = np.array(term_ids, dtype=np.int32)
+        order = np.argsort(term_ids_array, kind="stable")
+        self.doc_ids = np.array(doc_ids, dtype=np.int32)[order]
+        self.tfs = np.array(tfs, dtype=np.uint16)[order]
+        self.offsets = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids_array, minlength=len(self.vocabulary)), out=self.offsets[1:])
+        self.doc_lengths = lengths
+        self.avg_length = float(lengths.mean()) if len(lengths) else 0.0
+        df = np.diff(self.offsets).astype(np.float32)
+        self.idf = np.log(1 + (len(texts) - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    @staticmethod
+    def exists(dirpath: str) -> bool:
+        return all(os.path.exists(os.path.join(dirpath, f)) for f in [META_FILE] + [f"bm25.{name}.npy" for name in ARRAYS])
+
+    def save(self, dirpath: str):
+        """Write the postings as bm25.*.npy and the vocabulary and parameters as bm25.json, see `load`."""
+        use_jieba = jieba is not None if self._use_jieba is None else self._use_jieba
+        meta = {"k1": self.k1, "b": self.b, "use_jieba": use_jieba, "avg_length": self.avg_length,
+                "vocabulary": sorted(self.vocabulary, key=self.vocabulary.get)}
+        for name in ARRAYS:
+            tmp = os.path.join(dirpath, f"bm25.{name}.npy.tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, getattr(self, name))
+            os.replace(tmp, os.path.join(dirpath, f"bm25.{name}.npy"))
+        # Written last, an index without it doesn't `exist`
+        with open(os.path.join(dirpath, f"{META_FILE}.tmp"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(os.path.join(dirpath, f"{META_FILE}.tmp"), os.path.join(dirpath, META_FILE))
+
+    @classmethod
+    def load(cls, dirpath: str, mmap_mode: Optional[str] = "r") -> Optional["BM25Index"]:
+        """
+            Index written by `save`, its postings memory-mapped (shared between worker processes through the
+            page cache) unless mmap_mode is None. None when it was tokenized with jieba and jieba is missing here.
+        """
+        with open(os.path.join(dirpath, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["use_jieba"] and jieba is None:
+            return None
+        index = cls.__new__(cls)
+        index.k1, index.b, index.avg_length = meta["k1"], meta["b"], meta["avg_length"]
+        index._use_jieba = meta["use_jieba"]
+        index.vocabulary = {term: i for i, term in enumerate(meta["vocabulary"])}
+        for name in ARRAYS:
+            setattr(index, name, np.load(os.path.join(dirpath, f"bm25.{name}.npy"), mmap_mode=mmap_mode))
+        return index
+
+    @property
+    def nbytes(self) -> int:
+        return self.doc_ids.nbytes + self.tfs.nbytes + self.offsets.nbytes + self.doc_lengths.nbytes + self.idf.nbytes
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[int, float, float]]:
+        """
+            Top k (doc id, bm25 score, coverage) for the query.
+            coverage is the share of the query's idf mass found in the document, in [0, 1]: a document
+            containing the query's rare terms (model numbers, spec names) covers most of it.
+        """
+        query_terms = set(tokenize(query, self._use_jieba))
+        terms = [self.vocabulary[t] for t in query_terms if t in self.vocabulary]
+        if not terms or not len(self):
+            return []
+        scores = np.zeros(len(self), dtype=np.float32)
+        covered = np.zeros(len(self), dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / (self.avg_length or 1.0))
+        for term in terms:
+            start, end = self.offsets[term], self.offsets[term + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            # A term occurs once per posting list, so fancy-index += doesn't lose updates
+            scores[docs] += self.idf[term] * tf * (self.k1 + 1) / (tf + norm[docs])
+            covered[docs] += self.idf[term]
+        # Terms unknown to the corpus (a model number we don't sell) weigh like the rarest term and match nothing
+        unknown_idf = np.log(1 + (len(self) + 0.5) / 0.5)
+        query_idf = float(self.idf[terms].sum()) + unknown_idf * (len(query_terms) - len(terms))
+        k = min(k, len(self))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(d), float(scores[d]), float(covered[d] / query_idf)) for d in top if scores[d] > 0]
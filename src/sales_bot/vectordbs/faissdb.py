@@ -1,19 +1,29 @@
+import hashlib
+import json
 import os
 import sys
 from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 import faiss
 import numpy as np
 from langchain.docstore import InMemoryDocstore
+from langchain.docstore.document import Document
 from langchain.memory import VectorStoreRetrieverMemory
 from langchain.schema.embeddings import Embeddings
 from langchain.schema.vectorstore import VectorStore
 from langchain.text_splitter import CharacterTextSplitter, TextSplitter
 from langchain.vectorstores import FAISS
+from langchain.vectorstores.utils import DistanceStrategy
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from embedding.chinese_embedding import ChineseEmbedding
+from utils import LOG
 
+from vectordbs.bm25 import BM25Index
+from vectordbs.ingest import StreamingIngest
+from vectordbs.mmap_docstore import MmapDocstore, mmap_flags
+from vectordbs.qa_records import ANSWER_KEY, QuestionSplitter, expand_record, format_qa_record
 from vectordbs.vectordb import VectorDb
 
 
@@ -28,9 +38,35 @@ def score_normalizer(val: float) -> float:
     Solve this by init FAISS with relevance_score_fn = score_normalizer.
     Or pass above param to FAISS.from_documents().
         def score_normalizer(val: float) -> float:
-            return 1 - 1 / (1 + np.exp(val))
+            return 2 / (1 + np.exp(val))
+    The raw FAISS score is a (squared) L2 distance, so the relevance must decrease with it:
+    distance 0 maps to 1 and large distances approach 0.
     """
-    return 1 - 1 / (1 + np.exp(val))
+    return 2 / (1 + np.exp(val))
+
+def similarity_normalizer(val: float) -> float:
+    """Relevance for inner-product/cosine indexes, where the raw score is a similarity in [-1, 1]."""
+    return (1 + val) / 2
+
+METRICS = {
+    "l2": faiss.METRIC_L2,
+    "ip": faiss.METRIC_INNER_PRODUCT,
+    "cosine": faiss.METRIC_INNER_PRODUCT,
+}
+
+MANIFEST_FILE = "manifest.json"
+# Faiss position of every BM25 doc id, next to the bm25.* files
+LEXICAL_POSITIONS_FILE = "bm25.positions.npy"
+INDEX_MODES = ["chunk", "question"]
+
+def chunk_hash(text: str) -> str:
+    """Content hash of a chunk, also used as its docstore id."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def doc_hash(doc: Document) -> str:
+    """Docstore id of a document, question-only documents hash their question together with the answer."""
+    answer = doc.metadata.get(ANSWER_KEY)
+    return chunk_hash(doc.page_content if answer is None else format_qa_record(doc.page_content, answer))
 
 class FaissDb(VectorDb):
     """_summary_
@@ -39,36 +75,305 @@ class FaissDb(VectorDb):
     otherwise it will pop up strange error like 'module 'faiss' has no attribute 'IndexFlatL2''
     See [issue](https://github.com/facebookresearch/faiss/issues/1195)
     """
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, incremental: bool = False, batch_size: int = 64, workers: int = 0,
+                 index_factory: Optional[str] = None, metric: str = "l2", train_size: int = 10000,
+                 search_params: Optional[Dict[str, int]] = None, near_duplicate_threshold: Optional[float] = 0.95,
+                 index_mode: str = "chunk", read_only: bool = False, **kwargs):
+        """
+            incremental: Re-split the source file on load and only embed chunks whose hash is not yet
+                in the manifest next to index.faiss, deleting chunks that disappeared from the file.
+            batch_size, workers: Embedding batch size and number of embedding processes used when
+                (re)building the index, see StreamingIngest.
+            index_factory: faiss [index factory](https://github.com/facebookresearch/faiss/wiki/The-index-factory)
+                spec such as "IVF256,Flat", "IVF256,PQ32" or "HNSW32". None keeps the exact flat index.
+                Only the flat index removes vectors the way FAISS.delete renumbers index_to_docstore_id
+                (IVF/PQ keep the other vectors' labels, HNSW can't remove), so incremental updates removing
+                chunks from any other index rebuild it.
+            metric: "l2", "ip" or "cosine" (inner product on L2 normalized vectors).
+            train_size: Max number of vectors sampled to train IVF/PQ indexes.
+            search_params: Runtime knobs applied after load, e.g. {"nprobe": 16} or {"efSearch": 64}.
+            near_duplicate_threshold: Cosine similarity above which a chunk is dropped as a paraphrase of an
+                earlier one when building the index, None keeps every distinct chunk. Incremental updates
+                only collapse exact duplicates. Off in question index_mode: "这个冰箱多大尺寸？" and
+                "这个电视多大尺寸？" embed nearly alike but have different answers, and paraphrases of one
+                answer are listed to be matched on their own.
+            index_mode: "chunk" embeds whole Q&A chunks. "question" embeds only the customer question (and its
+                paraphrases) and keeps the answer as docstore payload, retrievers return the full Q&A text.
+                Stored next to the chunk index as *.questions.db.
+            read_only: Serve an already built index memory-mapped: index.faiss is opened with faiss mmap
+                flags and documents come from the MmapDocstore files written next to index.pkl, so worker
+                processes share both (and the bm25.* files of lexicalIndex) through the page cache and
+                loading reads nothing up front.
+                A missing or outdated index is still built (in this process's heap), updates are refused.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unsupported metric {metric}, expected one of {list(METRICS)}")
+        if index_mode not in INDEX_MODES:
+            raise ValueError(f"Unsupported index mode {index_mode}, expected one of {INDEX_MODES}")
+        if index_mode == "question" and kwargs.get("transformer") is None:
+            kwargs["transformer"] = QuestionSplitter()
+        self._index_mode = index_mode
+        self._read_only = read_only
+        self._incremental = incremental
+        self._batch_size = batch_size
+        self._workers = workers
+        self._index_factory = index_factory
+        self._metric = metric
+        self._train_size = train_size
+        self._search_params = search_params or {}
+        self._near_duplicate_threshold = near_duplicate_threshold if index_mode == "chunk" else None
+        self._lexical: Optional[Tuple[Any, BM25Index, np.ndarray]] = None
         super().__init__(*args, **kwargs)
+
+    def _faissKwargs(self) -> Dict:
+        if self._metric == "l2":
+            return {"relevance_score_fn": score_normalizer}
+        return {
+            "relevance_score_fn": similarity_normalizer,
+            "distance_strategy": DistanceStrategy.MAX_INNER_PRODUCT,
+            "normalize_L2": self._metric == "cosine",
+        }
     
+    @staticmethod
+    def _embeddingId(embedding: Embeddings) -> str:
+        # Wrappers (InstrumentedEmbeddings, EmbeddingService, benchmark timers) are identified by the model they wrap
+        while getattr(embedding, "_inner", None) is not None:
+            embedding = embedding._inner
+        return f"{getattr(embedding, 'model_name', type(embedding).__name__)}:{getattr(embedding, 'backend', 'torch')}"
+
+    def _indexConfig(self, embedding: Embeddings) -> Dict[str, str]:
+        """What an existing index must have been built with to be served as is, recorded in its manifest."""
+        return {"embedding": self._embeddingId(embedding), "metric": self._metric, "index_factory": self._index_factory or "Flat"}
+
+    def _sameIndex(self, manifest: Optional[Dict], embedding: Embeddings) -> bool:
+        # Vectors of another model/backend aren't comparable with the current query vectors, another metric or
+        # index type searches and normalizes scores differently. Manifests written before backends existed
+        # don't record the embedding
+        if manifest is None:
+            return True
+        return all(manifest.get(key, value) == value for key, value in self._indexConfig(embedding).items())
+
+    def _dbdir(self, dbfile: str) -> str:
+        return dbfile.replace(".txt", ".questions.db" if self._index_mode == "question" else ".db")
+
     #override
     def _initDb(self, dbfile: str, embedding: Embeddings, rebuild: bool) -> VectorStore:
         _db: FAISS = None
-        if not os.path.exists(dbfile.replace(".txt", ".db")) or rebuild:
+        dbdir = self._dbdir(dbfile)
+        if self._read_only and not rebuild:
+            _db = self._mmapDb(dbdir, embedding)
+            if _db is not None:
+                return _db
+        if self._incremental and not rebuild and not self._read_only:
+            try:
+                _db, stats = self._incrementalDb(dbfile, embedding)
+                LOG.info(f"Incremental update of {dbdir}: {stats}")
+            except FileNotFoundError as e:
+                LOG.error(e)
+        elif not os.path.exists(dbdir) or rebuild:
             try:
-                with open(dbfile, 'r', encoding='utf-8-sig') as f:
-                    docs = f.read()
-                docs = self._transformer.create_documents([docs])
-                _db = FAISS.from_documents(docs, embedding, relevance_score_fn=score_normalizer)
-                _db.save_local(dbfile.replace(".txt", ".db"))
+                _db, stats = self.ingestDb(dbfile, embedding)
+                LOG.info(f"Built {dbdir}: {stats}")
                 return _db
             except FileNotFoundError as e:
-                print(e)
+                LOG.error(e)
             except Exception as e:
-                print(e)
+                LOG.error(e)
+        elif not self._sameIndex(self._readManifest(dbdir), embedding):
+            _db, stats = self.ingestDb(dbfile, embedding)
+            LOG.info(f"Rebuilt {dbdir} for {self._indexConfig(embedding)}: {stats}")
+            return _db
         else:
-            _db = FAISS.load_local(dbfile.replace(".txt", ".db"), embedding,  relevance_score_fn=score_normalizer)
+            _db = FAISS.load_local(dbdir, embedding, **self._faissKwargs())
+        if _db is not None:
+            self.tuneIndex(_db.index, **self._search_params)
         return _db
+
+    def _mmapDb(self, dbdir: str, embedding: Embeddings) -> Optional[FAISS]:
+        manifest = self._readManifest(dbdir)
+        if manifest is None or not self._sameIndex(manifest, embedding):
+            return None
+        if not MmapDocstore.exists(dbdir):
+            # Index saved before the mmap files existed, convert it once
+            _db = FAISS.load_local(dbdir, embedding, **self._faissKwargs())
+            MmapDocstore.write(dbdir, _db.docstore, _db.index_to_docstore_id)
+            del _db
+        index = faiss.read_index(os.path.join(dbdir, "index.faiss"), mmap_flags(manifest.get("index_factory", "Flat")))
+        self.tuneIndex(index, **self._search_params)
+        docstore = MmapDocstore(dbdir)
+        return FAISS(embedding, index, docstore, docstore.index_to_docstore_id, **self._faissKwargs())
+
+    @staticmethod
+    def tuneIndex(index: faiss.Index, **params: int):
+        """Set runtime search parameters such as nprobe (IVF) or efSearch (HNSW) on a faiss index."""
+        space = faiss.ParameterSpace()
+        for name, value in params.items():
+            space.set_index_parameter(index, name, value)
+
+    def tune(self, **params: int):
+        """Retune the loaded index at runtime, e.g. FaissDb(...).tune(nprobe=32)."""
+        self._search_params.update(params)
+        self.tuneIndex(self.db.index, **params)
+
+    def _buildIndex(self, flat: faiss.Index) -> faiss.Index:
+        """Copy the vectors of the flat index built during ingest into the configured index_factory type.
+        Vectors keep their positions, so index_to_docstore_id stays valid.
+        """
+        vectors = flat.reconstruct_n(0, flat.ntotal)
+        if self._metric == "cosine":
+            faiss.normalize_L2(vectors)
+        index = faiss.index_factory(vectors.shape[1], self._index_factory or "Flat", METRICS[self._metric])
+        if not index.is_trained:
+            sample = vectors
+            if len(vectors) > self._train_size:
+                sample = vectors[np.random.default_rng(0).choice(len(vectors), self._train_size, replace=False)]
+            index.train(sample)
+        index.add(vectors)
+        self.tuneIndex(index, **self._search_params)
+        return index
+
+    def updateDb(self) -> Dict[str, int]:
+        """Apply the diff between the source file and the index to the loaded db, returns chunk counts."""
+        if self._read_only:
+            raise RuntimeError(f"{self._dbdir(self._dbfile)} is served read-only, update it from a writable FaissDb.")
+        with self._lock:
+            # A changed db is saved with its new lexical index
+            self._db, stats = self._incrementalDb(self._dbfile, self.embedding)
+        return stats
+
+    def lexicalIndex(self) -> Tuple[BM25Index, np.ndarray]:
+        """BM25 index over the loaded docstore and the faiss position of every BM25 doc id.
+        Question-only documents are indexed with their answer, so answer terms match too.
+        Read-only stores memory-map the one saved next to the docstore files, others build it on first use
+        and rebuild it after the db is reloaded or updated.
+        """
+        db = self.db
+        with self._lock:
+            if self._lexical is None or self._lexical[0] is not db:
+                lexical = self._mmapLexical(self._dbdir(self._dbfile)) if self._read_only else None
+                self._lexical = (db, *(lexical or self._buildLexical(db)))
+            _, index, positions = self._lexical
+        return index, positions
+
+    @staticmethod
+    def _buildLexical(db: FAISS) -> Tuple[BM25Index, np.ndarray]:
+        positions = np.fromiter(db.index_to_docstore_id.keys(), dtype=np.int64, count=len(db.index_to_docstore_id))
+        texts = [expand_record(db.docstore.search(db.index_to_docstore_id[int(p)])).page_content for p in positions]
+        return BM25Index(texts), positions
+
+    @staticmethod
+    def _mmapLexical(dbdir: str) -> Optional[Tuple[BM25Index, np.ndarray]]:
+        if not BM25Index.exists(dbdir) or not os.path.exists(os.path.join(dbdir, LEXICAL_POSITIONS_FILE)):
+            return None
+        index = BM25Index.load(dbdir, mmap_mode="r")
+        if index is None:
+            LOG.info(f"{dbdir} BM25 index was tokenized with jieba, which is not installed, building it in memory")
+            return None
+        return index, np.load(os.path.join(dbdir, LEXICAL_POSITIONS_FILE), mmap_mode="r")
+
+    @staticmethod
+    def _saveLexical(dbdir: str, db: FAISS):
+        # Read-only workers map these instead of tokenizing the whole docstore each
+        index, positions = FaissDb._buildLexical(db)
+        with open(os.path.join(dbdir, f"{LEXICAL_POSITIONS_FILE}.tmp"), "wb") as f:
+            np.save(f, positions)
+        os.replace(os.path.join(dbdir, f"{LEXICAL_POSITIONS_FILE}.tmp"), os.path.join(dbdir, LEXICAL_POSITIONS_FILE))
+        index.save(dbdir)
+        return index, positions
+
+    #override
+    def unload(self):
+        with self._lock:
+            self._db = None
+            # The cached lexical index holds the db
+            self._lexical = None
+
+    def ingestDb(self, dbfile: str, embedding: Embeddings) -> Tuple[FAISS, Dict[str, float]]:
+        """Build the index from dbfile with the streaming, batched pipeline and save it with its manifest."""
+        ingest = StreamingIngest(embedding, self._transformer, batch_size=self._batch_size, workers=self._workers,
+                                 near_duplicate_threshold=self._near_duplicate_threshold)
+        # Ingest always builds an exact L2 index, the configured index is trained on its vectors afterwards
+        _db, ids, stats = ingest.run(dbfile, doc_hash, relevance_score_fn=score_normalizer)
+        if self._index_factory is not None or self._metric != "l2":
+            _db = FAISS(_db.embedding_function, self._buildIndex(_db.index), _db.docstore, _db.index_to_docstore_id, **self._faissKwargs())
+        self._saveDb(_db, dbfile, ids, stats.near_duplicate_ids)
+        return _db, ingest.info(stats)
+
+    def _loadDocuments(self, dbfile: str) -> List[Document]:
+        with open(dbfile, 'r', encoding='utf-8-sig') as f:
+            docs = f.read()
+        return self._transformer.create_documents([docs])
+
+    @staticmethod
+    def _hashDocuments(docs: Iterable[Document]) -> Dict[str, Document]:
+        # Identical chunks collapse to one id
+        hashed: Dict[str, Document] = {}
+        for doc in docs:
+            hashed.setdefault(doc_hash(doc), doc)
+        return hashed
+
+    @staticmethod
+    def _readManifest(dbdir: str) -> Optional[Dict]:
+        path = os.path.join(dbdir, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _saveDb(self, db: FAISS, dbfile: str, ids: Iterable[str], collapsed: Iterable[str] = ()):
+        dbdir = self._dbdir(dbfile)
+        db.save_local(dbdir)
+        MmapDocstore.write(dbdir, db.docstore, db.index_to_docstore_id)
+        self._lexical = (db, *self._saveLexical(dbdir, db))
+        manifest = {
+            "source": os.path.basename(dbfile),
+            **self._indexConfig(self.embedding),
+            "index_mode": self._index_mode,
+            "chunks": sorted(ids),
+            "collapsed": sorted(collapsed),
+        }
+        with open(os.path.join(dbdir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+
+    def _incrementalDb(self, dbfile: str, embedding: Embeddings) -> Tuple[FAISS, Dict[str, int]]:
+        dbdir = self._dbdir(dbfile)
+        docs = self._hashDocuments(self._loadDocuments(dbfile))
+        manifest = self._readManifest(dbdir)
+        if manifest is None or not self._sameIndex(manifest, embedding):
+            # No index yet, an index built before manifests existed (its docstore ids are unknown)
+            # or one built with another embedding model/backend, metric or index type
+            _db, _ = self.ingestDb(dbfile, embedding)
+            return _db, {"added": len(docs), "removed": 0, "unchanged": 0}
+        else:
+            _db = self._db if self._db is not None else FAISS.load_local(dbdir, embedding, **self._faissKwargs())
+            existing = set(manifest["chunks"])
+            # Near duplicates dropped by the last build stay dropped while they are in the file,
+            # unless collapsing is off now (e.g. a question index built before it was turned off there)
+            collapsed = {h for h in manifest.get("collapsed", []) if h in docs} if self._near_duplicate_threshold else set()
+            added = [h for h in docs if h not in existing and h not in collapsed]
+            removed = [h for h in existing if h not in docs]
+            if removed and manifest.get("index_factory", "Flat") != "Flat":
+                _db, _ = self.ingestDb(dbfile, embedding)
+                return _db, {"added": len(added), "removed": len(removed), "unchanged": len(existing) - len(removed), "rebuilt": 1}
+            if removed:
+                _db.delete(removed)
+            if added:
+                _db.add_documents([docs[h] for h in added], ids=added)
+            stats = {"added": len(added), "removed": len(removed), "unchanged": len(existing) - len(removed)}
+        if stats["added"] or stats["removed"] or manifest is None:
+            self._saveDb(_db, dbfile, [h for h in docs if h not in collapsed], collapsed)
+        return _db, stats
     
     #override
-    def createMemory(self) -> VectorStoreRetrieverMemory:
-        embedding_size = 1536 # Dimensions of the OpenAIEmbeddings
+    def createMemory(self, k: int = 3) -> VectorStoreRetrieverMemory:
+        # Size the index after the actual embedding model, stella-large-zh is not 1536 like OpenAIEmbeddings
+        embedding_fn = self.embedding
+        embedding_size = len(embedding_fn.embed_query("embedding size"))
         index = faiss.IndexFlatL2(embedding_size)
-        embedding_fn = self._embedding
-        vectorstore = FAISS(embedding_fn, index, InMemoryDocstore({}), {})
-        retriever = vectorstore.as_retriever(search_kwargs=dict(k=1))
-        memory = VectorStoreRetrieverMemory(retriever=retriever)
+        vectorstore = FAISS(embedding_fn, index, InMemoryDocstore({}), {}, relevance_score_fn=score_normalizer)
+        retriever = vectorstore.as_retriever(search_kwargs=dict(k=k))
+        # memory_key matches {chat_history} in the agent prompt
+        memory = VectorStoreRetrieverMemory(retriever=retriever, memory_key="chat_history", input_key="input")
         return memory
 
 if __name__ == "__main__":
@@ -0,0 +1,234 @@
+import re
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+import faiss
+import numpy as np
+from langchain.docstore.document import Document
+from langchain.schema.embeddings import Embeddings
+from langchain.text_splitter import TextSplitter
+from langchain.vectorstores import FAISS
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ITEM_START = re.compile(r"^\s*\d+\.")
+
+_worker_embeddings: Optional[Embeddings] = None
+
+
+def _init_worker(model_name: str, threads: int, backend: str):
+    # Each worker process loads its own copy of the model once, on the same backend as the parent
+    global _worker_embeddings
+    import torch
+    from embedding.backends import embeddingFactory
+    torch.set_num_threads(threads)
+    _worker_embeddings = embeddingFactory(model_name, backend)
+
+
+def _embed_batch(texts: List[str]) -> List[List[float]]:
+    return _worker_embeddings.embed_documents(texts)
+
+
+def iter_text_blocks(path: str, block_size: int = 64 * 1024) -> Iterator[str]:
+    """Read a numbered Q&A file in blocks of roughly block_size characters.
+    Blocks are only cut in front of a numbered item ("12.") so a Q&A pair never straddles two blocks.
+    """
+    block: List[str] = []
+    size = 0
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        for line in f:
+            if size >= block_size and ITEM_START.match(line):
+                yield "".join(block)
+                block, size = [], 0
+            block.append(line)
+            size += len(line)
+    if block:
+        yield "".join(block)
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class NearDuplicateFilter():
+    """
+        Drops vectors whose cosine similarity to an already kept vector reaches `threshold`.
+        Kept vectors go to a flat inner-product index, each batch is checked against it with one
+        `range_search` and against itself with one matrix product, so there is no pairwise Python loop.
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self._index: Optional[faiss.Index] = None
+
+    def keep(self, vectors: List[List[float]]) -> np.ndarray:
+        """Boolean mask of the vectors to keep, the kept ones are remembered for later batches."""
+        x = np.array(vectors, dtype=np.float32)
+        faiss.normalize_L2(x)
+        if self._index is None:
+            self._index = faiss.IndexFlatIP(x.shape[1])
+        keep = np.ones(len(x), dtype=bool)
+        if self._index.ntotal:
+            # For inner product indexes range_search returns the neighbours more similar than the radius
+            lims, _, _ = self._index.range_search(x, self.threshold)
+            keep &= np.diff(lims) == 0
+        similar = np.triu(x @ x.T >= self.threshold, k=1)
+        for i in np.flatnonzero(similar.any(axis=1)):
+            if keep[i]:
+                keep[similar[i]] = False
+        self._index.add(x[keep])
+        return keep
+
+
+@dataclass
+class IngestStats:
+    docs: int = 0
+    duplicates: int = 0
+    near_duplicates: int = 0
+    batches: int = 0
+    # Ids of the chunks dropped as near duplicates, so incremental updates don't add them back
+    near_duplicate_ids: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+    peak_rss_mb: Optional[float] = None
+
+    @property
+    def docs_per_sec(self) -> float:
+        return self.docs / self.seconds if self.seconds else 0.0
+
+    @property
+    def records(self) -> int:
+        return self.docs + self.duplicates + self.near_duplicates
+
+    @property
+    def shrink(self) -> float:
+        """Fraction of the source records that didn't make it into the index."""
+        return 1 - self.docs / self.records if self.records else 0.0
+
+
+class StreamingIngest():
+    """
+        Streaming corpus ingest for FaissDb.
+        The source is read and split block by block, chunks are embedded in batches of `batch_size`
+        (in-process, or on a pool of `workers` processes each holding the model) and the vectors are
+        added to the index as batches complete. At most `max_pending` batches are in flight, which
+        bounds memory regardless of the file size.
+        Chunks with the same hash are embedded once, and with `near_duplicate_threshold` set, chunks whose
+        embedding is at least that cosine-similar to an earlier one (paraphrased Q&A) are not indexed.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        transformer: TextSplitter,
+        batch_size: int = 64,
+        workers: int = 0,
+        model_name: Optional[str] = None,
+        threads_per_worker: int = 1,
+        max_pending: Optional[int] = None,
+        block_size: int = 64 * 1024,
+        near_duplicate_threshold: Optional[float] = None,
+    ):
+        self._embedding = embedding
+        self._transformer = transformer
+        self._batch_size = batch_size
+        self._workers = workers
+        self._model_name = model_name or getattr(embedding, "model_name", None)
+        self._backend = getattr(embedding, "backend", "torch")
+        self._threads_per_worker = threads_per_worker
+        self._max_pending = max_pending or max(2, 2 * workers)
+        self._block_size = block_size
+        self._near_duplicate_threshold = near_duplicate_threshold
+
+    def _iter_batches(self, path: str, hash_fn: Callable[[Document], str], stats: IngestStats) -> Iterator[Tuple[List[str], List[Document]]]:
+        seen: Set[str] = set()
+        ids: List[str] = []
+        docs: List[Document] = []
+        for block in iter_text_blocks(path, self._block_size):
+            for doc in self._transformer.create_documents([block]):
+                key = hash_fn(doc)
+                if key in seen:
+                    stats.duplicates += 1
+                    continue
+                seen.add(key)
+                ids.append(key)
+                docs.append(doc)
+                if len(docs) >= self._batch_size:
+                    yield ids, docs
+                    ids, docs = [], []
+        if docs:
+            yield ids, docs
+
+    def run(self, path: str, hash_fn: Callable[[Document], str], **faiss_kwargs) -> Tuple[FAISS, List[str], IngestStats]:
+        """Embed the whole file into a new FAISS store. Returns the store, the ids added and stats."""
+        stats = IngestStats()
+        started = time.perf_counter()
+        db: Optional[FAISS] = None
+        all_ids: List[str] = []
+        near_duplicates = NearDuplicateFilter(self._near_duplicate_threshold) if self._near_duplicate_threshold else None
+
+        def add(ids: List[str], docs: List[Document], vectors: List[List[float]]):
+            nonlocal db
+            if near_duplicates is not None:
+                keep = near_duplicates.keep(vectors)
+                stats.near_duplicates += int((~keep).sum())
+                stats.near_duplicate_ids.extend(i for i, k in zip(ids, keep) if not k)
+                if not keep.all():
+                    ids = [i for i, k in zip(ids, keep) if k]
+                    docs = [d for d, k in zip(docs, keep) if k]
+                    vectors = [v for v, k in zip(vectors, keep) if k]
+                if not ids:
+                    return
+            text_embeddings = list(zip([d.page_content for d in docs], vectors))
+            metadatas = [d.metadata for d in docs]
+            if db is None:
+                db = FAISS.from_embeddings(text_embeddings, self._embedding, metadatas=metadatas, ids=ids, **faiss_kwargs)
+            else:
+                db.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+            all_ids.extend(ids)
+            stats.docs += len(ids)
+            stats.batches += 1
+
+        if self._workers <= 0:
+            for ids, docs in self._iter_batches(path, hash_fn, stats):
+                add(ids, docs, self._embedding.embed_documents([d.page_content for d in docs]))
+        else:
+            pending: Deque[Tuple[List[str], List[Document], Future]] = deque()
+            with ProcessPoolExecutor(
+                max_workers=self._workers,
+                initializer=_init_worker,
+                initargs=(self._model_name, self._threads_per_worker, self._backend),
+            ) as pool:
+                for ids, docs in self._iter_batches(path, hash_fn, stats):
+                    pending.append((ids, docs, pool.submit(_embed_batch, [d.page_content for d in docs])))
+                    # Backpressure: keep the number of batches held in memory bounded
+                    while len(pending) >= self._max_pending:
+                        ids, docs, future = pending.popleft()
+                        add(ids, docs, future.result())
+                while pending:
+                    ids, docs, future = pending.popleft()
+                    add(ids, docs, future.result())
+
+        stats.seconds = time.perf_counter() - started
+        stats.peak_rss_mb = peak_rss_mb()
+        return db, all_ids, stats
+
+    def info(self, stats: IngestStats) -> Dict[str, float]:
+        return {
+            "records": stats.records,
+            "docs": stats.docs,
+            "duplicates": stats.duplicates,
+            "near_duplicates": stats.near_duplicates,
+            "shrink": round(stats.shrink, 3),
+            "batches": stats.batches,
+            "seconds": round(stats.seconds, 3),
+            "docs_per_sec": round(stats.docs_per_sec, 1),
+            "peak_rss_mb": stats.peak_rss_mb,
+        }
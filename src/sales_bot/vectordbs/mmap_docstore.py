@@ -0,0 +1,127 @@
+import json
+import os
+from collections.abc import Mapping
+from typing import Dict, Iterator, Optional, Union
+
+import faiss
+import numpy as np
+from langchain.docstore.base import Docstore
+from langchain.docstore.document import Document
+
+DOCS_FILE = "docs.bin"
+OFFSETS_FILE = "docs.offsets.npy"
+IDS_FILE = "docs.ids.npy"
+SORTED_IDS_FILE = "docs.sorted_ids.npy"
+SORTED_ROWS_FILE = "docs.sorted_rows.npy"
+MMAP_FILES = [DOCS_FILE, OFFSETS_FILE, IDS_FILE, SORTED_IDS_FILE, SORTED_ROWS_FILE]
+
+
+def mmap_flags(index_factory: str = "Flat") -> int:
+    """
+        faiss.read_index flags mapping the index file instead of reading it into the heap.
+        IVF inverted lists are mapped by IO_FLAG_MMAP, flat/PQ/HNSW codes need IO_FLAG_MMAP_IFC
+        (faiss >= 1.8), older faiss reads those into memory as before.
+    """
+    if "IVF" in index_factory or not hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    return faiss.IO_FLAG_MMAP_IFC
+
+
+class PositionIds(Mapping):
+    """index_to_docstore_id over the memory-mapped id array, instead of a dict of every id per process."""
+
+    def __init__(self, ids: np.ndarray):
+        self._ids = ids
+
+    def __getitem__(self, position: int) -> str:
+        if not 0 <= position < len(self._ids):
+            raise KeyError(position)
+        return self._ids[position].decode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(len(self._ids)))
+
+
+class MmapDocstore(Docstore):
+    """
+        Read-only docstore over flat files in the index directory, all opened memory-mapped so worker
+        processes serving the same index share them through the page cache and loading reads nothing:
+            docs.bin: page_content then metadata as JSON of every document, UTF-8, back to back
+            docs.offsets.npy: int64 (start, metadata start, end) of every document in docs.bin
+            docs.ids.npy: docstore id of every faiss position (row i is position i)
+            docs.sorted_ids.npy, docs.sorted_rows.npy: ids sorted, and their rows, for binary search by id
+        Written next to index.pkl by FaissDb, see `write`.
+    """
+
+    def __init__(self, dirpath: str):
+        self._dirpath = dirpath
+        size = os.path.getsize(os.path.join(dirpath, DOCS_FILE))
+        # np.memmap can't map an empty file
+        self._data = np.memmap(os.path.join(dirpath, DOCS_FILE), dtype=np.uint8, mode="r") if size else np.zeros(0, dtype=np.uint8)
+        self._offsets = np.load(os.path.join(dirpath, OFFSETS_FILE), mmap_mode="r")
+        self._ids = np.load(os.path.join(dirpath, IDS_FILE), mmap_mode="r")
+        self._sorted_ids = np.load(os.path.join(dirpath, SORTED_IDS_FILE), mmap_mode="r")
+        self._sorted_rows = np.load(os.path.join(dirpath, SORTED_ROWS_FILE), mmap_mode="r")
+        self.index_to_docstore_id = PositionIds(self._ids)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @staticmethod
+    def exists(dirpath: str) -> bool:
+        return all(os.path.exists(os.path.join(dirpath, f)) for f in MMAP_FILES)
+
+    def _row(self, id: str) -> Optional[int]:
+        key = id.encode("utf-8")
+        i = int(np.searchsorted(self._sorted_ids, key))
+        if i < len(self._sorted_ids) and self._sorted_ids[i] == key:
+            return int(self._sorted_rows[i])
+        return None
+
+    def search(self, search: str) -> Union[str, Document]:
+        row = self._row(search)
+        if row is None:
+            return f"ID {search} not found."
+        start, middle, end = (int(o) for o in self._offsets[row])
+        return Document(
+            page_content=bytes(self._data[start:middle]).decode("utf-8"),
+            metadata=json.loads(bytes(self._data[middle:end]).decode("utf-8")),
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes + self._offsets.nbytes + self._ids.nbytes + self._sorted_ids.nbytes + self._sorted_rows.nbytes
+
+    @staticmethod
+    def write(dirpath: str, docstore: Docstore, index_to_docstore_id: Dict[int, str]):
+        """
+            Write the documents of a FAISS store in position order.
+            Every file is written next to the old one and renamed over it, so no reader maps a half-written
+            file, but the renames are one per file: a store opened while they run can mix old and new files.
+            Restart read-only workers once the writer is done.
+        """
+        positions = sorted(index_to_docstore_id)
+        ids = [index_to_docstore_id[p] for p in positions]
+        offsets = np.zeros((len(ids), 3), dtype=np.int64)
+        tmp = {f: os.path.join(dirpath, f"{f}.tmp") for f in MMAP_FILES}
+        with open(tmp[DOCS_FILE], "wb") as f:
+            position = 0
+            for row, id in enumerate(ids):
+                doc = docstore.search(id)
+                content = doc.page_content.encode("utf-8")
+                metadata = json.dumps(doc.metadata, ensure_ascii=False, default=str).encode("utf-8")
+                f.write(content)
+                f.write(metadata)
+                offsets[row] = (position, position + len(content), position + len(content) + len(metadata))
+                position = int(offsets[row, 2])
+        id_array = np.array([id.encode("utf-8") for id in ids], dtype=f"S{max((len(id.encode('utf-8')) for id in ids), default=1)}")
+        order = np.argsort(id_array, kind="stable")
+        for name, array in ((OFFSETS_FILE, offsets), (IDS_FILE, id_array), (SORTED_IDS_FILE, id_array[order]), (SORTED_ROWS_FILE, order.astype(np.int64))):
+            # np.save appends .npy to names without it
+            with open(tmp[name], "wb") as f:
+                np.save(f, array)
+        for name in MMAP_FILES:
+            os.replace(tmp[name], os.path.join(dirpath, name))
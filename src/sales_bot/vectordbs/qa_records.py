@@ -0,0 +1,85 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.docstore.document import Document
+from langchain.text_splitter import CharacterTextSplitter, TextSplitter
+
+ANSWER_KEY = "answer"
+
+# Both corpus layouts: "客户问题: ...\n销售回答: ..." and "[客户问题] ...\n[销售回答] ...", generated pairs sometimes say 销售问答
+QA_RECORD = re.compile(
+    r"\[?客户问题\]?\s*[:：]?\s*(?P<question>.+?)\s*\[?销售(?:回答|问答|回复)\]?\s*[:：]?\s*(?P<answer>.+?)"
+    r"(?=\s*(?:\d+\.)?\s*\[?客户问题|\s*\n\s*\d+\.\s*\n|\Z)",
+    re.DOTALL,
+)
+_WHITESPACE = re.compile(r"\s+")
+_QUESTION_LABEL = re.compile(r"\[?客户问题\]?\s*[:：]?")
+
+
+def parse_qa_records(text: str) -> List[Tuple[str, str]]:
+    """(question, answer) pairs of a Q&A corpus, independent of item numbers and line layout."""
+    records = []
+    for match in QA_RECORD.finditer(text):
+        question = _WHITESPACE.sub(" ", match.group("question")).strip()
+        answer = _WHITESPACE.sub(" ", match.group("answer")).strip()
+        if question and answer:
+            records.append((question, answer))
+    return records
+
+
+def parse_qa_groups(text: str) -> List[Tuple[List[str], str]]:
+    """Like parse_qa_records, but several 客户问题 in front of one 销售回答 are paraphrases sharing that answer."""
+    groups = []
+    for question, answer in parse_qa_records(text):
+        questions = [q.strip() for q in _QUESTION_LABEL.split(question) if q.strip()]
+        groups.append((questions, answer))
+    return groups
+
+
+def format_qa_record(question: str, answer: str) -> str:
+    return f"客户问题: {question}\n销售回答: {answer}"
+
+
+def expand_record(doc: Document) -> Document:
+    """Full Q&A text of a question-only document (see QuestionSplitter), other documents are returned as is."""
+    answer = doc.metadata.get(ANSWER_KEY)
+    if answer is None:
+        return doc
+    return Document(page_content=format_qa_record(doc.page_content, answer), metadata=doc.metadata)
+
+
+class QARecordSplitter(TextSplitter):
+    """
+        One chunk per 客户问题/销售回答 pair in a canonical layout, instead of cutting at `\\d+\\.`,
+        which splits answers containing numbers like "3999.00" and merges pairs around missing numbers.
+        The canonical text makes pairs that only differ by numbering or whitespace hash identically,
+        so they collapse to one docstore id. Text without any pair falls back to the number splitter.
+    """
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(chunk_size=kwargs.pop("chunk_size", 1000), chunk_overlap=kwargs.pop("chunk_overlap", 0), **kwargs)
+        self._fallback = CharacterTextSplitter(separator=r'\d+\.', chunk_size=100, chunk_overlap=0, is_separator_regex=True)
+
+    def split_text(self, text: str) -> List[str]:
+        records = parse_qa_records(text)
+        if not records:
+            return self._fallback.split_text(text)
+        return [format_qa_record(question, answer) for question, answer in records]
+
+
+class QuestionSplitter(QARecordSplitter):
+    """
+        Question-only documents for FaissDb(index_mode="question"): page_content is the customer question,
+        which is all that gets embedded, and the answer rides along in metadata["answer"].
+        Every paraphrase of a group becomes its own document pointing to the same answer.
+    """
+
+    def split_text(self, text: str) -> List[str]:
+        return [q for questions, _ in parse_qa_groups(text) for q in questions]
+
+    def create_documents(self, texts: List[str], metadatas: Optional[List[Dict]] = None) -> List[Document]:
+        documents = []
+        for text, metadata in zip(texts, metadatas or [{}] * len(texts)):
+            for questions, answer in parse_qa_groups(text):
+                documents.extend(Document(page_content=q, metadata={**metadata, ANSWER_KEY: answer}) for q in questions)
+        return documents
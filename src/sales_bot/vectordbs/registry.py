@@ -0,0 +1,95 @@
+import os
+import sys
+from collections import OrderedDict
+from functools import lru_cache, partial
+from threading import RLock
+from typing import Callable, Dict, List
+
+from langchain.vectorstores import FAISS
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.config import get_settings
+
+from vectordbs.faissdb import FaissDb
+from vectordbs.mmap_docstore import MmapDocstore
+from vectordbs.vectordb import VectorDb
+
+
+def estimate_bytes(db: FAISS) -> int:
+    """Rough resident size of a FAISS store: encoded vectors plus docstore text."""
+    index = db.index
+    try:
+        code_size = index.sa_code_size()
+    except RuntimeError:
+        code_size = index.d * 4
+    if isinstance(db.docstore, MmapDocstore):
+        return index.ntotal * code_size + db.docstore.nbytes
+    docs = getattr(db.docstore, "_dict", {})
+    return index.ntotal * code_size + sum(
+        len(d.page_content.encode("utf-8")) + len(str(d.metadata.get("answer", "")).encode("utf-8")) for d in docs.values()
+    )
+
+
+class VectorDbRegistry():
+    """
+        One VectorDb per sales domain served from a single process.
+        Stores are created and loaded on first use, all of them share the ChineseEmbedding singleton,
+        and the least recently used stores are unloaded once the estimated size of the loaded ones
+        exceeds `memory_budget_mb`. An evicted store reloads transparently on its next access.
+    """
+
+    def __init__(self, domains: Dict[str, str], memory_budget_mb: float = 1024, factory: Callable[[str], VectorDb] = FaissDb):
+        self._domains = dict(domains)
+        self._budget = memory_budget_mb * 1024 * 1024
+        self._factory = factory
+        self._stores: Dict[str, VectorDb] = {}
+        # domain -> estimated bytes of the loaded store, least recently used first
+        self._loaded: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = RLock()
+
+    @property
+    def domains(self) -> List[str]:
+        return list(self._domains)
+
+    def get(self, domain: str) -> VectorDb:
+        if domain not in self._domains:
+            raise KeyError(f"Unknown sales domain '{domain}', expected one of {self.domains}")
+        with self._lock:
+            store = self._stores.get(domain)
+            if store is None:
+                store = self._factory(self._domains[domain])
+                store.onAccess(lambda db, domain=domain: self._touch(domain, db))
+                self._stores[domain] = store
+        return store
+
+    def _touch(self, domain: str, db: FAISS):
+        with self._lock:
+            if domain in self._loaded:
+                self._loaded.move_to_end(domain)
+                return
+            self._loaded[domain] = estimate_bytes(db)
+            # The store just touched is last in LRU order and is never evicted
+            while self.memory_usage() > self._budget and len(self._loaded) > 1:
+                victim, _ = self._loaded.popitem(last=False)
+                self._stores[victim].unload()
+
+    def memory_usage(self) -> int:
+        return sum(self._loaded.values())
+
+    def info(self) -> Dict[str, object]:
+        return {
+            "domains": self.domains,
+            "loaded": list(self._loaded),
+            "memory_usage_mb": round(self.memory_usage() / 1024 / 1024, 2),
+            "memory_budget_mb": round(self._budget / 1024 / 1024, 2),
+        }
+
+
+@lru_cache()
+def get_registry() -> VectorDbRegistry:
+    settings = get_settings()
+    return VectorDbRegistry(
+        settings.VECTOR_STORE_DOMAINS,
+        settings.VECTOR_STORE_MEMORY_BUDGET_MB,
+        factory=partial(FaissDb, index_mode=settings.VECTOR_STORE_INDEX_MODE, read_only=settings.VECTOR_STORE_READ_ONLY),
+    )
@@ -0,0 +1,78 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain.schema.embeddings import Embeddings
+
+RERANKERS = ["cosine", "cross-encoder"]
+DEFAULT_CROSS_ENCODER = "BAAI/bge-reranker-base"
+
+
+class CosineReranker():
+    """
+        Cosine similarity between the query vector and the candidates' stored vectors, one matrix product.
+        Unlike score_normalizer(L2 distance) it is bounded and doesn't depend on the vector norms, so one
+        threshold holds across questions. Candidates without stored vectors are embedded.
+    """
+
+    def __init__(self, embedding: Embeddings):
+        self._embedding = embedding
+
+    def score(self, query: str, query_vector: np.ndarray, docs: List[Document], vectors: Optional[np.ndarray]) -> np.ndarray:
+        if vectors is None:
+            vectors = np.asarray(self._embedding.embed_documents([d.page_content for d in docs]), dtype=np.float32)
+        vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors @ (query_vector / max(float(np.linalg.norm(query_vector)), 1e-12))
+
+
+class CrossEncoderReranker():
+    """
+        sentence-transformers CrossEncoder reading query and candidate together, e.g. bge-reranker-base
+        (Chinese, ~280M parameters, a few ms per pair on CPU). Single-label models output a sigmoid in [0, 1].
+        The model is loaded on first use.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_CROSS_ENCODER, max_length: int = 512):
+        self._model_name = model_name
+        self._max_length = max_length
+        self._model = None
+
+    def score(self, query: str, query_vector: np.ndarray, docs: List[Document], vectors: Optional[np.ndarray]) -> np.ndarray:
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+            self._model = CrossEncoder(self._model_name, max_length=self._max_length)
+        return np.asarray(self._model.predict([(query, d.page_content) for d in docs]), dtype=np.float32).reshape(-1)
+
+
+def rerankerFactory(kind: str, embedding: Embeddings, model_name: Optional[str] = None):
+    if kind == "cosine":
+        return CosineReranker(embedding)
+    if kind == "cross-encoder":
+        return CrossEncoderReranker(model_name or DEFAULT_CROSS_ENCODER)
+    raise ValueError(f"Unsupported reranker {kind}, expected one of {RERANKERS}")
+
+
+def calibrate_threshold(scores: Sequence[float], correct: Sequence[bool], target_precision: float = 0.95) -> Dict[str, float]:
+    """
+        Lowest threshold on top-1 scores whose hits are at least target_precision correct, i.e. the most
+        local answers (fewest fallbacks) at that precision.
+        scores: top-1 score per labelled question, correct: whether that top-1 is the labelled answer
+        (always False for questions with no answer in the store).
+        Returns threshold, hit_rate and precision, threshold is inf when no threshold reaches the target.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    correct = np.asarray(correct, dtype=bool)
+    order = np.argsort(-scores)
+    # Accepting the top i+1 scores: hits i+1, correct ones cumsum
+    precision = np.cumsum(correct[order]) / np.arange(1, len(order) + 1)
+    # Cut only between distinct scores, a threshold can't separate ties
+    cuts = np.append(scores[order][1:] < scores[order][:-1], True)
+    ok = np.flatnonzero((precision >= target_precision) & cuts)
+    if not len(ok):
+        return {"threshold": float("inf"), "hit_rate": 0.0, "precision": 0.0}
+    best = ok[-1]
+    return {
+        "threshold": float(scores[order][best]),
+        "hit_rate": float((best + 1) / len(scores)),
+        "precision": float(precision[best]),
+    }
@@ -0,0 +1,180 @@
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.callbacks.manager import CallbackManagerForRetrieverRun
+from langchain.pydantic_v1 import Field
+from langchain.schema import BaseRetriever, Document
+from langchain.vectorstores.utils import DistanceStrategy
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.metrics import METRICS
+from vectordbs.faissdb import doc_hash
+from vectordbs.qa_records import ANSWER_KEY, expand_record
+
+
+def _dedupe_answers(docs: List[Document]) -> List[Document]:
+    answers = set()
+    expanded = []
+    for doc in docs:
+        answer = doc.metadata.get(ANSWER_KEY)
+        if answer is not None:
+            if answer in answers:
+                continue
+            answers.add(answer)
+        expanded.append(expand_record(doc))
+    return expanded
+
+
+class VectorDbRetriever(BaseRetriever):
+    """
+        Retriever resolving `vectordb.db` on every query instead of binding one VectorStore up front,
+        so it keeps working with lazily loaded stores and stores evicted by VectorDbRegistry.
+        Question-only hits are expanded back to full Q&A text, paraphrases of one answer are returned once.
+    """
+    vectordb: Any
+    search_type: str = "similarity"
+    search_kwargs: Dict[str, Any] = Field(default_factory=dict)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        retriever = self.vectordb.db.as_retriever(search_type=self.search_type, search_kwargs=self.search_kwargs)
+        docs = retriever.get_relevant_documents(query, callbacks=run_manager.get_child())
+        return _dedupe_answers(docs)
+
+
+def _dense_relevance(db: Any, query_vector: np.ndarray, positions: List[int], docs: List[Document]) -> List[float]:
+    """Relevance of the documents at faiss `positions` to the query, on the similarity_search_with_relevance_scores scale."""
+    try:
+        vectors = np.vstack([db.index.reconstruct(p) for p in positions])
+    except RuntimeError:
+        # IVF indexes without a direct map can't reconstruct, embed what was indexed instead
+        vectors = np.asarray(db._embed_documents([d.page_content for d in docs]), dtype=np.float32)
+        if db._normalize_L2:
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    if db._normalize_L2:
+        query_vector = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+    if db.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT:
+        scores = vectors @ query_vector
+    else:
+        scores = ((vectors - query_vector) ** 2).sum(axis=1)
+    relevance_fn = db._select_relevance_score_fn()
+    return [float(relevance_fn(score)) for score in scores]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+        Dense + BM25 retrieval over a FaissDb, for exact terms (model numbers, "能效等级") that dense
+        similarity alone scores below the threshold.
+        The top `fetch_k` of both are pooled by docstore id. A document is kept when its dense relevance
+        reaches `score_threshold`, or when its BM25 coverage (share of the query's idf mass it contains, see
+        BM25Index.search) reaches `lexical_threshold` and its dense relevance is still at least
+        `min_relevance`: question templates alone cover much of a query ("这个冰箱多大尺寸？" vs the TV's
+        size record), the dense score is what tells the products apart. Kept documents are ranked by
+        `(1 - lexical_weight) * relevance + lexical_weight * coverage`.
+        Both lexical thresholds are meant to be calibrated with negatives, see benchmark/hybrid_benchmark.py.
+    """
+    vectordb: Any
+    k: int = 1
+    fetch_k: int = 10
+    score_threshold: float = 0.8
+    lexical_threshold: float = 0.6
+    min_relevance: float = 0.7
+    lexical_weight: float = 0.3
+
+    def candidates(self, query: str) -> List[Tuple[Document, float, float]]:
+        """Pooled (document, dense relevance, BM25 coverage) of the query, best fused score first."""
+        db = self.vectordb.db
+        query_vector = np.asarray(db._embed_query(query), dtype=np.float32)
+        relevance_fn = db._select_relevance_score_fn()
+        docs: Dict[str, Document] = {}
+        relevance: Dict[str, float] = {}
+        for doc, score in db.similarity_search_with_score_by_vector(query_vector.tolist(), k=self.fetch_k):
+            key = doc_hash(doc)
+            docs.setdefault(key, doc)
+            relevance[key] = max(float(relevance_fn(score)), relevance.get(key, 0.0))
+        index, positions = self.vectordb.lexicalIndex()
+        coverage: Dict[str, float] = {}
+        lexical_only: Dict[str, int] = {}
+        for d, _, covered in index.search(query, self.fetch_k):
+            position = int(positions[d])
+            key = db.index_to_docstore_id[position]
+            docs.setdefault(key, db.docstore.search(key))
+            coverage[key] = covered
+            if key not in relevance:
+                lexical_only[key] = position
+        if lexical_only:
+            scores = _dense_relevance(db, query_vector, list(lexical_only.values()), [docs[key] for key in lexical_only])
+            relevance.update(zip(lexical_only, scores))
+        pooled = [(docs[key], relevance.get(key, 0.0), coverage.get(key, 0.0)) for key in docs]
+        pooled.sort(key=lambda c: (1 - self.lexical_weight) * c[1] + self.lexical_weight * c[2], reverse=True)
+        return pooled
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        kept = []
+        for doc, relevance, coverage in self.candidates(query):
+            dense_hit = relevance >= self.score_threshold
+            lexical_hit = coverage >= self.lexical_threshold and relevance >= self.min_relevance
+            if dense_hit or lexical_hit:
+                kept.append((doc, dense_hit, lexical_hit))
+        if not kept:
+            METRICS.inc("hybrid_retrieval_total", result="miss")
+        else:
+            _, dense_hit, lexical_hit = kept[0]
+            METRICS.inc("hybrid_retrieval_total", result="both" if dense_hit and lexical_hit else "dense" if dense_hit else "lexical")
+        return _dedupe_answers([doc for doc, _, _ in kept])[:self.k]
+
+
+class RerankRetriever(BaseRetriever):
+    """
+        Two-stage retrieval: the top `fetch_k` FAISS candidates (plus the BM25 top `fetch_k` when
+        `lexical` and the store has a lexical index) are rescored by `reranker` (see vectordbs.rerank)
+        and those scoring at least `threshold` are returned, best first.
+        The threshold belongs to the reranker's score scale and is meant to be calibrated on labelled
+        questions, see benchmark/rerank_calibration.py. Each returned document carries its score in
+        metadata["rerank_score"].
+    """
+    vectordb: Any
+    reranker: Any
+    k: int = 1
+    fetch_k: int = 10
+    threshold: float = 0.8
+    lexical: bool = False
+
+    def candidates(self, query: str) -> Tuple[List[Document], Optional[np.ndarray], np.ndarray]:
+        """Candidate documents of the query, their stored vectors (None when the index can't reconstruct) and the query vector."""
+        db = self.vectordb.db
+        query_vector = np.asarray(self.vectordb.embedding.embed_query(query), dtype=np.float32)
+        search_vector = query_vector.reshape(1, -1).copy()
+        if getattr(db, "_normalize_L2", False):
+            search_vector /= max(float(np.linalg.norm(search_vector)), 1e-12)
+        _, found = db.index.search(search_vector, self.fetch_k)
+        positions = [int(i) for i in found[0] if i >= 0]
+        if self.lexical and hasattr(self.vectordb, "lexicalIndex"):
+            index, lexical_positions = self.vectordb.lexicalIndex()
+            positions += [int(lexical_positions[d]) for d, _, _ in index.search(query, self.fetch_k)]
+        positions = list(dict.fromkeys(positions))
+        docs = [db.docstore.search(db.index_to_docstore_id[p]) for p in positions]
+        try:
+            vectors = np.vstack([db.index.reconstruct(p) for p in positions]) if positions else None
+        except RuntimeError:
+            # IVF indexes without a direct map can't reconstruct, the reranker embeds the texts instead
+            vectors = None
+        return docs, vectors, query_vector
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        docs, vectors, query_vector = self.candidates(query)
+        if not docs:
+            METRICS.inc("rerank_total", result="miss")
+            return []
+        started = time.perf_counter()
+        scores = self.reranker.score(query, query_vector, [expand_record(d) for d in docs], vectors)
+        METRICS.observe("rerank_seconds", time.perf_counter() - started)
+        ranked = [
+            Document(page_content=doc.page_content, metadata={**doc.metadata, "rerank_score": float(score)})
+            for score, doc in sorted(zip(scores, docs), key=lambda pair: pair[0], reverse=True)
+            if score >= self.threshold
+        ]
+        METRICS.inc("rerank_total", result="hit" if ranked else "miss")
+        return _dedupe_answers(ranked)[:self.k]
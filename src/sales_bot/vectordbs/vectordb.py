@@ -1,44 +1,82 @@
 import os
 import sys
 from abc import ABC, abstractmethod
+from threading import Lock
+from typing import Callable, Optional
 
 from langchain.memory import VectorStoreRetrieverMemory
 from langchain.schema.embeddings import Embeddings
 from langchain.schema.vectorstore import VectorStore
-from langchain.text_splitter import CharacterTextSplitter, TextSplitter
+from langchain.text_splitter import TextSplitter
 from langchain.vectorstores import FAISS
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from embedding import ChineseEmbedding
+from vectordbs.qa_records import QARecordSplitter
 
 
 def defaultDocTransformer():
-    return CharacterTextSplitter(        
-        separator = r'\d+\.',
-        chunk_size = 100,
-        chunk_overlap  = 0,
-        length_function = len,
-        is_separator_regex = True,
-    )
+    # One chunk per Q&A pair, see QARecordSplitter for why not CharacterTextSplitter(separator=r'\d+\.')
+    return QARecordSplitter()
 
 class VectorDb(ABC):
-    _db: VectorStore
+    """
+        The embedding model and the index are loaded lazily on first access of `db` (or by `warmup()`),
+        so constructing a VectorDb is cheap.
+    """
+    _db: Optional[VectorStore]
     _transformer: TextSplitter
-    _embedding: Embeddings
+    _embedding: Optional[Embeddings]
 
-    def __init__(self, dbfile: str = "resources/electronic_devices_sales_qa.txt", embedding: Embeddings =  ChineseEmbedding().embeddings,transformer: TextSplitter = defaultDocTransformer(),rebuild: bool = False):
-        self._transformer = transformer
+    def __init__(self, dbfile: str = "resources/electronic_devices_sales_qa.txt", embedding: Optional[Embeddings] = None, transformer: Optional[TextSplitter] = None, rebuild: bool = False):
+        self._dbfile = dbfile
+        self._transformer = transformer if transformer is not None else defaultDocTransformer()
         self._embedding = embedding
-        self._db = self._initDb(dbfile, embedding, rebuild)
+        self._rebuild = rebuild
+        self._db = None
+        self._lock = Lock()
+        self._on_access: Optional[Callable[[VectorStore], None]] = None
 
     @abstractmethod
     def _initDb(self, dbfile: str, embedding: Embeddings ,rebuild: bool) -> VectorStore:
         pass
-    
+
     @abstractmethod
-    def createMemory(self) -> VectorStoreRetrieverMemory:
+    def createMemory(self, k: int = 3) -> VectorStoreRetrieverMemory:
         pass
 
+    @property
+    def embedding(self) -> Embeddings:
+        if self._embedding is None:
+            self._embedding = ChineseEmbedding().embeddings
+        return self._embedding
+
     @property
     def db(self):
-        return self._db
+        # Read once into a local so a concurrent unload() can't hand back None
+        db = self._db
+        if db is None:
+            with self._lock:
+                if self._db is None:
+                    self._db = self._initDb(self._dbfile, self.embedding, self._rebuild)
+                db = self._db
+        if self._on_access is not None and db is not None:
+            self._on_access(db)
+        return db
+
+    def onAccess(self, callback: Callable[[VectorStore], None]):
+        """Register a callback run on every `db` access, used by VectorDbRegistry for LRU accounting."""
+        self._on_access = callback
+
+    def unload(self):
+        """Drop the loaded index, it is reloaded lazily on the next `db` access."""
+        with self._lock:
+            self._db = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._db is not None
+
+    def warmup(self):
+        """Load the embedding model and the index ahead of the first request."""
+        return self.db
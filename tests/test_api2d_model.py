@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from benchmark.fake_api2d import FakeApi2dServer, fake_completion
+from langchain_model import Api2dLLM
+
+PROMPT = "你是一个专业的电器销售\n客户问题: 这款冰箱的能效等级是多少？"
+
+
+@pytest.fixture()
+def server():
+    server = FakeApi2dServer().start()
+    yield server
+    server.stop()
+
+
+def make_llm(server: FakeApi2dServer, **kwargs) -> Api2dLLM:
+    kwargs.setdefault("retry_backoff_factor", 0)
+    return Api2dLLM(openai_api_base=server.url, openai_api_key="test", **kwargs)
+
+
+def test_completion(server):
+    """A plain call returns the chat completion text."""
+    assert make_llm(server)(PROMPT) == fake_completion(PROMPT)
+    assert server.calls == 1
+
+
+def test_token_usage_from_api(server):
+    """llm_output carries the usage the api reported."""
+    result = make_llm(server).generate([PROMPT])
+    usage = result.llm_output["token_usage"]
+    completion = fake_completion(PROMPT)
+    assert usage == {
+        "prompt_tokens": len(PROMPT),
+        "completion_tokens": len(completion),
+        "total_tokens": len(PROMPT) + len(completion),
+    }
+
+
+def test_retries_overloaded_api(server):
+    """503s are retried by the session's adapter until the api answers."""
+    server.fail_first = 2
+    assert make_llm(server, max_retries=3)(PROMPT) == fake_completion(PROMPT)
+    assert server.calls == 3
+
+
+def test_gives_up_after_max_retries(server):
+    """Once the retries are used up the api error is raised."""
+    server.fail_first = 10
+    with pytest.raises(ValueError, match="status code 503"):
+        make_llm(server, max_retries=1)(PROMPT)
+    assert server.calls == 2
+
+
+def test_async_retries_overloaded_api(server):
+    """The aiohttp path retries 503s as well."""
+    server.fail_first = 2
+    llm = make_llm(server, max_retries=3)
+
+    async def call():
+        try:
+            return await llm.apredict(PROMPT)
+        finally:
+            await llm.aclose()
+
+    assert asyncio.run(call()) == fake_completion(PROMPT)
+    assert server.calls == 3
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_html_error_page(server, streaming):
+    """A non-json error body is reported with its status code, sync and async."""
+    server.fail_first, server.fail_html = 10, True
+    llm = make_llm(server, max_retries=0, streaming=streaming)
+    with pytest.raises(ValueError, match="status code 503.*Service Temporarily Unavailable"):
+        llm(PROMPT)
+
+    async def call():
+        try:
+            return await llm.apredict(PROMPT)
+        finally:
+            await llm.aclose()
+
+    with pytest.raises(ValueError, match="status code 503.*Service Temporarily Unavailable"):
+        asyncio.run(call())
+
+
+def test_async_session_per_event_loop(server):
+    """The same llm can be awaited from successive event loops."""
+    llm = make_llm(server)
+    assert asyncio.run(llm.apredict(PROMPT)) == fake_completion(PROMPT)
+    assert asyncio.run(llm.apredict(PROMPT)) == fake_completion(PROMPT)
+    assert len(llm._asessions) == 1
+
+
+def test_streaming_yields_tokens(server):
+    """Streamed tokens reassemble into the completion, Chinese split across chunks included."""
+    tokens = []
+    server.chunk_size = 3
+    llm = make_llm(server, streaming=True)
+    for chunk in llm._stream(PROMPT):
+        tokens.append(chunk.text)
+    assert len(tokens) > 1
+    assert "".join(tokens) == fake_completion(PROMPT)
+
+
+@pytest.mark.parametrize(
+    ("line", "is_chat", "token"),
+    [
+        ('data: {"choices": [{"delta": {"content": "冰箱"}}]}', True, "冰箱"),
+        ('data: {"choices": [{"text": "一级能效"}]}', False, "一级能效"),
+        ('data: {"choices": [{"delta": {"role": "assistant"}}]}', True, None),
+        ("data: [DONE]", True, None),
+        (": keep-alive", True, None),
+        ("data:", True, None),
+    ],
+)
+def test_parse_sse_line(line, is_chat, token):
+    """Only content-carrying events produce a token."""
+    assert Api2dLLM._parse_sse_line(line, is_chat) == token
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from vectordbs.bm25 import BM25Index, tokenize
+
+TEXTS = [
+    "客户问题: 这款冰箱的能效等级是多少？\n销售回答: 这款冰箱是一级能效。",
+    "客户问题: 这台电视支持4K吗？\n销售回答: 支持，型号 QLED-55Q8 是4K屏。",
+    "客户问题: 这个空调有节能模式吗？\n销售回答: 有的，节能模式下功率减半。",
+]
+
+
+@pytest.fixture()
+def index():
+    return BM25Index(TEXTS, use_jieba=False)
+
+
+def test_tokenize_keeps_model_numbers_whole():
+    """Latin words and model numbers are one token, Chinese runs give unigrams and bigrams."""
+    tokens = tokenize("QLED-55Q8 冰箱", use_jieba=False)
+    assert tokens == ["qled-55q8", "冰", "箱", "冰箱"]
+
+
+def test_postings_are_flat_arrays(index):
+    """The index is CSR arrays: one offset per term plus one."""
+    assert len(index) == len(TEXTS)
+    assert index.offsets.shape == (len(index.vocabulary) + 1,)
+    assert len(index.doc_ids) == len(index.tfs) == index.offsets[-1]
+
+
+def test_search_ranks_matching_document_first(index):
+    """Keyword queries find the document with their rare terms, with most of the query covered."""
+    doc, score, coverage = index.search("冰箱能效等级")[0]
+    assert doc == 0
+    assert score > 0
+    assert 0.5 < coverage <= 1.0
+    assert index.search("qled-55q8")[0][0] == 1
+
+
+def test_unknown_terms_match_nothing(index):
+    """A query of terms the corpus doesn't have returns no documents."""
+    assert index.search("洗衣机") == []
+
+
+def test_unknown_terms_lower_coverage(index):
+    """A model number we don't sell counts against the coverage."""
+    known = index.search("冰箱能效")[0][2]
+    with_unknown = index.search("冰箱能效 xr-9000")[0][2]
+    assert with_unknown < known
+
+
+@pytest.mark.parametrize("mmap_mode", ["r", None])
+def test_save_and_load(tmp_path, index, mmap_mode):
+    """A saved index answers like the original, memory-mapped or read into memory."""
+    assert not BM25Index.exists(str(tmp_path))
+    index.save(str(tmp_path))
+    assert BM25Index.exists(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path), mmap_mode=mmap_mode)
+    assert isinstance(loaded.doc_ids, np.memmap) == (mmap_mode is not None)
+    for query in ["冰箱能效等级", "4K电视", "节能模式"]:
+        assert loaded.search(query) == index.search(query)
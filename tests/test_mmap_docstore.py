@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from langchain.docstore import InMemoryDocstore
+from langchain.docstore.document import Document
+
+from vectordbs.mmap_docstore import MmapDocstore
+
+DOCS = {
+    "id-fridge": Document(page_content="客户问题: 冰箱多大？\n销售回答: 500升。", metadata={"answer": "500升。"}),
+    "id-tv": Document(page_content="客户问题: 电视多少钱？\n销售回答: 3999元。", metadata={}),
+    "ид-3": Document(page_content="", metadata={"source": "resources/x.txt", "page": 3}),
+}
+
+
+@pytest.fixture()
+def store(tmp_path):
+    # Positions don't follow the docstore's order
+    index_to_docstore_id = {2: "id-fridge", 0: "id-tv", 1: "ид-3"}
+    MmapDocstore.write(str(tmp_path), InMemoryDocstore(dict(DOCS)), index_to_docstore_id)
+    return MmapDocstore(str(tmp_path))
+
+
+def test_round_trip(store):
+    """Every document comes back with its content and metadata."""
+    assert len(store) == len(DOCS)
+    for id, doc in DOCS.items():
+        assert store.search(id) == doc
+
+
+def test_positions(store):
+    """index_to_docstore_id maps faiss positions to ids like the dict it replaces."""
+    assert dict(store.index_to_docstore_id) == {0: "id-tv", 1: "ид-3", 2: "id-fridge"}
+    with pytest.raises(KeyError):
+        store.index_to_docstore_id[3]
+
+
+def test_missing_id(store):
+    """Unknown ids get FAISS's not found message."""
+    assert store.search("id-washer") == "ID id-washer not found."
+
+
+def test_files_are_memory_mapped(store, tmp_path):
+    """Loading maps the files instead of reading them."""
+    assert MmapDocstore.exists(str(tmp_path))
+    assert isinstance(store._ids, np.memmap)
+    assert store.nbytes > 0
+
+
+def test_rewrite_replaces_files(store, tmp_path):
+    """Writing again swaps in the new documents."""
+    MmapDocstore.write(str(tmp_path), InMemoryDocstore({"id-tv": DOCS["id-tv"]}), {0: "id-tv"})
+    reloaded = MmapDocstore(str(tmp_path))
+    assert len(reloaded) == 1
+    assert reloaded.search("id-fridge") == "ID id-fridge not found."
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_empty_store(tmp_path):
+    """A store without documents can be written and opened."""
+    MmapDocstore.write(str(tmp_path), InMemoryDocstore({}), {})
+    assert len(MmapDocstore(str(tmp_path))) == 0
@@ -0,0 +1,88 @@
+import pytest
+from langchain.schema import AgentAction, AgentFinish, OutputParserException
+
+from chains.output_parser import SalesOutputParser, normalize_react_output
+
+TOOLS = ["VectorDb QA Search", "Web Search"]
+
+
+@pytest.fixture()
+def parser():
+    return SalesOutputParser(tool_names=TOOLS)
+
+
+def test_well_formed_action(parser):
+    """Standard ReAct output parses without repairs."""
+    output = parser.parse("Thought: 先查知识库\nAction: VectorDb QA Search\nAction Input: 冰箱能效")
+    assert isinstance(output, AgentAction)
+    assert (output.tool, output.tool_input) == ("VectorDb QA Search", "冰箱能效")
+    assert parser.repairs == 0
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "思考：先查知识库\n行动：VectorDb QA Search\n行动输入：冰箱能效",
+        "**Thought:** 先查知识库\n**Action:** VectorDb QA Search\n**Action Input:** 冰箱能效",
+        "Thought: 先查知识库\nAction：VectorDb QA Search\nAction Input：冰箱能效",
+    ],
+)
+def test_translated_and_decorated_keywords(parser, text):
+    """Chinese, markdown and full-width colon keywords are rewritten to the English form."""
+    output = parser.parse(text)
+    assert (output.tool, output.tool_input) == ("VectorDb QA Search", "冰箱能效")
+    assert parser.repairs >= 1
+
+
+@pytest.mark.parametrize("text", ["最终答案：一级能效", "**Final Answer**: 一级能效"])
+def test_final_answer_keywords(parser, text):
+    """Translated final answers finish the agent."""
+    output = parser.parse(f"Thought: 我知道了\n{text}")
+    assert isinstance(output, AgentFinish)
+    assert output.return_values["output"] == "一级能效"
+
+
+def test_answer_keeps_its_punctuation(parser):
+    """Only keyword colons are rewritten, full-width colons in the answer stay."""
+    assert normalize_react_output("最终答案：价格：3999元").endswith("价格：3999元")
+    output = parser.parse("Thought: 我知道了\n最终答案：价格：3999元")
+    assert output.return_values["output"] == "价格：3999元"
+
+
+@pytest.mark.parametrize(
+    ("tool", "expected"),
+    [
+        ('"Web Search"', "Web Search"),
+        ("[VectorDb QA Search]", "VectorDb QA Search"),
+        ("web search", "Web Search"),
+        ("VectorDb QA Search工具", "VectorDb QA Search"),
+    ],
+)
+def test_tool_name_repairs(parser, tool, expected):
+    """Quoted, bracketed, miscased or suffixed tool names map to the real tool."""
+    output = parser.parse(f"Thought: 查一下\nAction: {tool}\nAction Input: 冰箱价格")
+    assert output.tool == expected
+
+
+def test_hallucinated_observation_in_input(parser):
+    """A made-up observation after the action input is cut off."""
+    output = parser.parse(
+        "Thought: 查一下\nAction: Web Search\nAction Input: \"冰箱价格\"\nObservation: 3999元"
+    )
+    assert output.tool_input == "冰箱价格"
+
+
+def test_action_before_hallucinated_answer(parser):
+    """With both an action and a final answer the action is run for real."""
+    output = parser.parse(
+        "Thought: 查一下\nAction: Web Search\nAction Input: 冰箱价格\n"
+        "Observation: 3999元\nThought: 我知道了\nFinal Answer: 3999元"
+    )
+    assert isinstance(output, AgentAction)
+    assert (output.tool, output.tool_input) == ("Web Search", "冰箱价格")
+
+
+def test_unrepairable_output_raises(parser):
+    """Output without any action or answer still goes to handle_parsing_errors."""
+    with pytest.raises(OutputParserException):
+        parser.parse("我不太确定这个问题")
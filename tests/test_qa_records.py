@@ -0,0 +1,62 @@
+from langchain.docstore.document import Document
+
+from vectordbs.qa_records import (
+    ANSWER_KEY,
+    QARecordSplitter,
+    QuestionSplitter,
+    expand_record,
+    format_qa_record,
+    parse_qa_groups,
+    parse_qa_records,
+)
+
+CORPUS = """1.
+客户问题: 这款冰箱的能效等级是多少？
+销售回答: 一级能效，一年电费不到100元。
+
+2.
+[客户问题] 这台电视多少钱？
+[销售回答] 现在活动价3999.00元。
+3. 客户问题: 空调保修多久？ 客户问题: 空调的保修期是几年？
+销售问答: 整机保修6年。
+"""
+
+
+def test_parse_records_of_both_layouts():
+    """Colon and bracket layouts parse, numbers inside answers don't end them."""
+    records = parse_qa_records(CORPUS)
+    assert records[0] == ("这款冰箱的能效等级是多少？", "一级能效，一年电费不到100元。")
+    assert records[1] == ("这台电视多少钱？", "现在活动价3999.00元。")
+    assert records[2][1] == "整机保修6年。"
+    assert len(records) == 3
+
+
+def test_parse_groups_splits_paraphrases():
+    """Several questions before one answer share it."""
+    groups = parse_qa_groups(CORPUS)
+    assert groups[2] == (["空调保修多久？", "空调的保修期是几年？"], "整机保修6年。")
+    assert [len(questions) for questions, _ in groups] == [1, 1, 2]
+
+
+def test_text_without_records():
+    """Text without any Q&A pair parses to nothing."""
+    assert parse_qa_records("欢迎光临") == []
+
+
+def test_record_splitter_is_canonical():
+    """Pairs differing only in numbering and layout give identical chunks."""
+    splitter = QARecordSplitter()
+    colon = splitter.split_text("1.\n客户问题: 冰箱多大？\n销售回答: 500升。")
+    bracket = splitter.split_text("7. [客户问题] 冰箱多大？ [销售回答] 500升。")
+    assert colon == bracket == [format_qa_record("冰箱多大？", "500升。")]
+
+
+def test_question_documents_expand_to_records():
+    """Question-only documents carry their answer and expand back to the full record."""
+    docs = QuestionSplitter().create_documents([CORPUS])
+    assert [d.page_content for d in docs][-2:] == ["空调保修多久？", "空调的保修期是几年？"]
+    assert docs[-1].metadata[ANSWER_KEY] == "整机保修6年。"
+    expanded = expand_record(docs[-1])
+    assert expanded.page_content == format_qa_record("空调的保修期是几年？", "整机保修6年。")
+    plain = Document(page_content="客户问题: x\n销售回答: y")
+    assert expand_record(plain) is plain
@@ -0,0 +1,35 @@
+import math
+
+import pytest
+
+from vectordbs.rerank import calibrate_threshold
+
+
+def test_lowest_threshold_reaching_precision():
+    """The threshold keeps as many hits as the target precision allows."""
+    scores = [0.95, 0.9, 0.85, 0.8, 0.7, 0.6]
+    correct = [True, True, True, False, True, False]
+    result = calibrate_threshold(scores, correct, target_precision=0.75)
+    assert result["threshold"] == 0.7
+    assert result["hit_rate"] == pytest.approx(5 / 6)
+    assert result["precision"] == pytest.approx(0.8)
+
+
+def test_strict_target():
+    """A precision of 1 stops before the first wrong hit."""
+    result = calibrate_threshold([0.95, 0.9, 0.85, 0.8], [True, True, False, True], target_precision=1.0)
+    assert result["threshold"] == 0.9
+    assert result["hit_rate"] == 0.5
+
+
+def test_ties_are_not_split():
+    """A threshold can't separate equal scores, so ties are accepted or rejected together."""
+    result = calibrate_threshold([0.9, 0.8, 0.8], [True, True, False], target_precision=1.0)
+    assert result["threshold"] == 0.9
+
+
+def test_unreachable_target():
+    """Without any threshold reaching the target everything falls back."""
+    result = calibrate_threshold([0.9, 0.8], [False, False], target_precision=0.5)
+    assert math.isinf(result["threshold"])
+    assert result["hit_rate"] == 0.0
@@ -0,0 +1,89 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmark.fake_search import FakeSearch
+from cache.search_cache import BUSY_OBSERVATION, CachedSearch
+
+
+def make_search(backend: FakeSearch, **kwargs) -> CachedSearch:
+    kwargs.setdefault("rate", 1000)
+    return CachedSearch(backend.run, **kwargs)
+
+
+def test_hit_after_miss():
+    """A repeated query, also spelled differently, is answered from the cache."""
+    backend = FakeSearch()
+    search = make_search(backend)
+    first = search.run("冰箱 价格")
+    assert search.run("冰箱价格？") == first
+    assert backend.calls == 1
+    assert search.info()["hits"] == 1
+
+
+def test_concurrent_identical_queries_coalesce():
+    """Identical queries in flight share one upstream call."""
+    backend = FakeSearch(latency=0.2)
+    search = make_search(backend)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(search.run, ["冰箱价格"] * 8))
+    assert len(set(results)) == 1
+    assert backend.calls == 1
+    assert search.info()["coalesced"] == 7
+
+
+def test_ttl_expiry_refetches():
+    """An expired result is fetched again."""
+    backend = FakeSearch()
+    search = make_search(backend, ttl=0.05)
+    search.run("冰箱价格")
+    time.sleep(0.1)
+    search.run("冰箱价格")
+    assert backend.calls == 2
+
+
+def test_failure_falls_back_to_stale_result():
+    """A failing call serves the expired result, without one the busy observation."""
+    backend = FakeSearch(fail_every=2)
+    search = make_search(backend, ttl=0)
+    first = search.run("冰箱价格")
+    time.sleep(0.01)
+    assert search.run("冰箱价格") == first
+    assert backend.calls == 2
+    assert make_search(FakeSearch(fail_every=1)).run("冰箱价格") == BUSY_OBSERVATION
+
+
+def test_timeout_returns_busy_and_fills_cache():
+    """A slow call times out for its caller and is cached for the next one."""
+    backend = FakeSearch(latency=0.3)
+    search = make_search(backend, timeout=0.05)
+    assert search.run("冰箱价格") == BUSY_OBSERVATION
+    time.sleep(0.4)
+    assert search.run("冰箱价格") != BUSY_OBSERVATION
+    assert backend.calls == 1
+
+
+def test_abandoned_queued_fetch_is_skipped():
+    """Queries nobody waits for anymore never reach the api, beyond max_pending they aren't queued."""
+    backend = FakeSearch(latency=0.3)
+    search = make_search(backend, concurrency=1, timeout=0.05, max_pending=2)
+    for query in ["冰箱价格", "电视价格", "空调价格"]:
+        assert search.run(query) == BUSY_OBSERVATION
+    time.sleep(0.5)
+    info = search.info()
+    assert backend.calls == 1
+    assert (info["skipped"], info["shed"], info["in_flight"]) == (1, 1, 0)
+
+
+@pytest.mark.parametrize("ttl", [None, 3600])
+def test_save_and_load(tmp_path, ttl):
+    """Persisted results are served after a restart."""
+    path = str(tmp_path / "search.pkl")
+    backend = FakeSearch()
+    search = make_search(backend, ttl=ttl, persist_path=path)
+    result = search.run("冰箱价格")
+    search.save()
+    restored = make_search(backend, ttl=ttl, persist_path=path)
+    assert restored.run("冰箱价格") == result
+    assert backend.calls == 1